@@ -5,7 +5,14 @@ Provides statistical analysis of student grades and attendance
 
 import numpy as np
 from typing import List, Dict, Optional
-from database import StudentDB, GradeDB, AttendanceDB
+from sqlalchemy import func, case, select
+from database import db, StudentDB, GradeDB, AttendanceDB
+import attendance_store
+from sketches import grade_sketches, GradeSketch, QUANTILE_ERROR_BOUND
+from server_timing import span
+
+
+ATTENDANCE_GRANULARITIES = ('day', 'week', 'month')
 
 
 def calculate_mean(grades: List[float]) -> float:
@@ -63,23 +70,281 @@ def get_min_max(grades: List[float]) -> Dict[str, float]:
     }
 
 
+def fetch_final_grades(extra_columns: List = (), course: str = None,
+                       student_ids: List[str] = None, subject: str = None,
+                       join_students: bool = False, order_by: List = ()):
+    """
+    Columnar fetch of final grades (plus any extra columns) in one query.
+    Missing final grades are filled in SQL with the weighted formula from
+    GradeDB.calculate_final_grade, so only the needed columns are transferred.
+    
+    Args:
+        extra_columns: Additional GradeDB columns to fetch alongside
+        course: Optional course filter
+        student_ids: Optional list of student IDs
+        subject: Optional subject filter
+        join_students: Join StudentDB (needed when extra_columns include its columns)
+        order_by: Optional columns to order the rows by
+    
+    Returns:
+        (final grades array, list of arrays for each extra column)
+    """
+    final_grade = func.coalesce(
+        GradeDB.final_grade,
+        func.coalesce(GradeDB.midterm, 0) * 0.25 +
+        func.coalesce(GradeDB.finals, 0) * 0.35 +
+        func.coalesce(GradeDB.quizzes, 0) * 0.20 +
+        func.coalesce(GradeDB.projects, 0) * 0.20
+    )
+    query = select(final_grade, *extra_columns).select_from(GradeDB)
+    if course or join_students:
+        query = query.join(StudentDB, StudentDB.student_id == GradeDB.student_id)
+    if course:
+        query = query.where(StudentDB.course == course)
+    if student_ids:
+        query = query.where(GradeDB.student_id.in_(student_ids))
+    if subject:
+        query = query.where(GradeDB.subject == subject)
+    if order_by:
+        query = query.order_by(*order_by)
+    # Core execution on the session's connection skips ORM row processing
+    with span('db'):
+        rows = db.session.connection().execute(query).fetchall()
+    
+    if not rows:
+        return np.empty(0), [np.empty(0, dtype=object) for _ in extra_columns]
+    
+    with span('numpy'):
+        columns = list(zip(*rows))
+        final = np.array(columns[0], dtype=float)
+        extras = [np.array(column, dtype=object) for column in columns[1:]]
+    return final, extras
+
+
+def segment_statistics(keys: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Grouped statistics for many segments in one pass
+    
+    Values are sorted by (key, value) once; every statistic is then a
+    segment reduction (bincount sums, positional picks, run lengths) over
+    the contiguous runs, so the cost is one sort for all groups instead of
+    one query and scan each.
+    Results match calculate_mean/median/mode/std_deviation/variance per group.
+    
+    Args:
+        keys: Group key for each value (e.g. student ID or subject)
+        values: Grade values
+    
+    Returns:
+        Dictionary of arrays aligned with the sorted unique 'keys'
+    """
+    if len(values) == 0:
+        empty = np.empty(0)
+        return {'keys': np.empty(0, dtype=object), 'count': empty, 'mean': empty, 'median': empty,
+                'mode': empty, 'std_deviation': empty, 'variance': empty, 'min': empty, 'max': empty}
+    
+    unique_keys, key_index_unsorted = np.unique(keys, return_inverse=True)
+    order = np.lexsort((values, key_index_unsorted))
+    key_index = key_index_unsorted[order]
+    sorted_values = values[order]
+    
+    starts = np.flatnonzero(np.r_[True, key_index[1:] != key_index[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_values)])
+    
+    # bincount accumulates sequentially in fetch order, so sums agree with
+    # np.mean/np.var over the same rows down to the last bit
+    n_keys = len(unique_keys)
+    sums = np.bincount(key_index_unsorted, weights=values, minlength=n_keys)
+    means = sums / counts
+    deviations = values - means[key_index_unsorted]
+    sq_dev = np.bincount(key_index_unsorted, weights=deviations * deviations, minlength=n_keys)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.where(counts > 1, sq_dev / np.maximum(counts - 1, 1), 0.0)
+    
+    # Values are sorted inside each segment, so min/max/median are positional
+    minimums = sorted_values[starts]
+    maximums = sorted_values[starts + counts - 1]
+    medians = (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+    
+    # Mode of rounded values: rounding keeps each segment sorted, so equal
+    # rounded values form runs; keep the longest run per key (smallest value
+    # on ties, matching np.unique + argmax in calculate_mode)
+    rounded = np.round(sorted_values).astype(int)
+    run_starts = np.flatnonzero(np.r_[True, (key_index[1:] != key_index[:-1]) | (rounded[1:] != rounded[:-1])])
+    run_counts = np.diff(np.r_[run_starts, len(rounded)])
+    run_keys = key_index[run_starts]
+    run_values = rounded[run_starts]
+    best = np.lexsort((run_values, -run_counts, run_keys))
+    first_per_key = best[np.r_[True, run_keys[best][1:] != run_keys[best][:-1]]]
+    modes = run_values[first_per_key].astype(float)
+    
+    return {
+        'keys': unique_keys,
+        'count': counts,
+        'mean': means,
+        'median': medians,
+        'mode': modes,
+        'std_deviation': np.sqrt(variance),
+        'variance': variance,
+        'min': minimums,
+        'max': maximums
+    }
+
+
+def partitioned_segment_statistics(keys: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Grouped statistics for a few large segments (e.g. subjects)
+    
+    Rows are grouped with a stable sort on the key only; medians then come
+    from np.partition inside each segment (linear time, no value sort), and
+    modes from one histogram of (segment, rounded grade) pairs via bincount.
+    Sums use bincount in fetch order, so results match the per-group helpers.
+    
+    Returns:
+        Same layout as segment_statistics
+    """
+    if len(values) == 0:
+        return segment_statistics(keys, values)
+    
+    unique_keys, key_index = np.unique(keys, return_inverse=True)
+    n_keys = len(unique_keys)
+    counts = np.bincount(key_index, minlength=n_keys)
+    
+    sums = np.bincount(key_index, weights=values, minlength=n_keys)
+    means = sums / counts
+    deviations = values - means[key_index]
+    sq_dev = np.bincount(key_index, weights=deviations * deviations, minlength=n_keys)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.where(counts > 1, sq_dev / np.maximum(counts - 1, 1), 0.0)
+    
+    order = np.argsort(key_index, kind='stable')
+    grouped = values[order]
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    minimums = np.minimum.reduceat(grouped, starts)
+    maximums = np.maximum.reduceat(grouped, starts)
+    
+    medians = np.empty(n_keys)
+    for i, (start, count) in enumerate(zip(starts.tolist(), counts.tolist())):
+        lower, upper = (count - 1) // 2, count // 2
+        part = np.partition(grouped[start:start + count], [lower, upper])
+        medians[i] = (part[lower] + part[upper]) / 2
+    
+    # Histogram of rounded grades per segment; argmax picks the smallest
+    # value on ties, like calculate_mode
+    rounded = np.round(values).astype(np.int64)
+    low = rounded.min()
+    width = int(rounded.max() - low) + 1
+    histogram = np.bincount(key_index * width + (rounded - low), minlength=n_keys * width)
+    modes = (histogram.reshape(n_keys, width).argmax(axis=1) + low).astype(float)
+    
+    return {
+        'keys': unique_keys,
+        'count': counts,
+        'mean': means,
+        'median': medians,
+        'mode': modes,
+        'std_deviation': np.sqrt(variance),
+        'variance': variance,
+        'min': minimums,
+        'max': maximums
+    }
+
+
 def calculate_attendance_percentage(student_id: str) -> float:
-    """Calculate attendance percentage for a student"""
-    records = AttendanceDB.query.filter_by(student_id=student_id).all()
+    """Calculate attendance percentage for a student (popcount over attendance bitmaps)"""
+    return attendance_store.calculate_attendance_percentage(student_id)
+
+
+def _date_bucket(granularity: str):
+    """SQL expression truncating AttendanceDB.date (YYYY-MM-DD) to a bucket start"""
+    column = AttendanceDB.date
+    if granularity == 'day':
+        return func.substr(column, 1, 10)
+    if granularity == 'month':
+        return func.substr(column, 1, 7)
+
+    # Week buckets start on Monday
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return func.date(column, 'weekday 0', '-6 days')
+    if dialect == 'postgresql':
+        return func.to_char(func.date_trunc('week', func.cast(column, db.Date)), 'YYYY-MM-DD')
+    # MySQL / MariaDB
+    return func.date_format(
+        func.date_sub(column, db.text('INTERVAL WEEKDAY(attendance.date) DAY')), '%Y-%m-%d'
+    )
+
+
+def get_attendance_trends(granularity: str = 'day', student_id: str = None, course: str = None,
+                          date_from: str = None, date_to: str = None) -> Dict:
+    """
+    Attendance rate per day, week or month, computed with a grouped SQL
+    aggregate over the indexed attendance date column
     
-    if not records:
-        return 0.0
+    Args:
+        granularity: 'day', 'week' (Monday start) or 'month'
+        student_id: Optional student filter
+        course: Optional course filter
+        date_from: Optional inclusive start date (YYYY-MM-DD)
+        date_to: Optional inclusive end date (YYYY-MM-DD)
+    
+    Returns:
+        Dictionary with one entry per bucket and the overall rate
+    """
+    if granularity not in ATTENDANCE_GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(ATTENDANCE_GRANULARITIES)}")
+    
+    bucket = _date_bucket(granularity).label('bucket')
+    present = func.sum(case((AttendanceDB.status == 'present', 1), else_=0)).label('present')
+    total = func.count(AttendanceDB.id).label('total')
     
-    present_count = sum(1 for record in records if record.status == 'present')
-    total_count = len(records)
+    query = db.session.query(bucket, present, total)
+    if course:
+        query = query.join(StudentDB, StudentDB.student_id == AttendanceDB.student_id)
+        query = query.filter(StudentDB.course == course)
+    if student_id:
+        query = query.filter(AttendanceDB.student_id == student_id)
+    # Normalized ISO dates compare correctly against the stored date strings
+    if date_from:
+        date_from = attendance_store.parse_date(date_from).isoformat()
+        query = query.filter(AttendanceDB.date >= date_from)
+    if date_to:
+        date_to = attendance_store.parse_date(date_to).isoformat()
+        query = query.filter(AttendanceDB.date <= date_to)
+    
+    with span('db'):
+        rows = query.group_by(bucket).order_by(bucket).all()
+    
+    series = [
+        {
+            'period': row.bucket,
+            'present': int(row.present or 0),
+            'total': int(row.total),
+            'attendance_rate': round(float(row.present or 0) / row.total * 100, 2) if row.total else 0.0
+        }
+        for row in rows
+    ]
+    present_sum = sum(point['present'] for point in series)
+    total_sum = sum(point['total'] for point in series)
     
-    return (present_count / total_count) * 100
+    return {
+        'granularity': granularity,
+        'scope': {
+            'student_id': student_id,
+            'course': course,
+            'date_from': date_from,
+            'date_to': date_to
+        },
+        'series': series,
+        'overall_attendance_rate': round(present_sum / total_sum * 100, 2) if total_sum else 0.0
+    }
 
 
 def get_student_analytics(student_id: str) -> Dict:
     """Get comprehensive analytics for a specific student"""
     # Fetch grades
-    grade_records = GradeDB.query.filter_by(student_id=student_id).all()
+    with span('db'):
+        grade_records = GradeDB.query.filter_by(student_id=student_id).all()
     
     if not grade_records:
         return {
@@ -99,71 +364,156 @@ def get_student_analytics(student_id: str) -> Dict:
             final_grades.append(grade.final_grade)
     
     # Calculate statistics
-    min_max = get_min_max(final_grades)
-    attendance_pct = calculate_attendance_percentage(student_id)
+    with span('db'):
+        attendance_pct = calculate_attendance_percentage(student_id)
     
-    analytics = {
-        'student_id': student_id,
-        'total_subjects': len(grade_records),
+    with span('numpy'):
+        min_max = get_min_max(final_grades)
+        analytics = {
+            'student_id': student_id,
+            'total_subjects': len(grade_records),
+            'mean': round(calculate_mean(final_grades), 2),
+            'median': round(calculate_median(final_grades), 2),
+            'mode': round(calculate_mode(final_grades), 2),
+            'std_deviation': round(calculate_std_deviation(final_grades), 2),
+            'variance': round(calculate_variance(final_grades), 2),
+            'min_grade': round(min_max['min'], 2),
+            'max_grade': round(min_max['max'], 2),
+            'attendance_percentage': round(attendance_pct, 2),
+            'gpa': round(calculate_mean(final_grades) / 25, 2)  # Assuming 100-point scale to 4.0
+        }
+    
+    return analytics
+
+
+def get_all_student_analytics(course: str = None, student_ids: List[str] = None) -> List[Dict]:
+    """
+    Analytics for every student (or a filtered set) in one call
+    
+    Same metrics as get_student_analytics, computed from one columnar grade
+    fetch and one attendance bitmap fetch with vectorized group-by
+    reductions instead of two queries per student.
+    
+    Args:
+        course: Optional course filter
+        student_ids: Optional list of student IDs
+    
+    Returns:
+        List of analytics dictionaries, ordered by student ID
+    """
+    final_grades, (ids,) = fetch_final_grades([GradeDB.student_id], course=course, student_ids=student_ids)
+    if len(final_grades) == 0:
+        return []
+    
+    with span('numpy'):
+        stats = segment_statistics(ids.astype(str), final_grades)
+    keys = stats['keys'].tolist()
+    with span('db'):
+        attendance = attendance_store.attendance_percentages(keys if student_ids else None)
+    
+    # Python round() (not np.round) so values match get_student_analytics exactly
+    rounded = {name: [round(value, 2) for value in stats[name].tolist()]
+               for name in ('mean', 'median', 'mode', 'std_deviation', 'variance', 'min', 'max')}
+    gpa = [round(value / 25, 2) for value in stats['mean'].tolist()]  # Assuming 100-point scale to 4.0
+    counts = stats['count'].tolist()
+    
+    return [
+        {
+            'student_id': student_id,
+            'total_subjects': counts[i],
+            'mean': rounded['mean'][i],
+            'median': rounded['median'][i],
+            'mode': rounded['mode'][i],
+            'std_deviation': rounded['std_deviation'][i],
+            'variance': rounded['variance'][i],
+            'min_grade': rounded['min'][i],
+            'max_grade': rounded['max'][i],
+            'attendance_percentage': round(attendance.get(student_id, 0.0), 2),
+            'gpa': gpa[i]
+        }
+        for i, student_id in enumerate(keys)
+    ]
+
+
+def _grade_statistics(final_grades: List[float]) -> Dict:
+    """Exact statistics from a full list of grades"""
+    min_max = get_min_max(final_grades)
+    return {
+        'count': len(final_grades),
         'mean': round(calculate_mean(final_grades), 2),
         'median': round(calculate_median(final_grades), 2),
         'mode': round(calculate_mode(final_grades), 2),
         'std_deviation': round(calculate_std_deviation(final_grades), 2),
         'variance': round(calculate_variance(final_grades), 2),
         'min_grade': round(min_max['min'], 2),
-        'max_grade': round(min_max['max'], 2),
-        'attendance_percentage': round(attendance_pct, 2),
-        'gpa': round(calculate_mean(final_grades) / 25, 2)  # Assuming 100-point scale to 4.0
+        'max_grade': round(min_max['max'], 2)
     }
-    
-    return analytics
 
 
-def get_class_analytics() -> Dict:
-    """Get analytics for entire class"""
-    # Fetch all grades
-    all_grades = GradeDB.query.all()
+def _sketch_statistics(sketch: GradeSketch) -> Dict:
+    """Statistics from a grade sketch (the median is approximate, within QUANTILE_ERROR_BOUND)"""
+    min_max = sketch.min_max()
+    return {
+        'count': sketch.count,
+        'mean': round(sketch.mean(), 2),
+        'median': round(sketch.median(), 2),
+        'mode': round(sketch.mode(), 2),
+        'std_deviation': round(sketch.std_deviation(), 2),
+        'variance': round(sketch.variance(), 2),
+        'min_grade': round(min_max['min'], 2),
+        'max_grade': round(min_max['max'], 2)
+    }
+
+
+def get_class_analytics(exact: bool = False) -> Dict:
+    """
+    Get analytics for entire class
     
-    if not all_grades:
+    Args:
+        exact: Load every grade instead of reading the class grade sketch
+               (the sketch's median is approximate, within 0.05 points)
+    """
+    if exact:
+        final_grades, _ = fetch_final_grades()
+        with span('numpy'):
+            stats = _grade_statistics(final_grades.tolist()) if len(final_grades) else None
+    else:
+        with span('db'):
+            sketch = grade_sketches.get('class')
+        with span('numpy'):
+            stats = _sketch_statistics(sketch) if sketch.count else None
+    
+    if not stats:
         return {
             'error': 'No grades found in database'
         }
     
-    # Calculate final grades for all
-    final_grades = []
-    for grade in all_grades:
-        if grade.final_grade is None:
-            grade.calculate_final_grade()
-        final_grades.append(grade.final_grade)
-    
-    # Calculate overall attendance
-    all_attendance = AttendanceDB.query.all()
-    present_count = sum(1 for record in all_attendance if record.status == 'present')
-    total_attendance_records = len(all_attendance)
-    overall_attendance = (present_count / total_attendance_records * 100) if total_attendance_records > 0 else 0.0
-    
-    # Get statistics
-    min_max = get_min_max(final_grades)
+    # Calculate overall attendance from the bitmap store
+    with span('db'):
+        attendance_totals = attendance_store.overall_attendance()
+        total_students = StudentDB.query.count()
+    total_attendance_records = attendance_totals['recorded']
+    overall_attendance = (attendance_totals['present'] / total_attendance_records * 100) if total_attendance_records > 0 else 0.0
     
     analytics = {
-        'total_students': StudentDB.query.count(),
-        'total_grade_records': len(all_grades),
+        'total_students': total_students,
+        'total_grade_records': stats.pop('count'),
         'total_attendance_records': total_attendance_records,
-        'mean': round(calculate_mean(final_grades), 2),
-        'median': round(calculate_median(final_grades), 2),
-        'mode': round(calculate_mode(final_grades), 2),
-        'std_deviation': round(calculate_std_deviation(final_grades), 2),
-        'variance': round(calculate_variance(final_grades), 2),
-        'min_grade': round(min_max['min'], 2),
-        'max_grade': round(min_max['max'], 2),
-        'overall_attendance_percentage': round(overall_attendance, 2)
+        **stats,
+        'overall_attendance_percentage': round(overall_attendance, 2),
+        'exact': exact
     }
     
     return analytics
 
 
-def get_grade_distribution() -> Dict:
+def get_grade_distribution(exact: bool = False) -> Dict:
     """Get grade distribution for visualization"""
+    if not exact:
+        # Band edges fall on sketch bin edges, so these counts are exact
+        sketch = grade_sketches.get('class')
+        return sketch.distribution() if sketch.count else {'error': 'No grades found'}
+    
     all_grades = GradeDB.query.all()
     
     if not all_grades:
@@ -190,8 +540,28 @@ def get_grade_distribution() -> Dict:
     return distribution
 
 
-def get_subject_analytics(subject: str) -> Dict:
+def get_subject_analytics(subject: str, exact: bool = False) -> Dict:
     """Get analytics for a specific subject"""
+    if not exact:
+        sketch = grade_sketches.get(f'subject:{subject}')
+        if not sketch.count:
+            return {
+                'subject': subject,
+                'error': 'No grades found for this subject'
+            }
+        stats = _sketch_statistics(sketch)
+        return {
+            'subject': subject,
+            'total_students': stats['count'],
+            'mean': stats['mean'],
+            'median': stats['median'],
+            'mode': stats['mode'],
+            'std_deviation': stats['std_deviation'],
+            'min_grade': stats['min_grade'],
+            'max_grade': stats['max_grade'],
+            'exact': False
+        }
+    
     grades = GradeDB.query.filter_by(subject=subject).all()
     
     if not grades:
@@ -216,5 +586,87 @@ def get_subject_analytics(subject: str) -> Dict:
         'mode': round(calculate_mode(final_grades), 2),
         'std_deviation': round(calculate_std_deviation(final_grades), 2),
         'min_grade': round(min_max['min'], 2),
-        'max_grade': round(min_max['max'], 2)
+        'max_grade': round(min_max['max'], 2),
+        'exact': True
+    }
+
+
+def get_all_subject_analytics() -> List[Dict]:
+    """
+    Analytics for every subject in one pass
+    
+    Same metrics as get_subject_analytics, from a single columnar fetch of
+    (subject, final grade) instead of one query per subject.
+    
+    Returns:
+        List of analytics dictionaries, ordered by subject
+    """
+    final_grades, (subjects,) = fetch_final_grades([GradeDB.subject])
+    if len(final_grades) == 0:
+        return []
+    
+    with span('numpy'):
+        stats = partitioned_segment_statistics(subjects.astype(str), final_grades)
+    columns = {name: stats[name].tolist()
+               for name in ('count', 'mean', 'median', 'mode', 'std_deviation', 'min', 'max')}
+    
+    return [
+        {
+            'subject': subject,
+            'total_students': columns['count'][i],
+            'mean': round(columns['mean'][i], 2),
+            'median': round(columns['median'][i], 2),
+            'mode': round(columns['mode'][i], 2),
+            'std_deviation': round(columns['std_deviation'][i], 2),
+            'min_grade': round(columns['min'][i], 2),
+            'max_grade': round(columns['max'][i], 2)
+        }
+        for i, subject in enumerate(stats['keys'].tolist())
+    ]
+
+
+PERCENTILE_SCOPES = ('class', 'subject', 'course')
+
+
+def get_grade_percentiles(scope: str = 'class', name: str = None,
+                          percentiles: List[float] = (25, 50, 75, 90), exact: bool = False) -> Dict:
+    """
+    Grade percentiles and mode for the class, a subject or a course
+    
+    Args:
+        scope: 'class', 'subject' or 'course'
+        name: Subject or course name (required unless scope is 'class')
+        percentiles: Percentiles in [0, 100]
+        exact: Load every grade in scope instead of reading the sketch
+    
+    Returns:
+        Dictionary mapping each percentile to a grade, plus count and mode
+    """
+    if scope not in PERCENTILE_SCOPES:
+        raise ValueError(f"scope must be one of {', '.join(PERCENTILE_SCOPES)}")
+    if scope != 'class' and not name:
+        raise ValueError(f"name is required for scope '{scope}'")
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise ValueError('percentiles must be between 0 and 100')
+    
+    if exact:
+        final_grades, _ = fetch_final_grades(subject=name if scope == 'subject' else None,
+                                             course=name if scope == 'course' else None)
+        count = len(final_grades)
+        values = np.percentile(final_grades, percentiles).tolist() if count else [0.0] * len(percentiles)
+        mode = calculate_mode(final_grades.tolist()) if count else 0.0
+    else:
+        sketch = grade_sketches.get('class' if scope == 'class' else f'{scope}:{name}')
+        count = sketch.count
+        values = sketch.quantiles([p / 100 for p in percentiles])
+        mode = sketch.mode()
+    
+    return {
+        'scope': scope,
+        'name': name,
+        'count': count,
+        'percentiles': {f'{p:g}': round(v, 2) for p, v in zip(percentiles, values)},
+        'mode': round(mode, 2),
+        'exact': exact,
+        'error_bound': 0.0 if exact else QUANTILE_ERROR_BOUND
     }
@@ -0,0 +1,305 @@
+"""
+Analytics Snapshots
+Precomputed class analytics, grade distribution and class charts, stored in
+the analytics_snapshots table so dashboard reads at peak time do not each
+recompute them.
+
+Snapshots are refreshed by an in-process scheduler (SNAPSHOT_REFRESH_INTERVAL),
+by cron through the CLI, and after bulk imports. A snapshot is fresh while it
+was computed from the current 'analytics' data version and is younger than
+SNAPSHOT_MAX_AGE.
+
+Every write to students, grades or attendance calls invalidate_snapshots(),
+which bumps the data version and so marks every snapshot stale without
+deleting it. Reads serve a stale snapshot with its age and queue one
+background 'snapshots' job to refresh it (skipped while one for that key is
+queued or running), so the roll-call writes of the morning peak do not turn
+dashboard reads into live computations. Only a missing snapshot is computed
+during the request, by one request per key and process at a time; the
+others wait for its result.
+
+Each snapshot records the data version it was computed from, and a result
+never replaces one computed from a newer version; a result that overlapped
+a write is stored but stays stale.
+
+Usage:
+    python analytics_snapshots.py refresh [KEY ...]
+"""
+
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from database import db, SnapshotDB, DataVersionDB, JobDB
+from db_routing import use_primary
+from jobs import job_queue
+from server_timing import span
+from analytics import get_class_analytics, get_grade_distribution
+from visualizations import generate_class_performance_chart, generate_grade_distribution_pie_chart
+
+
+# Snapshot key -> function computing its JSON-serializable payload
+SNAPSHOTS: Dict[str, Callable] = {
+    'class-analytics': get_class_analytics,
+    'grade-distribution': get_grade_distribution,
+    'chart:class-performance': generate_class_performance_chart,
+    'chart:grade-distribution': generate_grade_distribution_pie_chart,
+}
+
+
+# DataVersionDB row bumped by invalidate_snapshots()
+DATA_VERSION = 'analytics'
+
+# One live computation of a missing snapshot per key at a time (per process)
+_compute_locks: Dict[str, threading.Lock] = {key: threading.Lock() for key in SNAPSHOTS}
+
+
+def _data_version() -> int:
+    return db.session.query(DataVersionDB.version).filter_by(name=DATA_VERSION).scalar() or 0
+
+
+def _store(key: str, payload, duration: float, version: int):
+    """
+    Store a result computed from data version `version`. If the data changed
+    while computing it is still stored (newer than the snapshot it replaces)
+    but stays stale, so the next read queues another refresh.
+    """
+    with use_primary():
+        existing = db.session.get(SnapshotDB, key, with_for_update=True, populate_existing=True)
+        if existing is not None and (existing.data_version or 0) > version:
+            # A computation from newer data stored first
+            db.session.rollback()
+            return
+        _write_snapshot(existing or SnapshotDB(key=key), payload, duration, version)
+
+
+def _write_snapshot(snapshot: SnapshotDB, payload, duration: float, version: int):
+    snapshot.payload = json.dumps(payload)
+    snapshot.computed_at = datetime.utcnow()
+    snapshot.duration_ms = round(duration * 1000, 1)
+    snapshot.data_version = version
+    db.session.add(snapshot)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request stored the same snapshot first; theirs is as fresh
+        db.session.rollback()
+
+
+def _compute(key: str, version: Optional[int] = None):
+    """(payload, seconds, data version it was computed from; read now unless given)"""
+    if version is None:
+        version = _data_version()
+    started = time.perf_counter()
+    payload = SNAPSHOTS[key]()
+    return payload, time.perf_counter() - started, version
+
+
+def refresh_snapshots(keys: Iterable[str] = None, older_than: float = None) -> Dict[str, float]:
+    """
+    Recompute and store snapshots
+
+    Args:
+        keys: Snapshot keys to refresh (all by default)
+        older_than: Only refresh snapshots that are stale or at least this
+                    many seconds old (lets several worker processes share
+                    one schedule, and skips keys refreshed meanwhile)
+
+    Returns:
+        Dictionary mapping each refreshed key to its computation time in ms
+
+    Raises:
+        ValueError: If a key is unknown
+    """
+    keys = list(keys or SNAPSHOTS)
+    unknown = [key for key in keys if key not in SNAPSHOTS]
+    if unknown:
+        raise ValueError(f"Unknown snapshot(s) {', '.join(unknown)}. Allowed: {', '.join(SNAPSHOTS)}")
+
+    refreshed = {}
+    for key in keys:
+        if older_than is not None:
+            existing = db.session.get(SnapshotDB, key)
+            if (existing is not None and existing.data_version == _data_version()
+                    and _age(existing) < older_than):
+                continue
+        payload, duration, version = _compute(key)
+        _store(key, payload, duration, version)
+        refreshed[key] = round(duration * 1000, 1)
+    return refreshed
+
+
+def _bump_version() -> bool:
+    updated = DataVersionDB.query.filter_by(name=DATA_VERSION).update(
+        {DataVersionDB.version: DataVersionDB.version + 1}, synchronize_session=False)
+    return updated > 0
+
+
+def invalidate_snapshots(drop: bool = False):
+    """
+    Bump the data version, marking every snapshot stale; call after
+    committing any change to students, grades or attendance
+
+    Args:
+        drop: Also delete the snapshots, so nothing from before the change
+              is served (bulk imports, clearing data)
+    """
+    if drop:
+        SnapshotDB.query.delete(synchronize_session=False)
+    if _bump_version():
+        db.session.commit()
+        return
+    db.session.add(DataVersionDB(name=DATA_VERSION, version=1))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process created the version row first
+        db.session.rollback()
+        if drop:
+            SnapshotDB.query.delete(synchronize_session=False)
+        _bump_version()
+        db.session.commit()
+
+
+def _age(snapshot: SnapshotDB) -> float:
+    return max((datetime.utcnow() - snapshot.computed_at).total_seconds(), 0.0)
+
+
+def _request_refresh(key: str, max_age: float):
+    """Queue a background refresh of a stale snapshot unless one for the key is queued or running"""
+    params = {'keys': [key], 'olderThan': max_age}
+    with use_primary():
+        pending = db.session.query(JobDB.id).filter(
+            JobDB.job_type == 'snapshots',
+            JobDB.status.in_(('queued', 'running')),
+            JobDB.params == json.dumps(params)
+        ).first()
+        if pending is None:
+            job_queue.submit('snapshots', params)
+
+
+def _served(snapshot: SnapshotDB, version: int, max_age: float) -> Tuple[object, Dict]:
+    """Payload and metadata of a stored snapshot, queueing a refresh if it is stale"""
+    age = _age(snapshot)
+    fresh = snapshot.data_version == version and age <= max_age
+    metadata = {
+        'source': 'snapshot' if fresh else 'stale',
+        'computedAt': snapshot.computed_at.isoformat(),
+        'ageSeconds': round(age, 1)
+    }
+    with span('snapshot'):
+        payload = json.loads(snapshot.payload)
+    if not fresh:
+        key = snapshot.key
+        try:
+            _request_refresh(key, max_age)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Could not queue refresh of snapshot {key}: {e}")
+    return payload, metadata
+
+
+def snapshot_or_live(key: str, max_age: float, live: bool = False) -> Tuple[object, Dict]:
+    """
+    Payload for a snapshot key, from the stored snapshot when there is one
+
+    A stale snapshot (older data version, or older than max_age) is still
+    served, and refreshed in the background. Only a missing snapshot is
+    computed live, one request per key at a time.
+
+    Args:
+        key: Snapshot key
+        max_age: Maximum age in seconds of a fresh snapshot
+        live: Skip the stored snapshot and compute live
+
+    Returns:
+        (payload, metadata with 'source' ('snapshot', 'stale' or 'live'),
+        'computedAt' and 'ageSeconds')
+    """
+    if not live:
+        with span('db'):
+            snapshot = db.session.get(SnapshotDB, key)
+            version = _data_version()
+        if snapshot is not None:
+            return _served(snapshot, version, max_age)
+
+        lock = _compute_locks[key]
+        waited = not lock.acquire(blocking=False)
+        if waited:
+            # Another request is computing this snapshot; use its result
+            lock.acquire()
+        try:
+            if waited:
+                # End the read transaction so the re-read sees the stored snapshot
+                db.session.commit()
+                with span('db'):
+                    snapshot = db.session.get(SnapshotDB, key, populate_existing=True)
+                    version = _data_version()
+                if snapshot is not None:
+                    return _served(snapshot, version, max_age)
+            return _live(key, version)
+        finally:
+            lock.release()
+
+    return _live(key)
+
+
+def _live(key: str, version: Optional[int] = None) -> Tuple[object, Dict]:
+    payload, duration, version = _compute(key, version)
+    _store(key, payload, duration, version)
+    return payload, {
+        'source': 'live',
+        'computedAt': datetime.utcnow().isoformat(),
+        'ageSeconds': 0.0
+    }
+
+
+class SnapshotScheduler:
+    """Daemon thread refreshing snapshots every interval seconds"""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.interval = 0.0
+
+    def start(self, app, interval: float):
+        """Start refreshing (no-op if interval <= 0 or already running)"""
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self.interval = interval
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(app,), name='snapshot-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, app):
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    # Skip snapshots another process refreshed recently
+                    refresh_snapshots(older_than=self.interval * 0.9)
+            except Exception as e:
+                print(f"Snapshot refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+
+# Shared scheduler started by create_app when SNAPSHOT_REFRESH_INTERVAL > 0
+snapshot_scheduler = SnapshotScheduler()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'refresh':
+        print(f"Usage: python analytics_snapshots.py refresh [{' | '.join(SNAPSHOTS)}]")
+        sys.exit(1)
+
+    app = create_app()
+    with app.app_context():
+        for key, ms in refresh_snapshots(sys.argv[2:] or None).items():
+            print(f"Refreshed {key} in {ms} ms")
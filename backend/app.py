@@ -6,15 +6,27 @@ Entry point for the Student Management System Backend
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import config
-from database import db, init_db
+from database import db, init_db, apply_sqlite_pragmas, add_missing_columns
 from routes import api
+from search_index import student_index
+from attendance_store import ensure_bitmaps
+from sketches import grade_sketches
+from rankings import rankings
+from jobs import job_queue
+from analytics_snapshots import snapshot_scheduler
+from events import event_hub
+from pool_metrics import InstrumentedQueuePool, instrument as instrument_pool
+from db_routing import replica_router
+from query_counter import query_counter
+from server_timing import server_timing
 import os
 
 
-def create_app(config_name='development'):
-    """Create and configure Flask application"""
+def create_app(config_name=None):
+    """Create and configure Flask application (config from FLASK_ENV by default)"""
     
     app = Flask(__name__)
+    config_name = config_name or os.getenv('FLASK_ENV', 'development')
     
     # Load configuration
     app.config.from_object(config[config_name])
@@ -24,20 +36,49 @@ def create_app(config_name='development'):
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "X-Read-Primary"]
         }
     })
     
-    # Initialize database
+    # Initialize database (pooled engines time their checkouts for /api/metrics/pool)
+    if 'pool_size' in app.config['SQLALCHEMY_ENGINE_OPTIONS']:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+                                                       poolclass=InstrumentedQueuePool)
+    replica_router.init_app(app)  # adds replica binds, so it goes first
     db.init_app(app)
+    query_counter.init_app(app)
+    server_timing.init_app(app)
     
     # Register blueprints
     app.register_blueprint(api, url_prefix='/api')
     
+    # Configure in-process search index
+    student_index.max_age = app.config['SEARCH_INDEX_MAX_AGE']
+    grade_sketches.max_age = app.config['GRADE_SKETCH_MAX_AGE']
+    rankings.max_age = app.config['GRADE_SKETCH_MAX_AGE']
+    event_hub.max_subscribers = app.config['EVENTS_MAX_SUBSCRIBERS']
+    
+    # Background job worker pool
+    job_queue.init_app(app)
+    
     # Create tables
     with app.app_context():
+        for engine in db.engines.values():
+            apply_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+            query_counter.instrument(engine)
         db.create_all()
+        add_missing_columns()
+        instrument_pool(db.engine)
+        for key in replica_router.keys:
+            instrument_pool(db.engines[key], key)
         print("✓ Database tables created successfully!")
+        ensure_bitmaps()
+    
+    # Claim queued jobs (including any left by a restart or another worker)
+    job_queue.start()
+    
+    # Periodic analytics snapshot refresh (off unless SNAPSHOT_REFRESH_INTERVAL > 0)
+    snapshot_scheduler.start(app, app.config['SNAPSHOT_REFRESH_INTERVAL'])
     
     # Root route
     @app.route('/')
@@ -54,6 +95,9 @@ def create_app(config_name='development'):
                 'predictions': '/api/predictions',
                 'charts': '/api/charts',
                 'data': '/api/data',
+                'jobs': '/api/jobs',
+                'metrics': '/api/metrics/pool',
+                'events': '/api/events',
                 'health': '/api/health'
             },
             'documentation': 'See README.md for full API documentation'
@@ -80,7 +124,7 @@ def create_app(config_name='development'):
     print("🎓 STUDENT MANAGEMENT SYSTEM API")
     print("="*60)
     print(f"📍 Environment: {config_name}")
-    print(f"🗄️  Database: {app.config['SQLALCHEMY_DATABASE_URI'].split('@')[1]}")
+    print(f"🗄️  Database: {app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1]}")
     print(f"🔗 CORS: Enabled for all origins")
     print("="*60 + "\n")
     
@@ -0,0 +1,388 @@
+"""
+ASGI Application
+Async deployment mode for high-concurrency setups. It serves the same /api/*
+surface as app.py:
+
+    * The list endpoints (GET /api/students, /api/grades, /api/attendance,
+      with the same filters, sorting and pagination) and the student detail
+      endpoint (GET /api/students/<id>) run on the event loop with an async
+      SQLAlchemy engine, so a slow query parks a coroutine instead of a
+      worker thread.
+    * GET /api/events streams are coroutines, woken by one thread per process
+      that waits on the event hub.
+    * Every other route runs the Flask app on executor threads. Analytics,
+      predictions, rankings and charts get their own small executor
+      (ASGI_COMPUTE_THREADS) so CPU-heavy work cannot take every thread from
+      the remaining routes (ASGI_THREADS).
+
+Usage:
+    pip install -r requirements-async.txt
+    uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import MultiDict
+from app import create_app
+from database import db, StudentDB, GradeDB, AttendanceDB, apply_sqlite_pragmas
+from pool_metrics import InstrumentedAsyncQueuePool, instrument
+from query_filters import LIST_SPECS, build_list_query, check_unindexed_sort, FilterError
+from events import (
+    event_hub, open_stream, render_events, parse_last_event_id,
+    TooManySubscribers, EVENT_ENTITIES
+)
+
+
+# Async driver per database backend
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+# Routes served by the Flask app on the compute executor
+COMPUTE_PREFIXES = ('/api/analytics', '/api/predictions', '/api/rankings', '/api/charts')
+
+# List endpoints served natively: path -> LIST_SPECS entity (also the response key)
+LIST_PATHS = {
+    '/api/students': 'students',
+    '/api/grades': 'grades',
+    '/api/attendance': 'attendance',
+}
+
+
+def async_database_uri(uri: str) -> str:
+    """The async-driver equivalent of a sync SQLAlchemy URI"""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+async def _send_body(send, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers + [(b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WsgiBridge:
+    """Runs a WSGI app for ASGI HTTP requests on executor threads, streaming its response"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    async def __call__(self, scope: Dict, receive, send, executor: ThreadPoolExecutor):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, self._run, scope, bytes(body), send, loop)
+
+    @staticmethod
+    def _environ(scope: Dict, body: bytes) -> Dict:
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    def _run(self, scope: Dict, body: bytes, send, loop: asyncio.AbstractEventLoop):
+        def call(message: Dict):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return write
+
+        def write(data: bytes):
+            if not response.get('sent'):
+                call({'type': 'http.response.start', 'status': response['status'],
+                      'headers': response['headers']})
+                response['sent'] = True
+            if data:
+                call({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        chunks = self.wsgi_app(self._environ(scope, body), start_response)
+        try:
+            for chunk in chunks:
+                write(chunk)
+            write(b'')
+            call({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+
+class EventFanout:
+    """Wakes the event-stream coroutines of one event loop whenever the hub publishes"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._changed = asyncio.Event()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._watch, name='event-fanout', daemon=True).start()
+
+    def _watch(self):
+        version = event_hub.version
+        while not self._stopped.is_set():
+            latest, _ = event_hub.wait(version, 1.0)
+            if latest != version:
+                version = latest
+                try:
+                    self._loop.call_soon_threadsafe(self._wake)
+                except RuntimeError:  # loop closed
+                    return
+
+    def _wake(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def waiter(self) -> asyncio.Event:
+        """Event set at the next publish (take it before re-reading the hub)"""
+        return self._changed
+
+    def stop(self):
+        self._stopped.set()
+
+
+class AsgiApp:
+    """ASGI entry point: native async routes plus the Flask app for the rest"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.wsgi = WsgiBridge(flask_app)
+        self.threads = ThreadPoolExecutor(self.config['ASGI_THREADS'], thread_name_prefix='asgi')
+        self.compute = ThreadPoolExecutor(self.config['ASGI_COMPUTE_THREADS'], thread_name_prefix='asgi-compute')
+
+        with flask_app.app_context():
+            sync_url = db.engine.url  # relative SQLite paths already resolved to instance/
+        uri = self.config['ASYNC_DATABASE_URI'] or async_database_uri(sync_url.render_as_string(hide_password=False))
+        options = {'pool_pre_ping': True}
+        if make_url(uri).get_backend_name() != 'sqlite':
+            sync_options = self.config['SQLALCHEMY_ENGINE_OPTIONS']
+            options.update(poolclass=InstrumentedAsyncQueuePool,
+                           pool_size=self.config['ASYNC_POOL_SIZE'],
+                           max_overflow=self.config['ASYNC_MAX_OVERFLOW'],
+                           pool_timeout=sync_options.get('pool_timeout', 30),
+                           pool_recycle=sync_options.get('pool_recycle', -1))
+        self.engine = create_async_engine(uri, **options)
+        apply_sqlite_pragmas(self.engine.sync_engine, self.config['SQLITE_PRAGMAS'])
+        instrument(self.engine, 'async')
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self._fanout: Optional[EventFanout] = None
+
+    async def __call__(self, scope: Dict, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        path = scope['path']
+        if scope['method'] == 'GET':
+            if path in LIST_PATHS:
+                await self._respond(scope, send, self._list(LIST_PATHS[path], self._args(scope)))
+                return
+            student_id = path[len('/api/students/'):] if path.startswith('/api/students/') else ''
+            if student_id and '/' not in student_id and student_id != 'search':
+                await self._respond(scope, send, self._student_detail(student_id))
+                return
+            if path == '/api/events':
+                await self._events(scope, receive, send)
+                return
+
+        executor = self.compute if path.startswith(COMPUTE_PREFIXES) else self.threads
+        await self.wsgi(scope, receive, send, executor)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._fanout is not None:
+                    self._fanout.stop()
+                await self.engine.dispose()
+                self.threads.shutdown(wait=False)
+                self.compute.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ---------- responses ----------
+
+    @staticmethod
+    def _args(scope: Dict) -> MultiDict:
+        return MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+
+    @staticmethod
+    def _header(scope: Dict, name: bytes) -> Optional[str]:
+        for key, value in scope['headers']:
+            if key == name:
+                return value.decode('latin-1')
+        return None
+
+    def _cors_headers(self, scope: Dict) -> List[Tuple[bytes, bytes]]:
+        # Same headers flask-cors adds for the app's "any origin" policy on /api/*
+        origin = self._header(scope, b'origin')
+        if origin is None:
+            return []
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+
+    def _json(self, data: Dict) -> bytes:
+        """Serialize like the Flask app's jsonify (same provider and formatting)"""
+        provider = self.flask_app.json
+        if (provider.compact is None and self.flask_app.debug) or provider.compact is False:
+            text = provider.dumps(data, indent=2)
+        else:
+            text = provider.dumps(data, separators=(',', ':'))
+        return f'{text}\n'.encode('utf-8')
+
+    async def _respond(self, scope: Dict, send, handler):
+        try:
+            data, status = await handler
+        except FilterError as e:
+            data, status = {'success': False, 'error': str(e)}, 400
+        except Exception as e:
+            data, status = {'success': False, 'error': str(e)}, 500
+        headers = [(b'content-type', b'application/json')] + self._cors_headers(scope)
+        await _send_body(send, status, headers, self._json(data))
+
+    # ---------- native routes ----------
+
+    async def _list(self, entity: str, args: MultiDict) -> Tuple[Dict, int]:
+        """Same response as the Flask list routes"""
+        model = LIST_SPECS[entity]['model']
+        query, unindexed = build_list_query(entity, args, select(model))
+        async with self.sessions() as session:
+            if unindexed:
+                row_count = await session.scalar(select(func.count()).select_from(model))
+                check_unindexed_sort(unindexed, row_count, self.config['LIST_MAX_UNINDEXED_SORT_ROWS'])
+            rows = (await session.scalars(query)).all()
+        return {
+            'success': True,
+            entity: [row.to_dict() for row in rows],
+            'count': len(rows)
+        }, 200
+
+    async def _student_detail(self, student_id: str) -> Tuple[Dict, int]:
+        """Same response as GET /api/students/<id> in routes.py"""
+        async with self.sessions() as session:
+            student = await session.scalar(select(StudentDB).filter_by(student_id=student_id).limit(1))
+            if not student:
+                return {'success': False, 'error': 'Student not found'}, 404
+            grades = (await session.scalars(select(GradeDB).filter_by(student_id=student_id))).all()
+            attendance = (await session.scalars(select(AttendanceDB).filter_by(student_id=student_id))).all()
+        return {
+            'success': True,
+            'student': student.to_dict(),
+            'grades': [grade.to_dict() for grade in grades],
+            'attendance': [record.to_dict() for record in attendance]
+        }, 200
+
+    async def _events(self, scope: Dict, receive, send):
+        """GET /api/events as a coroutine per stream (see routes.get_events)"""
+        args = self._args(scope)
+        entities = None
+        if args.get('entities'):
+            entities = {name.strip() for name in args['entities'].split(',') if name.strip()}
+            if entities - set(EVENT_ENTITIES):
+                await self._respond(scope, send, self._error(
+                    f"entities must be among {', '.join(EVENT_ENTITIES)}", 400))
+                return
+        after = parse_last_event_id(self._header(scope, b'last-event-id') or args.get('lastEventId'), event_hub)
+
+        try:
+            event_hub.subscribe()
+        except TooManySubscribers as e:
+            await self._respond(scope, send, self._error(str(e), 503))
+            return
+
+        if self._fanout is None:
+            self._fanout = EventFanout(asyncio.get_running_loop())
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ] + self._cors_headers(scope)})
+            cursor, text = open_stream(event_hub, after, self.config['EVENTS_RETRY_MS'])
+            await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+            while not disconnected.done():
+                changed = self._fanout.waiter()
+                latest, events = event_hub.wait(cursor, 0)
+                if events == [] and latest == cursor:
+                    waiter = asyncio.ensure_future(changed.wait())
+                    done, _ = await asyncio.wait({waiter, disconnected}, timeout=self.config['EVENTS_HEARTBEAT'],
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    if done:
+                        continue
+                text = render_events(event_hub, latest, events, entities)
+                if text:
+                    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+                cursor = latest
+        except OSError:
+            pass  # client went away mid-send
+        finally:
+            disconnected.cancel()
+            event_hub.unsubscribe()
+
+    @staticmethod
+    async def _error(message: str, status: int) -> Tuple[Dict, int]:
+        return {'success': False, 'error': message}, status
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+
+def create_asgi_app(config_name: str = None) -> AsgiApp:
+    """Create the Flask app and wrap it for ASGI servers (uvicorn --factory)"""
+    return AsgiApp(create_app(config_name or os.getenv('FLASK_ENV', 'development')))
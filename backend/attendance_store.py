@@ -0,0 +1,441 @@
+"""
+Bitmap Attendance Store
+Packs attendance into one bit per student per day, per (student, term), and
+computes percentages, streaks and calendars with popcount and bitwise ops.
+
+The attendance rows table is still written (it backs the row API, record IDs
+and date-based SQL queries); the bitmaps are the compact copy that all
+attendance statistics read from.
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from database import db, AttendanceDB, AttendanceBitmapDB
+from db_routing import use_primary
+
+
+# Two terms per year: Jan-Jun and Jul-Dec. 184 days covers the longer half.
+TERM_DAYS = 184
+TERM_BYTES = (TERM_DAYS + 7) // 8
+
+VALID_STATUSES = ('present', 'absent')
+
+# Number of set bits in every possible byte value
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def parse_date(value: str) -> date:
+    """Parse a YYYY-MM-DD date (a time part is ignored); raises ValueError"""
+    try:
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def term_for_date(value: str) -> Tuple[str, date, int]:
+    """
+    Locate a date within its term
+
+    Returns:
+        (term key, term start date, day index within the term)
+    """
+    day = parse_date(value)
+    half = 1 if day.month <= 6 else 2
+    start = date(day.year, 1 if half == 1 else 7, 1)
+    return f'{day.year}-{half}', start, (day - start).days
+
+
+def _empty_bits() -> bytes:
+    return bytes(TERM_BYTES)
+
+
+def _set_bit(bits: bytearray, index: int, value: bool):
+    if value:
+        bits[index >> 3] |= 1 << (index & 7)
+    else:
+        bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+
+def popcount(bits: bytes) -> int:
+    """Number of set bits in a packed bitmap"""
+    return int(POPCOUNT_TABLE[np.frombuffer(bits, dtype=np.uint8)].sum(dtype=np.int64))
+
+
+def _unpack(bits: bytes) -> np.ndarray:
+    return np.unpackbits(np.frombuffer(bits, dtype=np.uint8), bitorder='little')[:TERM_DAYS].astype(bool)
+
+
+def _insert_missing(student_ids: List[str], term: str, term_start: date):
+    """
+    Create empty bitmaps for students that have none for the term yet. A row
+    created concurrently by another writer is left alone: the batch insert is
+    retried row by row, each in its own savepoint.
+    """
+    rows = [{
+        'student_id': student_id,
+        'term': term,
+        'term_start': term_start.isoformat(),
+        'present_bits': _empty_bits(),
+        'recorded_bits': _empty_bits(),
+        'updated_at': datetime.utcnow()
+    } for student_id in student_ids]
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(AttendanceBitmapDB), rows)
+        return
+    except IntegrityError:
+        pass
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(AttendanceBitmapDB), [row])
+        except IntegrityError:
+            pass
+
+
+def _get_bitmaps(student_ids: Iterable[str], term: str, term_start: date) -> Dict[str, AttendanceBitmapDB]:
+    """
+    Load (creating where missing) the bitmaps for several students, locked
+    with SELECT ... FOR UPDATE until the caller commits, so concurrent writes
+    to the same bitmaps apply one after another instead of losing bits
+    """
+    student_ids = sorted(set(student_ids))
+
+    def locked():
+        # Fixed lock order (by student ID) so two roll calls cannot deadlock
+        return AttendanceBitmapDB.query.filter(
+            AttendanceBitmapDB.student_id.in_(student_ids),
+            AttendanceBitmapDB.term == term
+        ).order_by(AttendanceBitmapDB.student_id).with_for_update().populate_existing().all()
+
+    with use_primary():
+        bitmaps = {bitmap.student_id: bitmap for bitmap in locked()}
+        missing = [student_id for student_id in student_ids if student_id not in bitmaps]
+        if missing:
+            _insert_missing(missing, term, term_start)
+            bitmaps = {bitmap.student_id: bitmap for bitmap in locked()}
+    return bitmaps
+
+
+def _apply(bitmap: AttendanceBitmapDB, index: int, status: Optional[str]):
+    """Set one day on a bitmap; status None clears the day"""
+    present = bytearray(bitmap.present_bits)
+    recorded = bytearray(bitmap.recorded_bits)
+    _set_bit(present, index, status == 'present')
+    _set_bit(recorded, index, status is not None)
+    bitmap.present_bits = bytes(present)
+    bitmap.recorded_bits = bytes(recorded)
+
+
+def record_day(student_id: str, day: str, status: Optional[str]):
+    """
+    Mirror a single attendance record into the bitmap store.
+    Does not commit; the caller commits together with the row change.
+    """
+    term, start, index = term_for_date(day)
+    bitmap = _get_bitmaps([student_id], term, start)[student_id]
+    _apply(bitmap, index, status)
+
+
+def roll_call(day: str, statuses: Dict[str, str]) -> Dict:
+    """
+    Record a whole section's attendance for one day atomically
+
+    Existing rows for these students on that day are replaced by one bulk
+    insert, and every bitmap is updated in the same transaction.
+
+    Args:
+        day: Date in YYYY-MM-DD format
+        statuses: Mapping of student ID to 'present' or 'absent'
+
+    Returns:
+        Dictionary with counts of present/absent students recorded
+    """
+    invalid = {sid: status for sid, status in statuses.items() if status not in VALID_STATUSES}
+    if invalid:
+        raise ValueError(f"Invalid status for students: {', '.join(sorted(invalid))}")
+
+    term, start, index = term_for_date(day)
+    day = parse_date(day).isoformat()
+    student_ids = list(statuses)
+
+    try:
+        AttendanceDB.query.filter(
+            AttendanceDB.student_id.in_(student_ids),
+            AttendanceDB.date == day
+        ).delete(synchronize_session=False)
+
+        now = datetime.utcnow()
+        db.session.execute(insert(AttendanceDB), [
+            {'student_id': sid, 'date': day, 'status': status, 'created_at': now}
+            for sid, status in statuses.items()
+        ])
+
+        bitmaps = _get_bitmaps(student_ids, term, start)
+        for sid, status in statuses.items():
+            _apply(bitmaps[sid], index, status)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    present = sum(1 for status in statuses.values() if status == 'present')
+    return {
+        'date': day,
+        'term': term,
+        'recorded': len(statuses),
+        'present': present,
+        'absent': len(statuses) - present
+    }
+
+
+def _student_bitmaps(student_id: str) -> List[AttendanceBitmapDB]:
+    return AttendanceBitmapDB.query.filter_by(student_id=student_id).order_by(AttendanceBitmapDB.term).all()
+
+
+def calculate_attendance_percentage(student_id: str) -> float:
+    """Attendance percentage for a student via popcount over all terms"""
+    present = recorded = 0
+    for bitmap in _student_bitmaps(student_id):
+        present += popcount(bitmap.present_bits)
+        recorded += popcount(bitmap.recorded_bits)
+    return (present / recorded * 100) if recorded else 0.0
+
+
+def attendance_percentages(student_ids: Iterable[str] = None) -> Dict[str, float]:
+    """
+    Attendance percentage for many students from one bitmap fetch
+
+    Popcounts every bitmap row as a 2-D byte array and sums per student with
+    bincount, so the cost does not depend on the number of queries.
+    """
+    query = db.session.query(AttendanceBitmapDB.student_id,
+                             AttendanceBitmapDB.present_bits,
+                             AttendanceBitmapDB.recorded_bits)
+    if student_ids is not None:
+        query = query.filter(AttendanceBitmapDB.student_id.in_(list(student_ids)))
+    rows = query.all()
+    if not rows:
+        return {}
+
+    ids, inverse = np.unique([row[0] for row in rows], return_inverse=True)
+    present = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.uint8).reshape(len(rows), -1)
+    recorded = np.frombuffer(b''.join(row[2] for row in rows), dtype=np.uint8).reshape(len(rows), -1)
+
+    present_days = np.bincount(inverse, weights=POPCOUNT_TABLE[present].sum(axis=1), minlength=len(ids))
+    recorded_days = np.bincount(inverse, weights=POPCOUNT_TABLE[recorded].sum(axis=1), minlength=len(ids))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(recorded_days > 0, present_days / recorded_days * 100, 0.0)
+    return dict(zip(ids.tolist(), pct.tolist()))
+
+
+def attendance_rates_and_streaks(student_ids: Iterable[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Attendance percentage and current absence streak for many students
+
+    Bitmap rows are fetched in (student, term) order and unpacked into one
+    boolean matrix. Per row, the streak tail is the number of recorded days
+    after its last present day; a student's current streak is the sum of the
+    tails from their last row with a present day onwards.
+
+    Returns:
+        (student IDs, attendance percentages, current absence streaks) arrays
+    """
+    query = db.session.query(AttendanceBitmapDB.student_id,
+                             AttendanceBitmapDB.present_bits,
+                             AttendanceBitmapDB.recorded_bits)
+    if student_ids is not None:
+        query = query.filter(AttendanceBitmapDB.student_id.in_(list(student_ids)))
+    rows = query.order_by(AttendanceBitmapDB.student_id, AttendanceBitmapDB.term).all()
+    if not rows:
+        return np.empty(0, dtype=object), np.empty(0), np.empty(0, dtype=np.int64)
+
+    row_ids = np.array([row[0] for row in rows], dtype=object)
+    starts = np.flatnonzero(np.r_[True, row_ids[1:] != row_ids[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(rows)]))
+
+    shape = (len(rows), -1)
+    present = np.unpackbits(np.frombuffer(b''.join(row[1] for row in rows), dtype=np.uint8).reshape(shape),
+                            axis=1, bitorder='little')[:, :TERM_DAYS].astype(bool)
+    recorded = np.unpackbits(np.frombuffer(b''.join(row[2] for row in rows), dtype=np.uint8).reshape(shape),
+                             axis=1, bitorder='little')[:, :TERM_DAYS].astype(bool)
+    present &= recorded
+
+    present_days = np.bincount(group, weights=present.sum(axis=1), minlength=len(starts))
+    recorded_days = np.bincount(group, weights=recorded.sum(axis=1), minlength=len(starts))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(recorded_days > 0, present_days / recorded_days * 100, 0.0)
+
+    # Recorded days after the last present day of each row (all of them if none)
+    has_present = present.any(axis=1)
+    last_present = TERM_DAYS - 1 - np.argmax(present[:, ::-1], axis=1)
+    after_last = np.arange(TERM_DAYS) > last_present[:, None]
+    tails = np.where(has_present, (recorded & after_last).sum(axis=1), recorded.sum(axis=1))
+
+    # Rows from each student's last row with a present day onwards
+    row_index = np.arange(len(rows))
+    last_present_row = np.maximum.reduceat(np.where(has_present, row_index, -1), starts)
+    counted = row_index >= last_present_row[group]
+    streaks = np.bincount(group, weights=np.where(counted, tails, 0), minlength=len(starts))
+
+    return row_ids[starts], pct, streaks.astype(np.int64)
+
+
+def overall_attendance() -> Dict[str, int]:
+    """Present and recorded day totals across every student and term"""
+    rows = db.session.query(AttendanceBitmapDB.present_bits, AttendanceBitmapDB.recorded_bits).all()
+    if not rows:
+        return {'present': 0, 'recorded': 0}
+
+    present = np.frombuffer(b''.join(row[0] for row in rows), dtype=np.uint8)
+    recorded = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.uint8)
+    return {
+        'present': int(POPCOUNT_TABLE[present].sum(dtype=np.int64)),
+        'recorded': int(POPCOUNT_TABLE[recorded].sum(dtype=np.int64))
+    }
+
+
+def _longest_run(mask: np.ndarray) -> int:
+    """Length of the longest run of True values"""
+    if not mask.any():
+        return 0
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return int((edges[1::2] - edges[0::2]).max())
+
+
+def _trailing_run(mask: np.ndarray) -> int:
+    """Length of the run of True values at the end of the array"""
+    false_positions = np.flatnonzero(~mask)
+    return int(len(mask) - 1 - false_positions[-1]) if len(false_positions) else len(mask)
+
+
+def attendance_summary(student_id: str) -> Dict:
+    """
+    Attendance totals and streaks for a student
+
+    Streaks count consecutive recorded days (days without attendance taken,
+    such as weekends, neither extend nor break a streak).
+    """
+    bitmaps = _student_bitmaps(student_id)
+    if not bitmaps:
+        return {'student_id': student_id, 'error': 'No attendance found for this student'}
+
+    present = np.concatenate([_unpack(b.present_bits) for b in bitmaps])
+    recorded = np.concatenate([_unpack(b.recorded_bits) for b in bitmaps])
+    taken = present[recorded]
+
+    present_days = int(taken.sum())
+    total_days = int(len(taken))
+    return {
+        'student_id': student_id,
+        'recorded_days': total_days,
+        'present_days': present_days,
+        'absent_days': total_days - present_days,
+        'attendance_percentage': round(present_days / total_days * 100, 2) if total_days else 0.0,
+        'current_present_streak': _trailing_run(taken),
+        'current_absent_streak': _trailing_run(~taken),
+        'longest_present_streak': _longest_run(taken),
+        'longest_absent_streak': _longest_run(~taken),
+        'terms': [b.term for b in bitmaps]
+    }
+
+
+def attendance_calendar(student_id: str, term: str = None) -> Dict:
+    """Day-by-day attendance for one term (defaults to the latest term)"""
+    query = AttendanceBitmapDB.query.filter_by(student_id=student_id)
+    if term:
+        query = query.filter_by(term=term)
+    bitmap = query.order_by(AttendanceBitmapDB.term.desc()).first()
+
+    if not bitmap:
+        return {'student_id': student_id, 'term': term, 'error': 'No attendance found for this term'}
+
+    start = parse_date(bitmap.term_start)
+    present = _unpack(bitmap.present_bits)
+    days = np.flatnonzero(_unpack(bitmap.recorded_bits))
+    return {
+        'student_id': student_id,
+        'term': bitmap.term,
+        'days': [
+            {
+                'date': (start + timedelta(days=int(i))).isoformat(),
+                'status': 'present' if present[i] else 'absent'
+            }
+            for i in days
+        ]
+    }
+
+
+def rebuild_bitmaps(student_ids: Iterable[str] = None) -> int:
+    """
+    Rebuild bitmaps from the attendance rows table (migration, and after
+    bulk imports that bypass the row API)
+
+    Returns:
+        Number of bitmaps written
+    """
+    query = db.session.query(AttendanceDB.student_id, AttendanceDB.date, AttendanceDB.status)
+    delete_query = AttendanceBitmapDB.query
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        query = query.filter(AttendanceDB.student_id.in_(student_ids))
+        delete_query = delete_query.filter(AttendanceBitmapDB.student_id.in_(student_ids))
+
+    packed: Dict[Tuple[str, str], Dict] = {}
+    for student_id, day, status in query.order_by(AttendanceDB.id):
+        try:
+            term, start, index = term_for_date(day)
+        except ValueError:
+            continue
+        entry = packed.setdefault((student_id, term), {
+            'term_start': start.isoformat(),
+            'present': bytearray(TERM_BYTES),
+            'recorded': bytearray(TERM_BYTES)
+        })
+        _set_bit(entry['present'], index, status == 'present')
+        _set_bit(entry['recorded'], index, True)
+
+    try:
+        delete_query.delete(synchronize_session=False)
+        if packed:
+            db.session.execute(insert(AttendanceBitmapDB), [
+                {
+                    'student_id': student_id,
+                    'term': term,
+                    'term_start': entry['term_start'],
+                    'present_bits': bytes(entry['present']),
+                    'recorded_bits': bytes(entry['recorded']),
+                    'updated_at': datetime.utcnow()
+                }
+                for (student_id, term), entry in packed.items()
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(packed)
+
+
+def ensure_bitmaps():
+    """Build bitmaps once for databases that only have attendance rows"""
+    if AttendanceBitmapDB.query.first() is None and AttendanceDB.query.first() is not None:
+        count = rebuild_bitmaps()
+        print(f"✓ Built {count} attendance bitmaps from existing records")
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+            print(f"Rebuilt {rebuild_bitmaps()} attendance bitmaps")
+        else:
+            print("Usage: python attendance_store.py rebuild")
@@ -0,0 +1,139 @@
+"""
+Prediction Backtesting
+Replays every (student, subject) grade history with an expanding window:
+each grade after the first min_history is predicted from the linear fit of
+the grades before it, exactly as linear_regression_predict would, and the
+errors are summarized per subject and per trend bucket.
+
+All prefix fits come from within-segment cumulative sums, so the whole
+history is scored in one vectorized pass instead of one polyfit per prefix.
+
+Usage:
+    python backtest.py [--subject NAME] [--min-history N] [--output FILE]
+
+Without --output the JSON report is the only thing written to stdout (the
+app's startup messages go to stderr), so it can be redirected to a file.
+"""
+
+import argparse
+import json
+import sys
+from contextlib import redirect_stdout
+from typing import Dict
+import numpy as np
+from predictions import (
+    fetch_grade_histories, trend_labels, calculate_prediction_accuracy
+)
+
+
+def expanding_window_predictions(values: np.ndarray, segment: np.ndarray, position: np.ndarray,
+                                 lengths: np.ndarray, min_history: int = 2) -> Dict[str, np.ndarray]:
+    """
+    One-step-ahead linear predictions for every grade with at least
+    min_history earlier grades in its segment
+
+    Args:
+        values, segment, position, lengths: Flat segments (see fetch_grade_histories)
+        min_history: Number of earlier grades required (at least 2)
+
+    Returns:
+        Dictionary with 'index' (position of each predicted grade in values),
+        'actual', 'predicted' and 'slope' (of the prefix fit) arrays
+    """
+    min_history = max(int(min_history), 2)
+    # Running sums of y and x*y over the earlier grades of each segment
+    starts = np.cumsum(lengths) - lengths
+    sum_y = np.cumsum(values) - values
+    sum_xy = np.cumsum(position * values) - position * values
+    sum_y -= sum_y[starts][segment]
+    sum_xy -= sum_xy[starts][segment]
+
+    index = np.flatnonzero(position >= min_history)
+    k = position[index].astype(float)  # number of earlier grades
+    mean_x = (k - 1) / 2
+    mean_y = sum_y[index] / k
+    sxx = k * (k * k - 1) / 12
+    slope = (sum_xy[index] - k * mean_x * mean_y) / sxx
+    predicted = np.clip(mean_y + slope * (k - mean_x), 0, 100)
+
+    return {
+        'index': index,
+        'actual': values[index],
+        'predicted': predicted,
+        'slope': slope
+    }
+
+
+def _grouped_accuracy(keys: np.ndarray, actual: np.ndarray, predicted: np.ndarray) -> Dict[str, Dict]:
+    """calculate_prediction_accuracy for each key, after one sort"""
+    if len(keys) == 0:
+        return {}
+    names, inverse = np.unique(keys.astype(str), return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.r_[0, np.cumsum(np.bincount(inverse, minlength=len(names)))]
+    groups = {}
+    for i, name in enumerate(names.tolist()):
+        rows = order[bounds[i]:bounds[i + 1]]
+        groups[name] = dict(calculate_prediction_accuracy(actual[rows], predicted[rows]),
+                            count=int(len(rows)))
+    return groups
+
+
+def run_backtest(subject: str = None, course: str = None, min_history: int = 2) -> Dict:
+    """
+    Backtest linear_regression_predict against the stored grade histories
+
+    Args:
+        subject: Optional subject filter
+        course: Optional course filter
+        min_history: Earlier grades required before a grade is predicted
+
+    Returns:
+        Dictionary with overall, per-subject and per-trend accuracy metrics
+    """
+    histories = fetch_grade_histories(subject=subject, course=course)
+    result = expanding_window_predictions(histories['values'], histories['segment'],
+                                          histories['position'], histories['lengths'],
+                                          min_history)
+    actual, predicted = result['actual'], result['predicted']
+    summary = {
+        'histories': int(len(histories['lengths'])),
+        'predictions': int(len(actual)),
+        'min_history': max(int(min_history), 2)
+    }
+    if len(actual) == 0:
+        return dict(summary, overall=None, by_subject={}, by_trend={})
+
+    subjects = histories['subjects'][histories['segment'][result['index']]]
+    return dict(
+        summary,
+        overall=calculate_prediction_accuracy(actual, predicted),
+        by_subject=_grouped_accuracy(subjects, actual, predicted),
+        by_trend=_grouped_accuracy(trend_labels(result['slope']), actual, predicted)
+    )
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Backtest grade predictions on stored histories')
+    parser.add_argument('--subject', help='Only backtest this subject')
+    parser.add_argument('--course', help='Only backtest students in this course')
+    parser.add_argument('--min-history', type=int, default=2,
+                        help='Earlier grades required before predicting (default 2)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    # Keep stdout for the report: the startup banner and progress go to stderr
+    with redirect_stdout(sys.stderr):
+        app = create_app()
+        with app.app_context():
+            report = run_backtest(args.subject, args.course, args.min_history)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"Backtest report written to {args.output}")
+    else:
+        sys.stdout.write(text + '\n')
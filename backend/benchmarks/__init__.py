@@ -0,0 +1,17 @@
+"""
+Benchmark Suite
+Times the public analytics, prediction, chart and JSON import/export
+functions against generated datasets of several sizes, on the SQLite bench
+profile, and compares each run with a stored baseline.
+
+Run from the backend directory:
+
+    python -m benchmarks [--sizes small,medium] [--repeat 5] [--only NAME]
+        [--output results.json] [--baseline benchmarks/baseline.json]
+        [--threshold 0.25] [--save-baseline]
+
+The process exits with status 1 when a benchmark's median is more than
+--threshold slower than its baseline median. Baselines are only comparable
+on the machine that recorded them; every result file carries the
+environment it was measured in.
+"""
@@ -0,0 +1,90 @@
+"""
+Benchmark CLI: python -m benchmarks --help
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Time analytics, predictions, charts and JSON I/O')
+    parser.add_argument('--sizes', default='small,medium', help='Comma-separated dataset sizes: small, medium, large')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed calls per benchmark (default 5)')
+    parser.add_argument('--seed', type=int, default=42, help='Dataset seed (default 42)')
+    parser.add_argument('--only', help='Run only benchmarks whose name contains this text')
+    parser.add_argument('--output', help='Write the results JSON to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline results JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Fail when a median is this much slower than the baseline (default 0.25 = 25%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--database', help='SQLite file to benchmark in (default: a temporary file)')
+    args = parser.parse_args(argv)
+
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+
+    # The bench profile is read when config is imported, so set it before the app is loaded
+    workdir = None
+    if args.database:
+        database = os.path.abspath(args.database)
+    else:
+        workdir = tempfile.mkdtemp(prefix='benchmarks-')
+        database = os.path.join(workdir, 'bench.db')
+    os.environ['FLASK_ENV'] = 'bench'
+    os.environ['BENCH_DATABASE_URI'] = f'sqlite:///{database}'
+
+    try:
+        from app import create_app
+        from benchmarks import runner
+        from benchmarks.cases import SIZES
+
+        sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            parser.error(f"Unknown size(s) {', '.join(unknown)}; choose from {', '.join(SIZES)}")
+
+        app = create_app('bench')
+        with app.app_context():
+            report = runner.run(sizes, args.repeat, args.seed, args.only)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        runner.save(report, args.output)
+        print(f"\nResults written to {args.output}")
+
+    status = 0
+    if args.save_baseline:
+        runner.save(report, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for mismatch in runner.environment_mismatches(report, baseline):
+            print(f"⚠️  Environment differs from the baseline ({mismatch}); timings may not be comparable")
+        comparisons = runner.compare(report, baseline, args.threshold)
+        regressions = [c for c in comparisons if c['regressed']]
+        print(f"\nCompared {len(comparisons)} benchmarks with {args.baseline} (threshold {args.threshold:+.0%}):")
+        for c in comparisons:
+            marker = '❌' if c['regressed'] else '  '
+            print(f"{marker} {c['name']:<58} {c['size']:<7} {c['baseline_ms']:>10.2f} -> "
+                  f"{c['median_ms']:>10.2f} ms ({c['change']:+.1%})")
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            status = 1
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
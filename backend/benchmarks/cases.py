@@ -0,0 +1,85 @@
+"""
+Benchmark Cases
+Each case times one public function. `prepare` runs untimed before each
+call and returns the call's arguments (so a case can reset state, e.g.
+clear the tables before an import); `sizes`, `max_repeat` and `warmup`
+keep slow cases to a reasonable running time.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import analytics
+import predictions
+import visualizations
+import json_utils
+from database import db, StudentDB
+
+
+# Generated dataset per size (arguments of generate_data.py)
+SIZES = {
+    'small': {'students': 100, 'subjects': 4, 'terms': 4, 'days': 40},
+    'medium': {'students': 1000, 'subjects': 6, 'terms': 4, 'days': 80},
+    'large': {'students': 5000, 'subjects': 6, 'terms': 6, 'days': 120},
+}
+
+
+class Case(NamedTuple):
+    name: str
+    function: Callable
+    prepare: Callable[['Dataset'], Tuple[tuple, dict]]
+    sizes: Optional[Tuple[str, ...]] = None  # None = every size
+    max_repeat: Optional[int] = None  # caps --repeat
+    warmup: int = 1
+
+
+class Dataset:
+    """What the cases need to know about the loaded dataset"""
+
+    def __init__(self, size: str):
+        self.size = size
+        self.student_id = db.session.query(StudentDB.student_id).order_by(StudentDB.student_id).limit(1).scalar()
+        self.export = None
+
+    def exported(self) -> Dict:
+        """The dataset as export_to_json returns it (computed once)"""
+        if self.export is None:
+            self.export = json_utils.export_to_json()
+        return self.export
+
+
+def no_args(dataset: Dataset):
+    return (), {}
+
+
+def one_student(dataset: Dataset):
+    return (dataset.student_id,), {}
+
+
+def cleared_for_import(dataset: Dataset):
+    """Empty the tables, so every timed import inserts the whole export again"""
+    data = dataset.exported()
+    json_utils.clear_all_data()
+    return (), {'data': data}
+
+
+CASES: List[Case] = [
+    Case('analytics.get_class_analytics', analytics.get_class_analytics, no_args),
+    Case('analytics.get_class_analytics[exact]', analytics.get_class_analytics,
+         lambda dataset: ((), {'exact': True})),
+    Case('analytics.get_student_analytics', analytics.get_student_analytics, one_student),
+    Case('predictions.predict_all_students_grades', predictions.predict_all_students_grades, no_args),
+    Case('predictions.predict_all_students_grades[auto]', predictions.predict_all_students_grades,
+         lambda dataset: ((), {'model': 'auto'})),
+    Case('visualizations.generate_grade_distribution_pie_chart',
+         visualizations.generate_grade_distribution_pie_chart, no_args),
+    Case('visualizations.generate_grade_progress_line_chart',
+         visualizations.generate_grade_progress_line_chart, one_student),
+    Case('visualizations.generate_attendance_bar_chart', visualizations.generate_attendance_bar_chart, no_args),
+    Case('visualizations.generate_subject_comparison_chart',
+         visualizations.generate_subject_comparison_chart, one_student),
+    Case('visualizations.generate_class_performance_chart',
+         visualizations.generate_class_performance_chart, no_args),
+    Case('json_utils.export_to_json', json_utils.export_to_json, no_args, sizes=('small', 'medium')),
+    # Last: it replaces the dataset (same rows, new IDs)
+    Case('json_utils.import_from_json', json_utils.import_from_json, cleared_for_import,
+         sizes=('small', 'medium'), max_repeat=2, warmup=0),
+]
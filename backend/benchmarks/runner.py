@@ -0,0 +1,165 @@
+"""
+Benchmark Runner
+Generates each dataset size, times every case, and compares the results
+with a baseline file.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from importlib import metadata
+from typing import Dict, List, Optional
+
+# Keys of the environment metadata that must match for a baseline comparison to be meaningful
+COMPARABLE_ENVIRONMENT = ('python', 'machine', 'processor', 'cpu_count', 'database')
+
+# Differences below this many milliseconds are never reported as regressions (timer noise)
+NOISE_FLOOR_MS = 1.0
+
+
+def _package_versions() -> Dict[str, Optional[str]]:
+    """Installed distribution versions (Flask no longer provides __version__)"""
+    versions = {}
+    for name in ('numpy', 'sqlalchemy', 'flask', 'flask_sqlalchemy', 'matplotlib'):
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment(engine) -> Dict:
+    """Where the benchmarks ran: interpreter, machine, packages, database and commit"""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor() or None,
+        'cpu_count': os.cpu_count(),
+        'packages': _package_versions(),
+        'database': f"{engine.dialect.name} {'.'.join(map(str, engine.dialect.server_version_info or ()))}",
+        'git_commit': _git_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+    }
+
+
+def time_case(case, dataset, repeat: int) -> Dict:
+    """Run one case warmup + repeat times; only the function call is timed"""
+    from database import db
+
+    repeat = min(repeat, case.max_repeat or repeat)
+    warmup = case.warmup
+    timings = []
+    for i in range(warmup + repeat):
+        args, kwargs = case.prepare(dataset)
+        db.session.remove()  # each call starts with an empty identity map
+        started = time.perf_counter()
+        case.function(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+    db.session.remove()
+    return {
+        'name': case.name,
+        'size': dataset.size,
+        'repeat': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'stdev_ms': round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0,
+    }
+
+
+def load_dataset(size: str, params: Dict, seed: int) -> Dict:
+    """Replace the database contents with the generated dataset for a size"""
+    from generate_data import Generator, parse_args
+    from json_utils import clear_all_data
+    from search_index import student_index
+    from sketches import grade_sketches
+    from rankings import rankings
+
+    clear_all_data()
+    args = parse_args([f'--{key}={value}' for key, value in params.items()] + [f'--seed={seed}'])
+    generator = Generator(args)
+    generator.run()
+    for index in (student_index, grade_sketches, rankings):
+        index.invalidate()
+    return generator.counts
+
+
+def run(sizes: List[str], repeat: int, seed: int, only: Optional[str] = None) -> Dict:
+    from database import db
+    from benchmarks.cases import CASES, SIZES, Dataset
+
+    datasets, results = {}, []
+    for size in sizes:
+        cases = [case for case in CASES
+                 if (case.sizes is None or size in case.sizes) and (not only or only in case.name)]
+        if not cases:
+            continue
+        print(f"\n{size}: generating {SIZES[size]} ...")
+        datasets[size] = dict(SIZES[size], rows=load_dataset(size, SIZES[size], seed))
+        dataset = Dataset(size)
+        for case in cases:
+            result = time_case(case, dataset, repeat)
+            results.append(result)
+            print(f"  {case.name:<58} median {result['median_ms']:>10.2f} ms  "
+                  f"(min {result['min_ms']:.2f}, stdev {result['stdev_ms']:.2f})")
+
+    return {
+        'environment': environment(db.engine),
+        'seed': seed,
+        'datasets': datasets,
+        'results': results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """
+    Compare medians with the baseline
+
+    Returns:
+        One entry per benchmark present in both, with 'change' (relative) and
+        'regressed' (slower by more than threshold and NOISE_FLOOR_MS)
+    """
+    previous = {(r['name'], r['size']): r for r in baseline.get('results', [])}
+    comparisons = []
+    for result in report['results']:
+        before = previous.get((result['name'], result['size']))
+        if before is None or not before['median_ms']:
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        comparisons.append({
+            'name': result['name'],
+            'size': result['size'],
+            'baseline_ms': before['median_ms'],
+            'median_ms': result['median_ms'],
+            'change': round(change, 4),
+            'regressed': change > threshold and result['median_ms'] - before['median_ms'] > NOISE_FLOOR_MS,
+        })
+    return comparisons
+
+
+def environment_mismatches(report: Dict, baseline: Dict) -> List[str]:
+    current, recorded = report['environment'], baseline.get('environment', {})
+    return [f"{key}: baseline {recorded.get(key)!r}, now {current.get(key)!r}"
+            for key in COMPARABLE_ENVIRONMENT if recorded.get(key) != current.get(key)]
+
+
+def save(report: Dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
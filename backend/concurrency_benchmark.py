@@ -0,0 +1,171 @@
+"""
+Concurrency Benchmark
+Drives I/O-bound read endpoints (list and detail) with a growing number of
+concurrent keep-alive connections and reports throughput, latency and the
+server's memory and thread count, to compare the WSGI and ASGI deployments.
+
+Start the server to measure, then point the benchmark at it:
+
+    python app.py                                              # WSGI (threaded)
+    uvicorn --factory asgi:create_asgi_app --port 5000         # ASGI
+
+    python concurrency_benchmark.py --pid <server pid> [--url http://localhost:5000/api]
+        [--concurrency 10,100,500] [--duration 10] [--student S001]
+
+--pid is used to sample the server's resident memory and threads from /proc
+(Linux only); leave it out to report throughput and latency only.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+def read_process_stats(pid: int) -> Optional[Dict[str, float]]:
+    """Resident memory (MB) and thread count of a process, from /proc"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    return {
+        'rss_mb': int(fields['VmRSS'].split()[0]) / 1024,
+        'threads': int(fields['Threads']),
+    }
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection issuing GET requests"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path: str) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f'GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n'.encode('latin-1'))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        length, close = 0, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection' and value.strip().lower() == 'close':
+                close = True
+        await self.reader.readexactly(length)
+        if close:
+            self.close()
+        return int(status_line.split()[1])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_level(host: str, port: int, paths: List[str], concurrency: int,
+                    duration: float, pid: Optional[int]) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    peak = {'rss_mb': 0.0, 'threads': 0}
+
+    async def client(i: int):
+        nonlocal errors
+        connection = Connection(host, port)
+        n = i
+        while time.monotonic() < deadline:
+            path = paths[n % len(paths)]
+            n += 1
+            started = time.monotonic()
+            try:
+                status = await connection.get(path)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                errors += 1
+                connection.close()
+                await asyncio.sleep(0.05)
+                continue
+            if status >= 500:
+                errors += 1
+            else:
+                latencies.append(time.monotonic() - started)
+        connection.close()
+
+    async def sample():
+        while time.monotonic() < deadline:
+            stats = read_process_stats(pid)
+            if stats:
+                peak['rss_mb'] = max(peak['rss_mb'], stats['rss_mb'])
+                peak['threads'] = max(peak['threads'], stats['threads'])
+            await asyncio.sleep(0.2)
+
+    tasks = [client(i) for i in range(concurrency)]
+    if pid:
+        tasks.append(sample())
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    report = {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'latency_ms': {
+            'median': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            'p99': round(latencies[int(0.99 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+        },
+    }
+    if pid:
+        report['server_peak_rss_mb'] = round(peak['rss_mb'], 1)
+        report['server_peak_threads'] = peak['threads']
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure throughput and memory at increasing concurrency')
+    parser.add_argument('--url', default='http://localhost:5000/api', help='API base URL')
+    parser.add_argument('--pid', type=int, help='Server process ID for memory/thread sampling')
+    parser.add_argument('--concurrency', default='10,100,500', help='Comma-separated connection counts')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per concurrency level')
+    parser.add_argument('--student', default='S001', help='Student ID for the detail endpoint')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    parts = urlsplit(args.url)
+    prefix = parts.path.rstrip('/')
+    paths = [f'{prefix}/students?limit=50', f'{prefix}/grades?limit=50',
+             f'{prefix}/attendance?limit=50', f'{prefix}/students/{args.student}']
+
+    reports = []
+    for level in [int(n) for n in args.concurrency.split(',') if n.strip()]:
+        report = asyncio.run(run_level(parts.hostname, parts.port or 80, paths, level, args.duration, args.pid))
+        reports.append(report)
+        print(f"{level:>6} connections: {report['requests_per_second']:>8} req/s, "
+              f"median {report['latency_ms']['median']} ms, p99 {report['latency_ms']['p99']} ms, "
+              f"{report['errors']} errors"
+              + (f", server {report['server_peak_rss_mb']} MB / {report['server_peak_threads']} threads"
+                 if args.pid else ''))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'pid': args.pid, 'levels': reports}, f, indent=2)
+        print(f"Benchmark report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,49 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def engine_options(pool_size: int, max_overflow: int) -> dict:
+    """
+    SQLAlchemy engine options for the MySQL connection pool (per worker
+    process). DB_* environment variables override the per-environment
+    defaults passed in.
+    """
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max_overflow)),
+        # Seconds a request waits for a free connection before failing
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        # Replace connections before MySQL's wait_timeout (default 8 h) drops them
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        # Test each connection on checkout so stale ones are replaced transparently
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        'connect_args': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+            'read_timeout': int(os.getenv('DB_READ_TIMEOUT', '60')),
+            'write_timeout': int(os.getenv('DB_WRITE_TIMEOUT', '60')),
+        },
+    }
+
+
+def sqlite_engine_options(uri: str, pool_size: int, max_overflow: int) -> dict:
+    """
+    SQLAlchemy engine options for SQLite. In-memory databases get a single
+    shared connection (Flask-SQLAlchemy uses StaticPool for them); file
+    databases get a pool, with a busy timeout so concurrent writers wait for
+    the lock instead of failing.
+    """
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'connect_args': {
+            'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '30')),
+            'check_same_thread': False,
+        },
+    }
+
+
 class Config:
     """Base configuration"""
     
@@ -29,6 +72,77 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = DEBUG
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=20)
+    
+    # PRAGMAs run on every new SQLite connection (SQLite URIs only)
+    SQLITE_PRAGMAS = {}
+    
+    # Read replicas (comma-separated URIs in DB_REPLICA_URIS) serve the
+    # read-only routes; a client reads from the primary for
+    # REPLICA_STICKY_SECONDS after its own write
+    SQLALCHEMY_REPLICA_URIS = [uri.strip() for uri in os.getenv('DB_REPLICA_URIS', '').split(',') if uri.strip()]
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+    
+    # Query counting: warn when one request runs the same statement this many
+    # times (likely N+1; 0 = off) and add X-Query-* headers (not in production)
+    QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '10'))
+    QUERY_STATS_HEADERS = os.getenv('QUERY_STATS_HEADERS', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Server-Timing header and per-route stage histograms (/api/metrics/timing);
+    # off by default in production
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
+    
+    # List endpoints: refuse sorts on unindexed columns above this many rows
+    LIST_MAX_UNINDEXED_SORT_ROWS = int(os.getenv('LIST_MAX_UNINDEXED_SORT_ROWS', '10000'))
+    
+    # Student search index is rebuilt from the database after this many seconds
+    SEARCH_INDEX_MAX_AGE = float(os.getenv('SEARCH_INDEX_MAX_AGE', '300'))
+    
+    # Grade sketches and rankings are rebuilt from the database after this many seconds
+    GRADE_SKETCH_MAX_AGE = float(os.getenv('GRADE_SKETCH_MAX_AGE', '300'))
+    
+    # Largest number of series accepted by POST /api/predictions/custom/batch
+    PREDICTION_BATCH_MAX_SERIES = int(os.getenv('PREDICTION_BATCH_MAX_SERIES', '200000'))
+    
+    # Analytics snapshots: fresh while younger than SNAPSHOT_MAX_AGE seconds
+    # (then served stale and refreshed by a job); refreshed in-process every
+    # SNAPSHOT_REFRESH_INTERVAL seconds (0 = off, e.g. when cron runs
+    # `python analytics_snapshots.py refresh` instead)
+    SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', '900'))
+    SNAPSHOT_REFRESH_INTERVAL = float(os.getenv('SNAPSHOT_REFRESH_INTERVAL', '0'))
+    
+    # Background jobs: worker threads per process and concurrent jobs per type
+    # (class charts use pyplot, which is not thread-safe, so one at a time)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_CONCURRENCY = {
+        'import': 1,
+        'export': 1,
+        'predictions': 2,
+        'class-chart': 1,
+        'snapshots': 1,
+    }
+    # Seconds between polls for queued jobs (0 = only when this process submits
+    # or finishes one) and between heartbeats of running ones; running jobs without a heartbeat for JOB_STALE_SECONDS are marked
+    # failed, and finished jobs are deleted after JOB_RETENTION_HOURS
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+    JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', '15'))
+    JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '120'))
+    JOB_RETENTION_HOURS = float(os.getenv('JOB_RETENTION_HOURS', '24'))
+    
+    # Change event stream (GET /api/events): open connections per process,
+    # keep-alive interval in seconds and client reconnect delay in milliseconds
+    EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', '5000'))
+    EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '15'))
+    EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', '3000'))
+    
+    # Async deployment (asgi.py): async engine for the native routes (derived
+    # from SQLALCHEMY_DATABASE_URI unless set) and executor threads for the
+    # routes still served by Flask, with a separate pool for CPU-heavy ones
+    ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URI')
+    ASYNC_POOL_SIZE = int(os.getenv('ASYNC_POOL_SIZE', '10'))
+    ASYNC_MAX_OVERFLOW = int(os.getenv('ASYNC_MAX_OVERFLOW', '20'))
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', '16'))
+    ASGI_COMPUTE_THREADS = int(os.getenv('ASGI_COMPUTE_THREADS', '2'))
     
     # CORS
     CORS_HEADERS = 'Content-Type'
@@ -41,16 +155,45 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=5)
 
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=20, max_overflow=30)
+    QUERY_STATS_HEADERS = False
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+
+class BenchConfig(Config):
+    """
+    Benchmark/test configuration: the whole app on SQLite, no MySQL server
+    needed. BENCH_DATABASE_URI picks the file (relative paths land in
+    instance/) or 'sqlite://' for an in-memory database.
+    """
+    DEBUG = False
+    SQLALCHEMY_ECHO = False
+    SQLALCHEMY_DATABASE_URI = os.getenv('BENCH_DATABASE_URI', 'sqlite:///bench.db')
+    SQLALCHEMY_ENGINE_OPTIONS = sqlite_engine_options(SQLALCHEMY_DATABASE_URI, pool_size=10, max_overflow=20)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',        # readers don't block the writer
+        'synchronous': 'NORMAL',      # fsync at checkpoints only (safe with WAL)
+        'foreign_keys': 'ON',         # ON DELETE CASCADE, as on MySQL
+        'temp_store': 'MEMORY',
+        'cache_size': -64000,         # 64 MB page cache per connection
+        'mmap_size': 268435456,       # 256 MB memory-mapped reads
+        'busy_timeout': 30000,
+    }
+    # In memory there is one shared connection, so don't poll it from the dispatcher
+    if SQLALCHEMY_DATABASE_URI in ('sqlite://', 'sqlite:///:memory:'):
+        JOB_POLL_INTERVAL = 0
 
 
 # Configuration dictionary
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'bench': BenchConfig,
     'default': DevelopmentConfig
 }
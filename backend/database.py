@@ -3,10 +3,16 @@ Database Models using SQLAlchemy
 Defines MySQL table structures for Students, Grades, and Attendance
 """
 
+import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.mysql import LONGTEXT
 from datetime import datetime
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+# Sessions route read-only requests to replicas when configured (see db_routing)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class StudentDB(db.Model):
@@ -17,7 +23,7 @@ class StudentDB(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), nullable=False, unique=True)
     age = db.Column(db.Integer, nullable=True)
-    course = db.Column(db.String(100), nullable=False)
+    course = db.Column(db.String(100), nullable=False, index=True)
     enrollment_date = db.Column(db.String(50), nullable=False)
     student_type = db.Column(db.String(20), default='Regular')  # 'Regular' or 'Honors'
     scholarship = db.Column(db.String(100), nullable=True)
@@ -26,6 +32,7 @@ class StudentDB(db.Model):
     # Relationships
     grades = db.relationship('GradeDB', backref='student', lazy=True, cascade='all, delete-orphan')
     attendance = db.relationship('AttendanceDB', backref='student', lazy=True, cascade='all, delete-orphan')
+    attendance_bitmaps = db.relationship('AttendanceBitmapDB', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
         """Convert to dictionary"""
@@ -49,13 +56,13 @@ class GradeDB(db.Model):
     __tablename__ = 'grades'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    student_id = db.Column(db.String(50), db.ForeignKey('students.student_id'), nullable=False)
-    subject = db.Column(db.String(100), nullable=False)
+    student_id = db.Column(db.String(50), db.ForeignKey('students.student_id'), nullable=False, index=True)
+    subject = db.Column(db.String(100), nullable=False, index=True)
     midterm = db.Column(db.Float, default=0.0)
     finals = db.Column(db.Float, default=0.0)
     quizzes = db.Column(db.Float, default=0.0)
     projects = db.Column(db.Float, default=0.0)
-    final_grade = db.Column(db.Float, nullable=True)
+    final_grade = db.Column(db.Float, nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def calculate_final_grade(self):
@@ -91,9 +98,9 @@ class AttendanceDB(db.Model):
     __tablename__ = 'attendance'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    student_id = db.Column(db.String(50), db.ForeignKey('students.student_id'), nullable=False)
-    date = db.Column(db.String(50), nullable=False)
-    status = db.Column(db.String(20), nullable=False)  # 'present' or 'absent'
+    student_id = db.Column(db.String(50), db.ForeignKey('students.student_id'), nullable=False, index=True)
+    date = db.Column(db.String(50), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, index=True)  # 'present' or 'absent'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -109,6 +116,125 @@ class AttendanceDB(db.Model):
         return f'<Attendance {self.student_id} - {self.date}>'
 
 
+class AttendanceBitmapDB(db.Model):
+    """Packed attendance: one bit per student per calendar day of a term"""
+    __tablename__ = 'attendance_bitmaps'
+    
+    student_id = db.Column(db.String(50), db.ForeignKey('students.student_id', ondelete='CASCADE'), primary_key=True)
+    term = db.Column(db.String(10), primary_key=True)  # e.g. '2024-1' (Jan-Jun), '2024-2' (Jul-Dec)
+    term_start = db.Column(db.String(10), nullable=False)
+    present_bits = db.Column(db.LargeBinary, nullable=False)  # bit set = present
+    recorded_bits = db.Column(db.LargeBinary, nullable=False)  # bit set = attendance taken
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AttendanceBitmap {self.student_id} - {self.term}>'
+
+
+class JobDB(db.Model):
+    """Background job (import, export, cohort predictions, class charts)"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, succeeded, failed, cancelled
+    params = db.Column(db.Text().with_variant(LONGTEXT, 'mysql'), nullable=True)  # JSON
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # 0-1
+    message = db.Column(db.String(255), nullable=True)
+    result = db.Column(db.Text().with_variant(LONGTEXT, 'mysql'), nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # refreshed while running
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self, include_result: bool = True):
+        """Convert to dictionary"""
+        data = {
+            'id': self.id,
+            'type': self.job_type,
+            'status': self.status,
+            'progress': round(self.progress or 0.0, 4),
+            'message': self.message,
+            'error': self.error,
+            'cancelRequested': self.cancel_requested,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_result:
+            data['result'] = json.loads(self.result) if self.result else None
+        return data
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type} {self.status}>'
+
+
+class SnapshotDB(db.Model):
+    """Precomputed analytics/chart result, served instead of live computation"""
+    __tablename__ = 'analytics_snapshots'
+    
+    key = db.Column(db.String(100), primary_key=True)  # e.g. 'class-analytics'
+    payload = db.Column(db.Text().with_variant(LONGTEXT, 'mysql'), nullable=False)  # JSON
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    duration_ms = db.Column(db.Float, nullable=True)
+    data_version = db.Column(db.Integer, nullable=True)  # 'analytics' data version it was computed from
+    
+    def __repr__(self):
+        return f'<Snapshot {self.key} {self.computed_at}>'
+
+
+class DataVersionDB(db.Model):
+    """Counter bumped by every change to the data snapshots are computed from"""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'analytics'
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name} {self.version}>'
+
+
+def apply_sqlite_pragmas(engine, pragmas: dict):
+    """Run PRAGMAs (e.g. journal_mode=WAL) on each new connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+# Nullable columns added to tables after they first shipped; create_all()
+# only creates missing tables, so add_missing_columns() adds these
+ADDED_COLUMNS = (
+    ('jobs', 'heartbeat_at'),
+    ('analytics_snapshots', 'data_version'),
+)
+
+
+def add_missing_columns():
+    """ALTER TABLE ... ADD COLUMN for each ADDED_COLUMNS entry the database lacks"""
+    for table_name, column_name in ADDED_COLUMNS:
+        existing = {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+        if column_name in existing:
+            continue
+        column = db.metadata.tables[table_name].c[column_name]
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type} NULL'))
+            print(f"✓ Added column {table_name}.{column_name}")
+        except DBAPIError:
+            # Another worker process added it first
+            if column_name not in {column['name'] for column in inspect(db.engine).get_columns(table_name)}:
+                raise
+
+
 def init_db(app):
     """Initialize database"""
     db.init_app(app)
@@ -0,0 +1,144 @@
+"""
+Read Replica Routing
+Sends the queries of read-only API routes (analytics, predictions, charts,
+rankings, export and the list GETs) to read replicas, and everything else
+to the primary.
+
+Replicas are extra Flask-SQLAlchemy binds ('replica-0', 'replica-1', ...)
+built from SQLALCHEMY_REPLICA_URIS. A routed request picks one replica
+(round robin) for all of its reads; writes and flushes always go to the
+primary, as do the reads of any request that is not read-only.
+
+Read-your-writes: a successful write sets a short-lived cookie
+(REPLICA_STICKY_SECONDS) and that client's reads stay on the primary until
+it expires, so replication lag never hides a change from its author.
+Clients that cannot send cookies can send the X-Read-Primary header.
+"""
+
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from flask import g, request
+from flask_sqlalchemy.session import Session
+
+
+REPLICA_BIND_PREFIX = 'replica-'
+
+# Read-only GET routes served from replicas
+REPLICA_READ_PREFIXES = ('/api/analytics/', '/api/predictions/', '/api/charts/',
+                         '/api/rankings', '/api/data/export')
+REPLICA_READ_PATHS = ('/api/students', '/api/grades', '/api/attendance')
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+STICKY_COOKIE = 'db_read_primary'
+
+# Bind key of the replica the current request/job reads from (None = primary)
+_read_bind: ContextVar[Optional[str]] = ContextVar('read_bind', default=None)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to the current replica, if one was chosen.
+    Anything else (flushes, INSERT/UPDATE/DELETE) goes to the primary and
+    keeps the rest of the request on the primary, so it reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        key = _read_bind.get()
+        if key is not None and bind is None:
+            if not self._flushing and getattr(clause, 'is_select', False):
+                engine = self._db.engines.get(key)
+                if engine is not None:
+                    return engine
+            else:
+                _read_bind.set(None)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """Chooses the read bind per request and keeps clients on the primary after writes"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.sticky_seconds = 10
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Register replica binds (call before db.init_app) and the request hooks"""
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        self.keys = [f'{REPLICA_BIND_PREFIX}{i}' for i in range(len(uris))]
+        self._cycle = itertools.cycle(self.keys) if self.keys else None
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 10)
+        if not self.keys:
+            return
+
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update(zip(self.keys, uris))
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.keys)
+
+    def next_replica(self) -> Optional[str]:
+        if self._cycle is None:
+            return None
+        with self._lock:
+            return next(self._cycle)
+
+    @staticmethod
+    def is_read_only_route(method: str, path: str) -> bool:
+        return method == 'GET' and (path in REPLICA_READ_PATHS or path.startswith(REPLICA_READ_PREFIXES))
+
+    def _sticky(self) -> bool:
+        return STICKY_COOKIE in request.cookies or request.headers.get('X-Read-Primary') == '1'
+
+    # ---------- request hooks ----------
+
+    def _before_request(self):
+        key = None
+        if self.is_read_only_route(request.method, request.path) and not self._sticky():
+            key = self.next_replica()
+        g.read_bind_token = _read_bind.set(key)
+
+    def _after_request(self, response):
+        response.headers['X-DB-Route'] = _read_bind.get() or 'primary'
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=self.sticky_seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def _teardown_request(self, exc=None):
+        token = g.pop('read_bind_token', None)
+        if token is not None:
+            _read_bind.reset(token)
+
+
+@contextmanager
+def use_replica():
+    """Route reads in this block to a replica (no-op without replicas), e.g. in background jobs"""
+    token = _read_bind.set(replica_router.next_replica())
+    try:
+        yield
+    finally:
+        _read_bind.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Route reads in this block to the primary, e.g. to rebuild write-maintained indexes"""
+    token = _read_bind.set(None)
+    try:
+        yield
+    finally:
+        _read_bind.reset(token)
+
+
+# Shared router; app.py calls init_app before db.init_app
+replica_router = ReplicaRouter()
@@ -0,0 +1,146 @@
+"""
+Early-Warning Risk Scoring
+Scores every student's risk of falling behind from their predicted grades,
+grade trends, attendance rate and current absence streak, computed as array
+operations over the whole cohort.
+"""
+
+from typing import Dict, List, Optional
+import numpy as np
+from database import db, StudentDB
+import attendance_store
+from predictions import fetch_grade_histories, fit_linear_segments
+
+
+# Component weights (normalized to sum to 1 when scoring)
+DEFAULT_RISK_WEIGHTS = {
+    'grade': 0.4,
+    'trend': 0.2,
+    'attendance': 0.3,
+    'absence_streak': 0.1,
+}
+
+# Scales that map each component onto 0 (no risk) .. 1 (full risk)
+DEFAULT_RISK_PARAMETERS = {
+    'passing_grade': 60.0,      # predicted grade at or below this is full grade risk
+    'slope_scale': 5.0,         # a decline of this many points per period is full trend risk
+    'min_attendance': 80.0,     # attendance at or below this percentage is full attendance risk
+    'streak_limit': 3,          # this many consecutive absences is full streak risk
+}
+
+DEFAULT_RISK_THRESHOLD = 50.0
+
+
+def _component_risks(predicted: np.ndarray, slope: np.ndarray, attendance: np.ndarray,
+                     streak: np.ndarray, params: Dict) -> Dict[str, np.ndarray]:
+    passing = params['passing_grade']
+    min_attendance = params['min_attendance']
+    return {
+        'grade': np.clip((100 - predicted) / max(100 - passing, 1e-9), 0, 1),
+        'trend': np.clip(-slope / params['slope_scale'], 0, 1),
+        'attendance': np.clip((100 - attendance) / max(100 - min_attendance, 1e-9), 0, 1),
+        'absence_streak': np.clip(streak / params['streak_limit'], 0, 1),
+    }
+
+
+def score_at_risk_students(threshold: float = DEFAULT_RISK_THRESHOLD, limit: int = None,
+                           course: str = None, subject: str = None,
+                           weights: Dict[str, float] = None,
+                           params: Dict[str, float] = None) -> Dict:
+    """
+    Rank students by early-warning risk score (0-100)
+
+    Each (student, subject) history is fitted in one vectorized pass; a
+    student's predicted grade is the mean of their per-subject predictions
+    and their trend is the mean slope. Students without grades are scored
+    on attendance alone (grade and trend risk 0).
+
+    Args:
+        threshold: Only students scoring at least this are returned
+        limit: Maximum number of students returned
+        course: Optional course filter
+        subject: Optional subject filter (grades only)
+        weights: Overrides for DEFAULT_RISK_WEIGHTS
+        params: Overrides for DEFAULT_RISK_PARAMETERS
+
+    Returns:
+        Dictionary with the ranked 'students', 'scored' count and the
+        weights/parameters used
+    """
+    weights = dict(DEFAULT_RISK_WEIGHTS, **(weights or {}))
+    params = dict(DEFAULT_RISK_PARAMETERS, **(params or {}))
+    if any(value < 0 for value in weights.values()) or sum(weights.values()) <= 0:
+        raise ValueError('Risk weights must be non-negative and not all zero')
+    if params['slope_scale'] <= 0 or params['streak_limit'] <= 0:
+        raise ValueError('slope_scale and streak_limit must be positive')
+
+    student_query = db.session.query(StudentDB.student_id, StudentDB.name, StudentDB.course)
+    if course:
+        student_query = student_query.filter(StudentDB.course == course)
+    students = sorted(student_query.all())  # sorted in Python so searchsorted agrees
+    if not students:
+        return {'students': [], 'scored': 0, 'weights': weights, 'parameters': params}
+
+    ids = np.array([row[0] for row in students], dtype=object)
+    count = len(ids)
+
+    # Grades: per-segment fit, then mean prediction and slope per student
+    histories = fetch_grade_histories(subject=subject, course=course)
+    fit = fit_linear_segments(histories['values'], histories['segment'],
+                              histories['position'], histories['lengths'])
+    owner = np.searchsorted(ids, histories['student_ids'])
+    subjects = np.bincount(owner, minlength=count).astype(float)
+    has_grades = subjects > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        predicted = np.bincount(owner, weights=fit['predicted_grade'], minlength=count) / subjects
+        slope = np.bincount(owner, weights=fit['slope'], minlength=count) / subjects
+        lowest = np.full(count, np.inf)
+        np.minimum.at(lowest, owner, fit['predicted_grade'])
+
+    # Attendance: students without records count as full attendance
+    attendance = np.full(count, 100.0)
+    streak = np.zeros(count, dtype=np.int64)
+    has_attendance = np.zeros(count, dtype=bool)
+    att_ids, att_pct, att_streak = attendance_store.attendance_rates_and_streaks(
+        ids.tolist() if course else None
+    )
+    if len(att_ids):
+        position = np.searchsorted(ids, att_ids)
+        known = (position < count) & (ids[np.minimum(position, count - 1)] == att_ids)
+        attendance[position[known]] = att_pct[known]
+        streak[position[known]] = att_streak[known]
+        has_attendance[position[known]] = True
+
+    risks = _component_risks(np.where(has_grades, predicted, 100.0),
+                             np.where(has_grades, slope, 0.0),
+                             attendance, streak, params)
+    total_weight = sum(weights.values())
+    score = sum(weights[name] * risks[name] for name in risks) / total_weight * 100
+
+    # Highest score first, ties by student ID
+    selected = np.flatnonzero(score >= threshold)
+    selected = selected[np.lexsort((selected, -score[selected]))]
+    if limit is not None:
+        selected = selected[:limit]
+
+    results = []
+    for i in selected.tolist():
+        results.append({
+            'student_id': students[i][0],
+            'student_name': students[i][1],
+            'course': students[i][2],
+            'risk_score': round(float(score[i]), 2),
+            'predicted_grade': round(float(predicted[i]), 2) if has_grades[i] else None,
+            'lowest_predicted_grade': round(float(lowest[i]), 2) if has_grades[i] else None,
+            'slope': round(float(slope[i]), 4) if has_grades[i] else None,
+            'attendance_percentage': round(float(attendance[i]), 2) if has_attendance[i] else None,
+            'current_absence_streak': int(streak[i]),
+            'components': {name: round(float(risks[name][i]), 4) for name in risks}
+        })
+
+    return {
+        'students': results,
+        'scored': count,
+        'weights': weights,
+        'parameters': params
+    }
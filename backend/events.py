@@ -0,0 +1,179 @@
+"""
+Change Events
+In-process fan-out hub behind the GET /api/events Server-Sent Events stream.
+
+Write routes publish compact notifications (entity, action, IDs) after they
+commit; every event gets the next data version. Events go into one shared
+ring buffer instead of a queue per subscriber, so publishing is O(1) however
+many clients are connected, and an idle subscriber costs a cursor (its last
+seen version) plus a wait on a shared condition. A subscriber that falls
+further behind than the buffer holds gets a single 'resync' event telling it
+to re-fetch everything.
+
+Versions are per process: with several worker processes each one streams the
+writes it handled itself, so run the stream on a single (gevent/eventlet)
+worker or have clients treat 'resync' as the normal reconnect path.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+
+
+EVENT_ENTITIES = ('students', 'grades', 'attendance', 'data')
+
+# Events kept for subscribers that are behind (or reconnect with Last-Event-ID)
+DEFAULT_HISTORY = 1024
+
+
+class TooManySubscribers(Exception):
+    """Raised when the hub already holds max_subscribers connections"""
+
+
+class EventHub:
+    """Versioned ring buffer of change events with blocking reads"""
+
+    def __init__(self, history: int = DEFAULT_HISTORY, max_subscribers: int = 5000):
+        self.max_subscribers = max_subscribers
+        self._condition = threading.Condition()
+        self._events: deque = deque(maxlen=history)  # (version, entity, payload)
+        self._version = 0
+        self._subscribers = 0
+        # Distinguishes restarts: a Last-Event-ID from another boot means resync
+        self.boot_id = format(int(time.time() * 1000), 'x')
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    def publish(self, entity: str, action: str, ids: Iterable = None, **extra) -> int:
+        """
+        Record a committed change and wake every waiting subscriber
+
+        Args:
+            entity: One of EVENT_ENTITIES
+            action: What happened ('created', 'updated', 'deleted', ...)
+            ids: IDs of the affected rows (omit for bulk changes)
+            extra: Additional small JSON-serializable fields
+
+        Returns:
+            The new data version
+        """
+        with self._condition:
+            self._version += 1
+            event = {'version': self._version, 'entity': entity, 'action': action,
+                     'ids': [str(i) for i in ids] if ids is not None else None}
+            event.update(extra)
+            self._events.append((self._version, entity, json.dumps(event)))
+            self._condition.notify_all()
+            return self._version
+
+    def subscribe(self):
+        """Reserve a subscriber slot (raises TooManySubscribers when full)"""
+        with self._condition:
+            if self._subscribers >= self.max_subscribers:
+                raise TooManySubscribers(f'Event stream is limited to {self.max_subscribers} connections')
+            self._subscribers += 1
+
+    def unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    def wait(self, after: int, timeout: float) -> Tuple[int, Optional[List[Tuple[int, str, str]]]]:
+        """
+        Events newer than version `after`, blocking up to timeout seconds
+
+        Returns:
+            (latest version, events). events is [] on timeout and None when
+            `after` has already dropped out of the history (client must resync).
+        """
+        with self._condition:
+            if self._version <= after:
+                self._condition.wait_for(lambda: self._version > after, timeout)
+            if self._version <= after:
+                return self._version, []
+            if after < 0 or not self._events or self._events[0][0] > after + 1:
+                return self._version, None
+            # Newest events are at the right; walk back to the cursor
+            start = len(self._events) - (self._version - after)
+            return self._version, [self._events[i] for i in range(start, len(self._events))]
+
+
+def format_sse(data: str, event: str = None, event_id: str = None) -> str:
+    """One Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
+def open_stream(hub: EventHub, after: Optional[int], retry_ms: int) -> Tuple[int, str]:
+    """
+    Start of a stream: (cursor to wait from, 'retry' line plus 'hello' event)
+
+    The hello event carries the current version; its id is the resume point,
+    so a connection dropped while replaying missed events loses nothing.
+    """
+    version = hub.version
+    cursor = version if after is None else min(after, version)
+    hello = format_sse(json.dumps({'version': version, 'boot': hub.boot_id}),
+                       event='hello', event_id=f'{hub.boot_id}:{max(cursor, 0)}')
+    return cursor, f'retry: {retry_ms}\n\n' + hello
+
+
+def render_events(hub: EventHub, latest: int, events: Optional[List[Tuple[int, str, str]]],
+                  entities: Optional[set]) -> str:
+    """SSE text for one hub.wait() result ('' when no event passes the filter)"""
+    if events is None:
+        return format_sse(json.dumps({'version': latest}), event='resync',
+                          event_id=f'{hub.boot_id}:{latest}')
+    if not events:
+        return ': keep-alive\n\n'
+    return ''.join(format_sse(payload, event='change', event_id=f'{hub.boot_id}:{version}')
+                   for version, entity, payload in events
+                   if entities is None or entity in entities or entity == 'data')
+
+
+def stream_events(hub: EventHub, after: Optional[int], entities: Optional[set],
+                  heartbeat: float, retry_ms: int):
+    """
+    Generator of SSE text for one subscriber
+
+    Starts with a 'hello' event carrying the current version. If after is
+    given (a resumed connection) missed events are replayed first, or a
+    'resync' event is sent when they are no longer buffered. Comment lines
+    are sent every heartbeat seconds so proxies keep idle connections open
+    and disconnected clients are noticed. The caller reserves the
+    subscriber slot (hub.subscribe) and releases it when the response closes.
+    """
+    cursor, text = open_stream(hub, after, retry_ms)
+    yield text
+    while True:
+        latest, events = hub.wait(cursor, heartbeat)
+        text = render_events(hub, latest, events, entities)
+        if text:
+            yield text
+        cursor = latest
+
+
+def parse_last_event_id(value: Optional[str], hub: EventHub) -> Optional[int]:
+    """Version to resume after from a Last-Event-ID header, or None to start fresh"""
+    if not value or ':' not in value:
+        return None
+    boot_id, _, version = value.partition(':')
+    if boot_id != hub.boot_id or not version.isdigit():
+        return -1  # stream restarted since: force a resync
+    return int(version)
+
+
+# Shared hub used by the write routes and the event stream
+event_hub = EventHub()
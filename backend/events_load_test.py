@@ -0,0 +1,324 @@
+"""
+Event Stream Load Test
+Compares dashboard traffic with fixed-interval polling against the
+GET /api/events stream plus targeted re-fetches, while a writer adds grades
+and attendance at a steady rate.
+
+Run it against a running server (it creates one scratch student, named
+LOADTEST-<pid>, and deletes it afterwards):
+
+    python events_load_test.py [--url http://localhost:5000/api]
+        [--clients 20] [--idle 500] [--duration 30]
+        [--poll-interval 5] [--write-rate 0.5]
+
+--idle opens additional streams that only listen, to check that a large
+number of idle connections does not slow down notification delivery.
+Each streaming connection holds a server thread (or greenlet under a
+gevent/eventlet worker), so raise --idle only as far as the server allows.
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+
+# Endpoints a dashboard keeps on screen, and which of them each entity affects
+DASHBOARD_ENDPOINTS = (
+    '/students',
+    '/grades',
+    '/attendance',
+    '/analytics/class',
+    '/analytics/attendance',
+    '/analytics/distribution',
+)
+
+REFETCH_ON_CHANGE = {
+    'students': ('/students', '/analytics/class'),
+    'grades': ('/grades', '/analytics/class', '/analytics/distribution'),
+    'attendance': ('/attendance', '/analytics/attendance'),
+    'data': DASHBOARD_ENDPOINTS,
+}
+
+# Changes arriving within this many seconds are coalesced into one re-fetch
+COALESCE_WINDOW = 0.25
+
+
+class Stats:
+    """Request counters shared by the client threads of one mode"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.unchanged = 0
+        self.bytes = 0
+        self.latencies: List[float] = []
+
+    def record(self, size: int, unchanged: bool):
+        with self.lock:
+            self.requests += 1
+            self.bytes += size
+            self.unchanged += int(unchanged)
+
+
+class Api:
+    """Minimal JSON client on http.client (one connection per thread)"""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return conn
+
+    def request(self, method: str, path: str, body: Dict = None) -> bytes:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            conn = self.connection()
+            try:
+                conn.request(method, self.prefix + path, body=payload, headers=headers)
+                return conn.getresponse().read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+    def open_stream(self, path: str = '/events'):
+        """Open an event stream and return the response to read lines from"""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=None)
+        conn.request('GET', self.prefix + path, headers={'Accept': 'text/event-stream'})
+        response = conn.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f'{path} returned {response.status}: {response.read()[:200]!r}')
+        return conn, response
+
+
+def close_when_stopped(conn: http.client.HTTPConnection, stop: threading.Event):
+    """Unblock a reader stuck in readline() once the run is over"""
+    def close():
+        stop.wait()
+        if conn.sock:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+    threading.Thread(target=close, daemon=True).start()
+
+
+def read_events(response, stop: threading.Event):
+    """Yield (event name, data) for each message until the stream or stop ends"""
+    event, data = None, []
+    while not stop.is_set():
+        line = response.readline()
+        if not line:
+            return
+        line = line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if data:
+                yield event or 'message', '\n'.join(data)
+            event, data = None, []
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].strip())
+
+
+def fetch(api: Api, path: str, seen: Dict[str, str], stats: Stats):
+    body = api.request('GET', path)
+    digest = hashlib.sha1(body).hexdigest()
+    stats.record(len(body), seen.get(path) == digest)
+    seen[path] = digest
+
+
+# ---------- clients ----------
+
+def polling_client(api: Api, interval: float, stop: threading.Event, stats: Stats):
+    seen: Dict[str, str] = {}
+    while not stop.is_set():
+        started = time.monotonic()
+        for path in DASHBOARD_ENDPOINTS:
+            fetch(api, path, seen, stats)
+        stop.wait(max(interval - (time.monotonic() - started), 0))
+
+
+def streaming_client(api: Api, stop: threading.Event, stats: Stats, writes: Dict[int, float]):
+    seen: Dict[str, str] = {}
+    for path in DASHBOARD_ENDPOINTS:  # initial load
+        fetch(api, path, seen, stats)
+
+    dirty = set()
+    dirty_since = [None]
+    condition = threading.Condition()
+
+    def refetcher():
+        while not stop.is_set():
+            with condition:
+                condition.wait_for(lambda: dirty or stop.is_set(), timeout=1)
+                if stop.is_set() or not dirty:
+                    continue
+                wait = COALESCE_WINDOW - (time.monotonic() - dirty_since[0])
+            if wait > 0:
+                stop.wait(wait)
+            with condition:
+                paths, dirty_since[0] = sorted(dirty), None
+                dirty.clear()
+            for path in paths:
+                fetch(api, path, seen, stats)
+
+    threading.Thread(target=refetcher, daemon=True).start()
+    conn, response = api.open_stream()
+    close_when_stopped(conn, stop)
+    try:
+        for event, data in read_events(response, stop):
+            if event not in ('change', 'resync'):
+                continue
+            change = json.loads(data)
+            written = writes.get(change.get('version'))
+            if written is not None:
+                with stats.lock:
+                    stats.latencies.append(time.monotonic() - written)
+            paths = DASHBOARD_ENDPOINTS if event == 'resync' else REFETCH_ON_CHANGE.get(change['entity'], ())
+            with condition:
+                if dirty_since[0] is None:
+                    dirty_since[0] = time.monotonic()
+                dirty.update(paths)
+                condition.notify()
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def idle_listener(api: Api, stop: threading.Event, opened: List[int]):
+    try:
+        conn, response = api.open_stream()
+    except (RuntimeError, OSError):
+        return
+    opened.append(1)
+    close_when_stopped(conn, stop)
+    try:
+        for _ in read_events(response, stop):
+            pass
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def writer(api: Api, student_id: str, rate: float, stop: threading.Event, writes: Dict[int, float]):
+    """
+    Alternately add a grade and an attendance record rate times per second,
+    noting when each data version was written (this is the only writer)
+    """
+    version = json.loads(api.request('GET', '/events/status'))['version']
+    count = 0
+    while not stop.is_set():
+        started = time.monotonic()
+        version += 1
+        writes[version] = started
+        if count % 2:
+            api.request('POST', '/grades', {'studentId': student_id, 'subject': 'Load Test',
+                                            'midterm': 70 + count % 30, 'finals': 75, 'quizzes': 80, 'projects': 85})
+        else:
+            day = date(2099, 1, 1) + timedelta(days=count // 2)
+            api.request('POST', '/attendance', {'studentId': student_id, 'status': 'present',
+                                                'date': day.isoformat()})
+        count += 1
+        stop.wait(max(1.0 / rate - (time.monotonic() - started), 0))
+
+
+# ---------- driver ----------
+
+def run_mode(api: Api, mode: str, args, student_id: str) -> Dict:
+    stop = threading.Event()
+    stats = Stats()
+    writes: Dict[int, float] = {}
+    threads, opened = [], []
+
+    if mode == 'streaming':
+        for _ in range(args.idle):
+            threads.append(threading.Thread(target=idle_listener, args=(api, stop, opened), daemon=True))
+    for _ in range(args.clients):
+        if mode == 'polling':
+            target, extra = polling_client, (args.poll_interval, stop, stats)
+        else:
+            target, extra = streaming_client, (stop, stats, writes)
+        threads.append(threading.Thread(target=target, args=(api,) + extra, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    time.sleep(1)  # let streams connect before writing
+    write_thread = threading.Thread(target=writer, args=(api, student_id, args.write_rate, stop, writes), daemon=True)
+    write_thread.start()
+    time.sleep(args.duration)
+
+    subscribers = json.loads(api.request('GET', '/events/status'))['subscribers']
+    stop.set()
+    write_thread.join()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    report = {
+        'mode': mode,
+        'clients': args.clients,
+        'writes': len(writes),
+        'requests': stats.requests,
+        'unchanged_responses': stats.unchanged,
+        'megabytes': round(stats.bytes / 1e6, 2),
+        'requests_per_client_minute': round(stats.requests / args.clients / (args.duration + 1) * 60, 1),
+    }
+    if mode == 'streaming':
+        report['idle_streams'] = len(opened)
+        report['server_subscribers'] = subscribers
+        if stats.latencies:
+            latencies = sorted(stats.latencies)
+            report['notify_latency_ms'] = {
+                'median': round(statistics.median(latencies) * 1000, 1),
+                'p95': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare polling with the /api/events stream')
+    parser.add_argument('--url', default='http://localhost:5000/api', help='API base URL')
+    parser.add_argument('--clients', type=int, default=20, help='Dashboard clients per mode (default 20)')
+    parser.add_argument('--idle', type=int, default=0, help='Extra listen-only streams (default 0)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per mode (default 30)')
+    parser.add_argument('--poll-interval', type=float, default=5, help='Polling interval in seconds (default 5)')
+    parser.add_argument('--write-rate', type=float, default=0.5, help='Writes per second (default 0.5)')
+    args = parser.parse_args()
+
+    api = Api(args.url)
+    student_id = f'LOADTEST-{os.getpid()}'
+    api.request('POST', '/students', {'id': student_id, 'name': 'Load Test', 'email': 'loadtest@example.com',
+                                      'course': 'Load Test', 'enrollmentDate': '2099-01-01'})
+    try:
+        reports = [run_mode(api, mode, args, student_id) for mode in ('polling', 'streaming')]
+    finally:
+        api.request('DELETE', f'/students/{student_id}')
+
+    print(json.dumps(reports, indent=2))
+    polling, streaming = reports
+    if polling['requests']:
+        change = streaming['requests'] / polling['requests'] - 1
+        print(f"\nStreaming: {streaming['requests']} requests, {streaming['megabytes']} MB; "
+              f"polling: {polling['requests']} requests, {polling['megabytes']} MB "
+              f"({change:+.0%} requests with streaming)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Synthetic Data Generator
+Fills the database with realistic students, grades and attendance for load
+tests and benchmarks, at volumes init_sample_data.py cannot reach.
+
+    python generate_data.py [--students 1000] [--subjects 6] [--terms 4]
+        [--days 120] [--start-date 2024-01-08] [--seed 42]
+        [--batch 2000] [--chunk-size 10000] [--prefix GEN] [--clear]
+
+Each student gets an ability level, a per-term trend and per-subject
+strengths, so grade histories have real slopes for the prediction models;
+absences come from a per-student rate with a two-state (present/absent)
+Markov chain, so they cluster into streaks. The same --seed and arguments
+always produce the same data.
+
+Rows go to the driver's executemany as plain tuples, in chunks of
+--chunk-size, one transaction per --batch students; attendance bitmaps are
+packed directly from the generated days. Use FLASK_ENV=bench to generate
+into SQLite.
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+import numpy as np
+from sqlalchemy import DateTime
+from app import create_app
+from database import db, StudentDB, GradeDB, AttendanceDB, AttendanceBitmapDB
+from attendance_store import term_for_date, TERM_BYTES
+from json_utils import clear_all_data
+from analytics_snapshots import invalidate_snapshots
+
+
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'English',
+            'History', 'Computer Science', 'Economics', 'Literature', 'Art']
+COURSES = ['Computer Science', 'Mathematics', 'Physics', 'Engineering',
+           'Biology', 'Business', 'Psychology']
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Emma', 'Frank', 'Grace', 'Henry',
+               'Isla', 'Jack', 'Kira', 'Liam', 'Maya', 'Noah', 'Olivia', 'Paul',
+               'Quinn', 'Rosa', 'Sam', 'Tara', 'Umar', 'Vera', 'Will', 'Yara', 'Zane']
+LAST_NAMES = ['Johnson', 'Smith', 'Williams', 'Brown', 'Davis', 'Garcia', 'Miller',
+              'Wilson', 'Moore', 'Taylor', 'Anderson', 'Thomas', 'Jackson', 'White',
+              'Harris', 'Martin', 'Thompson', 'Lee', 'Walker', 'Hall']
+
+# Grade components: (mean offset from the student's level, noise std dev)
+COMPONENTS = {
+    'midterm': (0.0, 7.0),
+    'finals': (-2.0, 8.0),
+    'quizzes': (2.0, 6.0),
+    'projects': (4.0, 5.0),
+}
+WEIGHTS = {'midterm': 0.25, 'finals': 0.35, 'quizzes': 0.20, 'projects': 0.20}
+
+# Chance that an absence is followed by another one (higher = longer streaks)
+ABSENCE_PERSISTENCE = 0.55
+
+# Days between the grade records of consecutive terms
+TERM_SPACING_DAYS = 120
+
+
+def subject_names(count: int) -> List[str]:
+    return SUBJECTS[:count] + [f'Subject {i + 1}' for i in range(len(SUBJECTS), count)]
+
+
+def school_days(start: date, count: int) -> List[date]:
+    """The first `count` weekdays from start on"""
+    days, day = [], start
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def simulate_absences(rng: np.random.Generator, rates: np.ndarray, days: int) -> np.ndarray:
+    """
+    Absent flags (students x days) from a two-state Markov chain whose
+    long-run absence rate is each student's rate
+    """
+    stay = ABSENCE_PERSISTENCE
+    start = np.clip(rates * (1 - stay) / np.maximum(1 - rates, 1e-9), 0, 1)
+    absent = np.zeros((len(rates), days), dtype=bool)
+    state = rng.random(len(rates)) < rates
+    for d in range(days):
+        absent[:, d] = state
+        draw = rng.random(len(rates))
+        state = np.where(state, draw < stay, draw < start)
+    return absent
+
+
+def pack_term_bits(flags: np.ndarray, indexes: np.ndarray) -> np.ndarray:
+    """Pack per-day flags (students x days) into term bitmaps (students x TERM_BYTES), bit i = day i"""
+    bits = np.zeros((flags.shape[0], TERM_BYTES * 8), dtype=bool)
+    bits[:, indexes] = flags
+    return np.packbits(bits, axis=1, bitorder='little')
+
+
+class Generator:
+    """Generates and inserts one batch of students at a time"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.subjects = subject_names(args.subjects)
+        self.days = school_days(args.start_date, args.days)
+        self.day_strings = [d.isoformat() for d in self.days]
+        self.id_width = max(6, len(str(args.students)))
+        self.counts = {'students': 0, 'grades': 0, 'attendance': 0, 'bitmaps': 0}
+
+        # Term layout of the attendance days, for packing bitmaps
+        self.terms: Dict[str, Dict] = {}
+        for column, day in enumerate(self.day_strings):
+            term, start, index = term_for_date(day)
+            entry = self.terms.setdefault(term, {'term_start': start.isoformat(), 'columns': [], 'indexes': []})
+            entry['columns'].append(column)
+            entry['indexes'].append(index)
+
+    def _insert(self, connection, model, columns: List[str], rows: List[tuple]):
+        """
+        executemany in chunks, straight to the driver: SQLAlchemy's per-row
+        parameter processing would otherwise take longer than the inserts
+        """
+        quote = connection.dialect.identifier_preparer.quote
+        mark = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+        sql = (f"INSERT INTO {quote(model.__tablename__)} ({', '.join(quote(c) for c in columns)}) "
+               f"VALUES ({', '.join([mark] * len(columns))})")
+        chunk = self.args.chunk_size
+        for i in range(0, len(rows), chunk):
+            connection.exec_driver_sql(sql, rows[i:i + chunk])
+
+    def generate_batch(self, connection, first: int, size: int):
+        rng, args = self.rng, self.args
+        # Timestamps in the driver's format (SQLite stores DateTime as text)
+        dialect = connection.dialect
+        to_db = DateTime().dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+        now = to_db(datetime.utcnow())
+        ids = [f'{args.prefix}{n:0{self.id_width}d}' for n in range(first + 1, first + size + 1)]
+
+        ability = np.clip(rng.normal(74, 9, size), 35, 98)
+        trend = rng.normal(0, 1.5, size)
+        strengths = rng.normal(0, 6, (size, len(self.subjects)))
+        absence_rate = np.clip(rng.beta(2, 25, size) + np.maximum(70 - ability, 0) * 0.004, 0, 0.6)
+
+        first_names = rng.integers(len(FIRST_NAMES), size=size)
+        last_names = rng.integers(len(LAST_NAMES), size=size)
+        courses = rng.integers(len(COURSES), size=size)
+        ages = rng.integers(18, 26, size=size)
+        enrolled = rng.integers(0, 30, size=size)
+        scholarship = rng.random(size) < 0.5
+
+        students = []
+        for i, student_id in enumerate(ids):
+            honors = ability[i] >= 88
+            students.append((
+                student_id,
+                f'{FIRST_NAMES[first_names[i]]} {LAST_NAMES[last_names[i]]}',
+                f'{student_id.lower()}@example.edu',
+                int(ages[i]),
+                COURSES[courses[i]],
+                (args.start_date - timedelta(days=int(enrolled[i]))).isoformat(),
+                'Honors' if honors else 'Regular',
+                'Merit Scholarship' if honors and scholarship[i] else None,
+                now
+            ))
+        self._insert(connection, StudentDB, ['student_id', 'name', 'email', 'age', 'course', 'enrollment_date',
+                                             'student_type', 'scholarship', 'created_at'], students)
+
+        # Grades: (students x subjects x terms) levels, then noisy components
+        level = (ability[:, None, None] + strengths[:, :, None]
+                 + trend[:, None, None] * np.arange(args.terms)[None, None, :])
+        scores = {
+            name: np.round(np.clip(level + bias + rng.normal(0, noise, level.shape), 0, 100), 1)
+            for name, (bias, noise) in COMPONENTS.items()
+        }
+        final = np.round(sum(scores[name] * weight for name, weight in WEIGHTS.items()), 2)
+        term_dates = [to_db(datetime.combine(args.start_date, datetime.min.time())
+                            + timedelta(days=TERM_SPACING_DAYS * t))
+                      for t in range(args.terms)]
+
+        # One row per (student, subject, term), in that order, so grade IDs follow the terms
+        columns = [scores[name].ravel().tolist() for name in COMPONENTS] + [final.ravel().tolist()]
+        keys = [(student_id, subject, created_at)
+                for student_id in ids for subject in self.subjects for created_at in term_dates]
+        grades = [(student_id, subject, *values, created_at)
+                  for (student_id, subject, created_at), *values in zip(keys, *columns)]
+        self._insert(connection, GradeDB, ['student_id', 'subject', *COMPONENTS, 'final_grade', 'created_at'],
+                     grades)
+
+        # Attendance rows plus their packed bitmaps
+        absent = simulate_absences(rng, absence_rate, len(self.days))
+        statuses = np.where(absent, 'absent', 'present')
+        attendance = [
+            (student_id, day, status, now)
+            for student_id, row in zip(ids, statuses.tolist())
+            for day, status in zip(self.day_strings, row)
+        ]
+        self._insert(connection, AttendanceDB, ['student_id', 'date', 'status', 'created_at'], attendance)
+
+        bitmaps = []
+        for term, entry in self.terms.items():
+            columns, indexes = entry['columns'], np.array(entry['indexes'])
+            present = pack_term_bits(~absent[:, columns], indexes)
+            recorded = pack_term_bits(np.ones((size, len(columns)), dtype=bool), indexes)
+            for i, student_id in enumerate(ids):
+                bitmaps.append((student_id, term, entry['term_start'],
+                                present[i].tobytes(), recorded[i].tobytes(), now))
+        self._insert(connection, AttendanceBitmapDB, ['student_id', 'term', 'term_start', 'present_bits',
+                                                      'recorded_bits', 'updated_at'], bitmaps)
+
+        self.counts['students'] += len(students)
+        self.counts['grades'] += len(grades)
+        self.counts['attendance'] += len(attendance)
+        self.counts['bitmaps'] += len(bitmaps)
+
+    def run(self):
+        args = self.args
+        started = time.perf_counter()
+        for first in range(0, args.students, args.batch):
+            size = min(args.batch, args.students - first)
+            with db.engine.begin() as connection:
+                self.generate_batch(connection, first, size)
+            elapsed = time.perf_counter() - started
+            print(f"  {first + size:>9,} / {args.students:,} students, "
+                  f"{self.counts['attendance']:,} attendance rows ({elapsed:.1f}s)")
+        return time.perf_counter() - started
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic students, grades and attendance')
+    parser.add_argument('--students', type=int, default=1000, help='Number of students (default 1000)')
+    parser.add_argument('--subjects', type=int, default=6, help='Subjects per student (default 6)')
+    parser.add_argument('--terms', type=int, default=4, help='Grade records per subject (default 4)')
+    parser.add_argument('--days', type=int, default=120, help='School days of attendance (default 120)')
+    parser.add_argument('--start-date', type=date.fromisoformat, default=date(2024, 1, 8),
+                        help='First school day, YYYY-MM-DD (default 2024-01-08)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default 42)')
+    parser.add_argument('--batch', type=int, default=2000, help='Students per transaction (default 2000)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per executemany (default 10000)')
+    parser.add_argument('--prefix', default='GEN', help='Student ID prefix (default GEN)')
+    parser.add_argument('--clear', action='store_true', help='Delete all existing data first')
+    args = parser.parse_args(argv)
+    for name in ('students', 'subjects', 'terms', 'days', 'batch', 'chunk_size'):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = create_app()
+    with app.app_context():
+        if args.clear:
+            result = clear_all_data()
+            if not result['success']:
+                print(f"✗ Could not clear data: {result['message']}")
+                return 1
+        elif db.session.query(StudentDB.student_id).filter(StudentDB.student_id.like(f'{args.prefix}%')).first():
+            print(f"✗ Students with prefix '{args.prefix}' already exist; use --clear or another --prefix")
+            return 1
+
+        print(f"Generating {args.students:,} students x {args.subjects} subjects x {args.terms} terms, "
+              f"{args.days} school days (seed {args.seed})...")
+        generator = Generator(args)
+        elapsed = generator.run()
+        # Like imports and /data/clear: drop snapshots of the old data
+        invalidate_snapshots(drop=True)
+
+    rows = sum(generator.counts.values())
+    print(f"\n✓ Inserted {generator.counts['students']:,} students, {generator.counts['grades']:,} grades, "
+          f"{generator.counts['attendance']:,} attendance rows and {generator.counts['bitmaps']:,} bitmaps "
+          f"in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    print("Analytics snapshots were dropped, so running servers recompute them on the next read; "
+          "their in-memory search index, grade sketches and rankings pick the new data up once they expire "
+          "(SEARCH_INDEX_MAX_AGE / GRADE_SKETCH_MAX_AGE) or after a restart.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
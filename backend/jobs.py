@@ -0,0 +1,383 @@
+"""
+Background Jobs
+Database-backed job queue with a worker pool in each process for operations
+that are too slow to run inside a request (bulk import/export, cohort
+predictions, class charts).
+
+Jobs are rows in the jobs table, which is the queue: a dispatcher thread in
+every process claims queued rows with a conditional UPDATE (so each job runs
+exactly once, in whichever process has a free slot for its type) and runs
+them on a local thread pool. submit() wakes the local dispatcher, so a job
+usually starts in the process that accepted it; jobs left queued by a
+restart or submitted through a busy worker are picked up by the next poll.
+
+Running jobs are heartbeated; a running row whose heartbeat is older than
+JOB_STALE_SECONDS (its process died) is marked failed. Parameters are
+dropped when a job finishes and finished jobs are deleted after
+JOB_RETENTION_HOURS, so import payloads and export results do not pile up.
+Cancellation removes a queued job, or asks a running handler to stop at its
+next progress() call.
+"""
+
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from database import db, JobDB
+
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+# Used for job types without an entry in JOB_CONCURRENCY
+DEFAULT_JOB_CONCURRENCY = 1
+
+# Minimum seconds between progress writes / cancellation polls per job
+PROGRESS_INTERVAL = 0.5
+
+# Seconds between deletions of finished jobs past their retention
+PURGE_INTERVAL = 600
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when cancellation was requested"""
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting and cancellation checks"""
+
+    def __init__(self, queue: 'JobQueue', job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+
+    def progress(self, fraction: float, message: str = None):
+        """
+        Report progress (0-1) and stop here if the job was cancelled
+
+        Call it between database transactions: progress is written on a
+        separate connection, which SQLite would block behind an open write.
+        """
+        self.check_cancelled()
+        self._queue._set_progress(self.job_id, fraction, message)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested"""
+        if self._queue._cancel_requested(self.job_id):
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Local worker pool over the jobs table"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable] = {}
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = {}
+        self._running_ids = set()
+        self._cancelled = set()
+        self._progress: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._last_sync: Dict[Tuple[str, str], float] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._last_heartbeat = 0.0
+        self._last_purge = 0.0
+        self._app = None
+        self.max_workers = 4
+        self.concurrency: Dict[str, int] = {}
+        self.poll_interval = 2.0
+        self.heartbeat_interval = 15.0
+        self.stale_seconds = 120.0
+        self.retention_hours = 24.0
+
+    def init_app(self, app):
+        """Bind to the app (jobs run inside its app context) and read limits from config"""
+        self._app = app
+        self.max_workers = app.config['JOB_WORKERS']
+        self.concurrency = dict(app.config['JOB_CONCURRENCY'])
+        self.poll_interval = app.config['JOB_POLL_INTERVAL']
+        self.heartbeat_interval = app.config['JOB_HEARTBEAT_INTERVAL']
+        self.stale_seconds = app.config['JOB_STALE_SECONDS']
+        self.retention_hours = app.config['JOB_RETENTION_HOURS']
+
+    def start(self):
+        """Start this process's dispatcher thread (once the tables exist; no-op if running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='job-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def handler(self, job_type: str):
+        """
+        Register a job handler: handler(params, job) -> JSON-serializable result
+
+        Example:
+            @job_queue.handler('export')
+            def run_export(params, job):
+                ...
+        """
+        def register(func: Callable) -> Callable:
+            self._handlers[job_type] = func
+            return func
+        return register
+
+    @property
+    def job_types(self):
+        return sorted(self._handlers)
+
+    # ---------- submitting and dispatching ----------
+
+    def submit(self, job_type: str, params: Dict = None) -> JobDB:
+        """
+        Create a queued job and wake this process's dispatcher
+
+        Raises:
+            ValueError: If the job type is unknown
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type '{job_type}'. Allowed: {', '.join(self.job_types)}")
+
+        job = JobDB(id=uuid.uuid4().hex, job_type=job_type, status='queued',
+                    params=json.dumps(params or {}), progress=0.0)
+        db.session.add(job)
+        db.session.commit()
+        self._wake.set()
+        return job
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with self._app.app_context():
+                    self._maintain()
+                    self._dispatch()
+            except Exception as e:
+                print(f"Job dispatcher error: {e}")
+            self._wake.wait(self.poll_interval if self.poll_interval > 0 else None)
+            self._wake.clear()
+
+    def _free_slots(self) -> Dict[str, int]:
+        """Job type -> jobs of that type this process can start now"""
+        with self._lock:
+            total = self.max_workers - sum(self._running.values())
+            if total <= 0:
+                return {}
+            free = {}
+            for job_type in self._handlers:
+                limit = self.concurrency.get(job_type, DEFAULT_JOB_CONCURRENCY)
+                available = min(limit - self._running.get(job_type, 0), total)
+                if available > 0:
+                    free[job_type] = available
+            return free
+
+    def _dispatch(self):
+        """Claim queued jobs, oldest first, while their type and the pool have free slots"""
+        free = self._free_slots()
+        if not free:
+            return
+        candidates = db.session.execute(
+            select(JobDB.id, JobDB.job_type)
+            .where(JobDB.status == 'queued', JobDB.job_type.in_(list(free)))
+            .order_by(JobDB.created_at)
+            .limit(sum(free.values()) * 4)
+        ).all()
+        db.session.commit()
+        for job_id, job_type in candidates:
+            if not free.get(job_type) or not self._claim(job_id):
+                continue
+            free[job_type] -= 1
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='job')
+                self._running[job_type] = self._running.get(job_type, 0) + 1
+                self._running_ids.add(job_id)
+                self._executor.submit(self._run, job_type, job_id)
+
+    def _claim(self, job_id: str) -> bool:
+        """Move a queued job to running; False if another process (or a cancel) got there first"""
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(JobDB)
+            .where(JobDB.id == job_id, JobDB.status == 'queued', JobDB.cancel_requested.is_(False))
+            .values(status='running', started_at=now, heartbeat_at=now)
+        ).rowcount
+        db.session.commit()
+        return claimed == 1
+
+    def _run(self, job_type: str, job_id: str):
+        try:
+            with self._app.app_context():
+                self._execute(job_type, job_id)
+        finally:
+            with self._lock:
+                self._running[job_type] -= 1
+                self._running_ids.discard(job_id)
+                self._cancelled.discard(job_id)
+                self._progress.pop(job_id, None)
+                self._last_sync.pop((job_id, 'progress'), None)
+                self._last_sync.pop((job_id, 'cancel'), None)
+            self._wake.set()
+
+    def _execute(self, job_type: str, job_id: str):
+        job = db.session.get(JobDB, job_id)
+        params = json.loads(job.params or '{}')
+        fields = {}
+        try:
+            result = self._handlers[job_type](params, JobContext(self, job_id))
+            fields = {'status': 'succeeded', 'progress': 1.0, 'result': json.dumps(result)}
+        except JobCancelled:
+            db.session.rollback()
+            fields = {'status': 'cancelled', 'message': 'Cancelled while running'}
+        except Exception as e:
+            db.session.rollback()
+            fields = {'status': 'failed', 'error': str(e)}
+        finally:
+            # Parameters (e.g. whole import payloads) are not needed once finished
+            fields.update(finished_at=datetime.utcnow(), params=None)
+            db.session.execute(update(JobDB).where(JobDB.id == job_id).values(**fields))
+            db.session.commit()
+
+    # ---------- heartbeats, stale jobs and retention ----------
+
+    def _maintain(self):
+        now = time.monotonic()
+        if now - self._last_heartbeat >= self.heartbeat_interval:
+            self._last_heartbeat = now
+            self._heartbeat()
+            self.fail_stale()
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = now
+            self.purge()
+
+    def _heartbeat(self):
+        with self._lock:
+            running = list(self._running_ids)
+        if not running:
+            return
+        db.session.execute(update(JobDB).where(JobDB.id.in_(running), JobDB.status == 'running')
+                           .values(heartbeat_at=datetime.utcnow()))
+        db.session.commit()
+
+    def fail_stale(self) -> int:
+        """Mark running jobs failed whose process stopped heartbeating; returns how many"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        with self._lock:
+            local = list(self._running_ids)
+        query = (update(JobDB)
+                 .where(JobDB.status == 'running',
+                        func.coalesce(JobDB.heartbeat_at, JobDB.started_at) < cutoff)
+                 .values(status='failed', params=None, finished_at=datetime.utcnow(),
+                         error='Worker stopped while the job was running'))
+        if local:
+            query = query.where(JobDB.id.not_in(local))
+        failed = db.session.execute(query).rowcount
+        db.session.commit()
+        return failed
+
+    def purge(self) -> int:
+        """Delete finished jobs older than retention_hours; returns how many"""
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        deleted = db.session.execute(
+            delete(JobDB).where(JobDB.status.in_(FINISHED_STATUSES), JobDB.finished_at < cutoff)
+        ).rowcount
+        db.session.commit()
+        return deleted
+
+    def _finish_cancelled_if_requested(self, job_id: str):
+        db.session.execute(
+            update(JobDB)
+            .where(JobDB.id == job_id, JobDB.status == 'queued', JobDB.cancel_requested.is_(True))
+            .values(status='cancelled', params=None, finished_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    # ---------- progress and cancellation ----------
+
+    def _should_sync(self, job_id: str, kind: str) -> bool:
+        """Throttle database round trips of one kind ('progress' or 'cancel') per job"""
+        now = time.monotonic()
+        key = (job_id, kind)
+        with self._lock:
+            if now - self._last_sync.get(key, 0.0) < PROGRESS_INTERVAL:
+                return False
+            self._last_sync[key] = now
+            return True
+
+    def _set_progress(self, job_id: str, fraction: float, message: Optional[str]):
+        fraction = min(max(float(fraction), 0.0), 1.0)
+        with self._lock:
+            self._progress[job_id] = (fraction, message)
+        if not self._should_sync(job_id, 'progress'):
+            return
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(update(JobDB).where(JobDB.id == job_id)
+                                   .values(progress=fraction, message=message))
+        except SQLAlchemyError:
+            pass  # best effort: live progress is still served from memory
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            if job_id in self._cancelled:
+                return True
+        if not self._should_sync(job_id, 'cancel'):
+            return False
+        # Cancellation may have been requested through another worker process
+        try:
+            with db.engine.connect() as connection:
+                requested = connection.execute(
+                    select(JobDB.cancel_requested).where(JobDB.id == job_id)
+                ).scalar()
+        except SQLAlchemyError:
+            return False
+        return bool(requested)
+
+    def cancel(self, job_id: str) -> Optional[JobDB]:
+        """
+        Cancel a job: queued jobs are cancelled at once, running jobs stop
+        at their next progress report. Finished jobs are left unchanged.
+
+        Returns:
+            The job, or None if it does not exist
+        """
+        job = db.session.get(JobDB, job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return job
+
+        if job.status == 'running':
+            with self._lock:
+                if job_id in self._running_ids:
+                    self._cancelled.add(job_id)
+
+        db.session.execute(update(JobDB).where(JobDB.id == job_id).values(cancel_requested=True))
+        db.session.commit()
+        self._finish_cancelled_if_requested(job_id)
+        db.session.refresh(job)
+        return job
+
+    # ---------- reading ----------
+
+    def to_dict(self, job: JobDB, include_result: bool = True) -> Dict:
+        """Job as a dictionary, with live progress for jobs running in this process"""
+        data = job.to_dict(include_result=include_result)
+        with self._lock:
+            live = self._progress.get(job.id)
+        if live is not None and job.status == 'running':
+            data['progress'] = round(live[0], 4)
+            data['message'] = live[1]
+        return data
+
+
+# Shared queue; handlers are registered by the routes module
+job_queue = JobQueue()
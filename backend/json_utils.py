@@ -5,8 +5,10 @@ Provides functions to backup and restore data in JSON format
 
 import json
 from datetime import datetime
-from typing import Dict, List
-from database import db, StudentDB, GradeDB, AttendanceDB
+from typing import Callable, Dict, List
+from database import db, StudentDB, GradeDB, AttendanceDB, AttendanceBitmapDB
+from attendance_store import rebuild_bitmaps
+from jobs import JobCancelled
 
 
 def export_to_json(filepath: str = None) -> Dict:
@@ -46,13 +48,16 @@ def export_to_json(filepath: str = None) -> Dict:
     return data
 
 
-def import_from_json(filepath: str = None, data: Dict = None) -> Dict:
+def import_from_json(filepath: str = None, data: Dict = None,
+                     progress: Callable[[float, str], None] = None) -> Dict:
     """
     Import data from JSON and populate MySQL database
     
     Args:
         filepath: Path to JSON file to import
         data: Dictionary data to import (alternative to filepath)
+        progress: Optional callback(fraction, message), called after each
+                  section is committed (may raise JobCancelled to stop)
     
     Returns:
         Dictionary with import statistics
@@ -107,6 +112,8 @@ def import_from_json(filepath: str = None, data: Dict = None) -> Dict:
                 stats['errors'].append(f"Student {student_data.get('id')}: {str(e)}")
         
         db.session.commit()
+        if progress:
+            progress(1 / 3, 'Students imported')
         
         # Import grades
         for grade_data in data.get('grades', []):
@@ -142,6 +149,8 @@ def import_from_json(filepath: str = None, data: Dict = None) -> Dict:
                 stats['errors'].append(f"Grade {grade_data.get('id')}: {str(e)}")
         
         db.session.commit()
+        if progress:
+            progress(2 / 3, 'Grades imported')
         
         # Import attendance
         for attendance_data in data.get('attendance', []):
@@ -170,6 +179,14 @@ def import_from_json(filepath: str = None, data: Dict = None) -> Dict:
         
         db.session.commit()
         
+        # Keep attendance bitmaps in sync with the imported rows
+        imported_ids = {a['studentId'] for a in data.get('attendance', []) if 'studentId' in a}
+        if imported_ids:
+            rebuild_bitmaps(imported_ids)
+        
+    except JobCancelled:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         stats['errors'].append(f"Import failed: {str(e)}")
@@ -180,6 +197,7 @@ def import_from_json(filepath: str = None, data: Dict = None) -> Dict:
 def clear_all_data():
     """Clear all data from database (use with caution!)"""
     try:
+        AttendanceBitmapDB.query.delete()
         AttendanceDB.query.delete()
         GradeDB.query.delete()
         StudentDB.query.delete()
@@ -0,0 +1,359 @@
+"""
+HTTP Load Test
+Drives the API with a weighted mix of dashboard traffic from concurrent
+workers and reports throughput, error rate and p50/p95/p99 latency per
+route. Where test_api.py checks that each endpoint works, this measures how
+the API holds up under realistic concurrent load.
+
+Runs either in-process against the WSGI app (no server needed; uses the
+SQLite bench profile unless FLASK_ENV is set, generating students if the
+database is empty) or against a running server:
+
+    python load_test.py [--profile dashboard] [--concurrency 8] [--duration 30]
+    python load_test.py --url http://localhost:5000/api --profile read-only
+
+    options: --warmup 3 --seed 42 --students 500 --output report.json --allow-writes
+
+Profiles (see PROFILES): dashboard, read-only, analytics, charts, writes.
+Profiles with a burst section switch part of the traffic to attendance
+writes for the first seconds of every interval, the way roll calls arrive
+at the start of class. Writes use dates in WRITE_YEAR but are not cleaned
+up, so profiles that write only run against the bench database unless
+--allow-writes is given.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+
+# (weight, route label, method, path template, body) - templates take
+# {student}, {subject} and {q}; bodies are built by the named BODIES factory
+DASHBOARD_READS = [
+    (20, 'GET /students', 'GET', '/students?limit=50', None),
+    (8, 'GET /students/<id>', 'GET', '/students/{student}', None),
+    (6, 'GET /students/search', 'GET', '/students/search?q={q}', None),
+    (10, 'GET /grades', 'GET', '/grades?studentId={student}', None),
+    (6, 'GET /attendance', 'GET', '/attendance?studentId={student}', None),
+    (8, 'GET /analytics/class', 'GET', '/analytics/class', None),
+    (5, 'GET /analytics/student/<id>', 'GET', '/analytics/student/{student}', None),
+    (4, 'GET /analytics/attendance', 'GET', '/analytics/attendance?granularity=week', None),
+    (3, 'GET /analytics/distribution', 'GET', '/analytics/distribution', None),
+    (4, 'GET /predictions/student/<id>', 'GET', '/predictions/student/{student}?subject={subject}', None),
+    (2, 'GET /predictions/at-risk', 'GET', '/predictions/at-risk?limit=20', None),
+    (3, 'GET /rankings', 'GET', '/rankings?limit=20', None),
+    (2, 'GET /attendance/summary/<id>', 'GET', '/attendance/summary/{student}', None),
+]
+
+CHARTS = [
+    (3, 'GET /charts/grade-distribution', 'GET', '/charts/grade-distribution', None),
+    (2, 'GET /charts/grade-progress/<id>', 'GET', '/charts/grade-progress/{student}', None),
+    (2, 'GET /charts/attendance', 'GET', '/charts/attendance', None),
+    (1, 'GET /charts/subject-comparison/<id>', 'GET', '/charts/subject-comparison/{student}', None),
+    (1, 'GET /charts/class-performance', 'GET', '/charts/class-performance', None),
+]
+
+ATTENDANCE_WRITES = [
+    (3, 'POST /attendance/roll-call', 'POST', '/attendance/roll-call', 'roll_call'),
+    (1, 'POST /attendance', 'POST', '/attendance', 'attendance'),
+]
+
+PROFILES = {
+    # Read-heavy lists and analytics, a few charts, and attendance bursts
+    'dashboard': {
+        'mix': DASHBOARD_READS + CHARTS,
+        'burst': {'every': 10.0, 'length': 2.0, 'share': 0.5, 'mix': ATTENDANCE_WRITES},
+    },
+    'read-only': {'mix': DASHBOARD_READS},
+    'analytics': {'mix': [op for op in DASHBOARD_READS if '/analytics' in op[1] or '/predictions' in op[1]]},
+    'charts': {'mix': CHARTS},
+    'writes': {'mix': ATTENDANCE_WRITES},
+}
+
+ROLL_CALL_SIZE = 30
+
+# Attendance writes use dates in this year, to keep them apart from real records
+WRITE_YEAR = 2099
+
+
+def profile_writes(profile: Dict) -> bool:
+    """Whether a profile sends any write requests"""
+    return 'burst' in profile or any(op[2] != 'GET' for op in profile['mix'])
+
+
+# ---------- transports ----------
+
+class HttpTarget:
+    """A running server; one keep-alive connection per worker thread"""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, bytes]:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            conn = getattr(self.local, 'conn', None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request(method, self.prefix + path, body=payload, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+
+class WsgiTarget:
+    """The Flask app in this process, called through its test client (one per worker thread)"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, bytes]:
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open('/api' + path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+def in_process_target(students: int) -> WsgiTarget:
+    # The bench profile is read when config is imported, so set it first
+    os.environ.setdefault('FLASK_ENV', 'bench')
+    from app import create_app
+    from database import StudentDB
+
+    app = create_app()
+    with app.app_context():
+        empty = StudentDB.query.first() is None
+    if empty:
+        import generate_data
+        print(f"Database is empty; generating {students} students...")
+        with app.app_context():
+            generate_data.Generator(generate_data.parse_args([f'--students={students}'])).run()
+    return WsgiTarget(app)
+
+
+# ---------- traffic ----------
+
+class Traffic:
+    """Picks the next request of a profile and fills in its parameters"""
+
+    def __init__(self, profile: Dict, student_ids: List[str], subjects: List[str], started: float):
+        self.profile = profile
+        self.student_ids = student_ids
+        self.subjects = subjects or ['Mathematics']
+        self.started = started
+        self.days = [date(WRITE_YEAR, 1, 5) + timedelta(days=i) for i in range(180)]
+
+    def in_burst(self, now: float) -> bool:
+        burst = self.profile.get('burst')
+        return bool(burst) and (now - self.started) % burst['every'] < burst['length']
+
+    def pick(self, rng: random.Random, now: float):
+        burst = self.profile.get('burst')
+        if burst and self.in_burst(now) and rng.random() < burst['share']:
+            mix = burst['mix']
+        else:
+            mix = self.profile['mix']
+        weight, label, method, template, body = rng.choices(mix, weights=[op[0] for op in mix])[0]
+        student = rng.choice(self.student_ids)
+        path = template.format(student=quote(student), subject=quote(rng.choice(self.subjects)),
+                               q=quote(student[:max(len(student) - 2, 1)]))
+        return label, method, path, BODIES[body](self, rng, student) if body else None
+
+    def roll_call(self, rng: random.Random, student: str) -> Dict:
+        section = rng.sample(self.student_ids, min(ROLL_CALL_SIZE, len(self.student_ids)))
+        return {'date': rng.choice(self.days).isoformat(),
+                'records': {sid: 'absent' if rng.random() < 0.08 else 'present' for sid in section}}
+
+    def attendance(self, rng: random.Random, student: str) -> Dict:
+        return {'studentId': student, 'date': rng.choice(self.days).isoformat(),
+                'status': 'absent' if rng.random() < 0.08 else 'present'}
+
+
+BODIES: Dict[str, Callable] = {
+    'roll_call': Traffic.roll_call,
+    'attendance': Traffic.attendance,
+}
+
+
+# ---------- measurement ----------
+
+class RouteStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.client_errors = 0
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(max(math.ceil(q * len(ordered)), 1), len(ordered)) - 1]
+
+
+def summarize(stats: RouteStats, duration: float) -> Dict:
+    ordered = sorted(stats.latencies)
+    count = len(ordered)
+    return {
+        'requests': count,
+        'requests_per_second': round(count / duration, 2),
+        'errors': stats.errors,
+        'error_rate': round(stats.errors / count, 4) if count else 0.0,
+        'client_errors': stats.client_errors,
+        'latency_ms': {
+            'p50': _ms(percentile(ordered, 0.50)),
+            'p95': _ms(percentile(ordered, 0.95)),
+            'p99': _ms(percentile(ordered, 0.99)),
+            'max': _ms(ordered[-1] if ordered else None),
+        },
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def worker(target, traffic: Traffic, seed: int, measure_from: float, deadline: float,
+           results: Dict[str, RouteStats], lock: threading.Lock):
+    rng = random.Random(seed)
+    local: Dict[str, RouteStats] = {}
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        label, method, path, body = traffic.pick(rng, now)
+        started = time.perf_counter()
+        try:
+            status = target.request(method, path, body)[0]
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - started
+        if now < measure_from:
+            continue
+        stats = local.setdefault(label, RouteStats())
+        stats.latencies.append(elapsed)
+        if status is None or status >= 500:
+            stats.errors += 1
+        elif status >= 400:
+            stats.client_errors += 1
+
+    with lock:
+        for label, stats in local.items():
+            merged = results.setdefault(label, RouteStats())
+            merged.latencies.extend(stats.latencies)
+            merged.errors += stats.errors
+            merged.client_errors += stats.client_errors
+
+
+def discover(target) -> Tuple[List[str], List[str]]:
+    """Student IDs and subjects to parameterize requests with"""
+    status, body = target.request('GET', '/students?limit=1000')
+    if status != 200:
+        raise RuntimeError(f'GET /students returned {status}')
+    student_ids = [s['id'] for s in json.loads(body)['students']]
+    status, body = target.request('GET', '/grades?limit=500')
+    subjects = sorted({g['subject'] for g in json.loads(body).get('grades', [])}) if status == 200 else []
+    return student_ids, subjects
+
+
+def run(target, profile_name: str, concurrency: int, duration: float, warmup: float, seed: int) -> Dict:
+    student_ids, subjects = discover(target)
+    if not student_ids:
+        raise RuntimeError('No students to load test with; add data first (e.g. generate_data.py)')
+
+    started = time.monotonic()
+    traffic = Traffic(PROFILES[profile_name], student_ids, subjects, started)
+    results: Dict[str, RouteStats] = {}
+    lock = threading.Lock()
+    measure_from, deadline = started + warmup, started + warmup + duration
+    threads = [threading.Thread(target=worker, daemon=True,
+                                args=(target, traffic, seed + i, measure_from, deadline, results, lock))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = RouteStats()
+    for stats in results.values():
+        total.latencies.extend(stats.latencies)
+        total.errors += stats.errors
+        total.client_errors += stats.client_errors
+    return {
+        'profile': profile_name,
+        'concurrency': concurrency,
+        'duration': duration,
+        'students': len(student_ids),
+        'overall': summarize(total, duration),
+        'routes': {label: summarize(stats, duration) for label, stats in sorted(results.items())},
+    }
+
+
+def print_report(report: Dict):
+    print(f"\nProfile '{report['profile']}', {report['concurrency']} workers, {report['duration']:.0f}s, "
+          f"{report['students']} students\n")
+    print(f"{'route':<38} {'reqs':>7} {'req/s':>8} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(report['routes'].items()) + [('TOTAL', report['overall'])]
+    for label, r in rows:
+        lat = r['latency_ms']
+        print(f"{label:<38} {r['requests']:>7} {r['requests_per_second']:>8} {r['error_rate'] * 100:>6.2f} "
+              f"{lat['p50'] or 0:>9.2f} {lat['p95'] or 0:>9.2f} {lat['p99'] or 0:>9.2f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Load test the API with mixed dashboard traffic')
+    parser.add_argument('--url', help='API base URL of a running server (default: in-process WSGI app)')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='dashboard', help='Traffic mix (default dashboard)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent workers (default 8)')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds (default 30)')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds before that (default 3)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed of the request sequence (default 42)')
+    parser.add_argument('--students', type=int, default=500,
+                        help='Students to generate when the in-process database is empty (default 500)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--allow-writes', action='store_true',
+                        help='Allow profiles that write attendance against --url or a non-bench FLASK_ENV')
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.duration <= 0:
+        parser.error('--concurrency and --duration must be positive')
+    bench = not args.url and os.environ.get('FLASK_ENV', 'bench') == 'bench'
+    if profile_writes(PROFILES[args.profile]) and not (bench or args.allow_writes):
+        parser.error(f"profile '{args.profile}' records attendance for {WRITE_YEAR} dates in "
+                     f"{args.url or 'the ' + os.environ['FLASK_ENV'] + ' database'} and does not remove it; "
+                     f"pass --allow-writes to run it anyway, or use --profile read-only")
+
+    target = HttpTarget(args.url) if args.url else in_process_target(args.students)
+    report = run(target, args.profile, args.concurrency, args.duration, args.warmup, args.seed)
+    report['target'] = args.url or 'in-process'
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nLoad test report written to {args.output}")
+    return 1 if report['overall']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Connection Pool Metrics
+Per-process telemetry for the SQLAlchemy connection pools: checkout wait
+time, connections in use, overflow connections, checkout timeouts and
+invalidated (stale) connections, for sizing SQLALCHEMY_ENGINE_OPTIONS
+against real traffic.
+
+Wait time is measured by the pool class itself (InstrumentedQueuePool),
+everything else through pool events. Served by GET /api/metrics/pool.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+# Upper bounds (ms) of the checkout wait histogram buckets; the last is +Inf
+WAIT_BUCKETS_MS = (0.1, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PoolMetrics:
+    """Counters and a wait-time histogram for one pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.pool = None
+        self.checkouts = 0
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_in_use = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_checkout(self, waited: float, overflowed: bool):
+        waited_ms = waited * 1000
+        with self._lock:
+            self.checkouts += 1
+            self.wait_counts[bisect.bisect_left(WAIT_BUCKETS_MS, waited_ms)] += 1
+            self.wait_total += waited_ms
+            self.wait_max = max(self.wait_max, waited_ms)
+            self.overflow_events += int(overflowed)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def _gauge(self, name: str):
+        """pool.size()/checkedout()/... or None for pools without them (StaticPool, NullPool)"""
+        method = getattr(self.pool, name, None)
+        return method() if method is not None else None
+
+    def _on_checkout(self, dbapi_connection, record, proxy):
+        in_use = self._gauge('checkedout')
+        if in_use is None:
+            return
+        with self._lock:
+            self.peak_in_use = max(self.peak_in_use, in_use)
+
+    def _on_connect(self, dbapi_connection, record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def _wait_quantile(self, q: float) -> float:
+        """Upper bucket bound containing quantile q (ms), None without data"""
+        if not self.checkouts:
+            return None
+        rank = q * self.checkouts
+        seen = 0
+        for bound, count in zip(WAIT_BUCKETS_MS + (float('inf'),), self.wait_counts):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float('inf') else round(self.wait_max, 3)
+        return round(self.wait_max, 3)
+
+    def snapshot(self) -> Dict:
+        """Current gauges and cumulative counters as a dictionary"""
+        overflow = self._gauge('overflow')
+        with self._lock:
+            return {
+                'pool': self.name,
+                'size': self._gauge('size'),
+                'inUse': self._gauge('checkedout'),
+                'idle': self._gauge('checkedin'),
+                'overflow': max(overflow, 0) if overflow is not None else None,
+                'maxOverflow': getattr(self.pool, '_max_overflow', None),
+                'peakInUse': self.peak_in_use,
+                'checkouts': self.checkouts,
+                'overflowEvents': self.overflow_events,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'waitMs': {
+                    'total': round(self.wait_total, 3),
+                    'mean': round(self.wait_total / self.checkouts, 3) if self.checkouts else None,
+                    'p50': self._wait_quantile(0.5),
+                    'p95': self._wait_quantile(0.95),
+                    'p99': self._wait_quantile(0.99),
+                    'max': round(self.wait_max, 3),
+                    'buckets': {('+Inf' if i == len(WAIT_BUCKETS_MS) else str(WAIT_BUCKETS_MS[i])): count
+                                for i, count in enumerate(self.wait_counts)},
+                },
+            }
+
+
+class _TimedCheckout:
+    """Pool mixin that times how long a checkout waited for a connection"""
+
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        metrics = self.metrics
+        if metrics is None:
+            return super()._do_get()
+        overflow = self.overflow()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            metrics.record_timeout()
+            raise
+        metrics.record_checkout(time.perf_counter() - started, self.overflow() > overflow and overflow >= 0)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool that reports checkout waits to its PoolMetrics"""
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """Async engine variant of InstrumentedQueuePool"""
+
+
+# Pool name -> metrics, for every instrumented pool in this process
+registry: Dict[str, PoolMetrics] = {}
+
+
+def instrument(engine, name: str = 'primary') -> PoolMetrics:
+    """
+    Attach metrics to an engine's pool (idempotent per name)
+
+    Wait times are only recorded when the engine was created with an
+    Instrumented*QueuePool poolclass; the event-based counters work with any
+    pool.
+    """
+    pool = getattr(engine, 'sync_engine', engine).pool
+    metrics = registry.get(name)
+    if metrics is not None and metrics.pool is pool:
+        return metrics
+    metrics = PoolMetrics(name)
+    metrics.pool = pool
+    if isinstance(pool, _TimedCheckout):
+        pool.metrics = metrics
+    event.listen(pool, 'checkout', metrics._on_checkout)
+    event.listen(pool, 'connect', metrics._on_connect)
+    event.listen(pool, 'invalidate', metrics._on_invalidate)
+    registry[name] = metrics
+    return metrics
+
+
+def snapshot_all() -> List[Dict]:
+    return [metrics.snapshot() for _, metrics in sorted(registry.items())]
+
+
+def prometheus_text() -> str:
+    """All pool metrics in the Prometheus text exposition format"""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f'{name}{{{label_text}}} {value}')
+
+    snapshots = snapshot_all()
+    for key, name, kind, help_text in (
+        ('inUse', 'db_pool_connections_in_use', 'gauge', 'Connections checked out'),
+        ('idle', 'db_pool_connections_idle', 'gauge', 'Connections idle in the pool'),
+        ('overflow', 'db_pool_overflow', 'gauge', 'Overflow connections open'),
+        ('size', 'db_pool_size', 'gauge', 'Configured pool size'),
+        ('checkouts', 'db_pool_checkouts_total', 'counter', 'Connection checkouts'),
+        ('overflowEvents', 'db_pool_overflow_events_total', 'counter', 'Checkouts that opened an overflow connection'),
+        ('timeouts', 'db_pool_timeouts_total', 'counter', 'Checkouts that timed out waiting'),
+        ('invalidations', 'db_pool_invalidations_total', 'counter', 'Connections invalidated (stale or broken)'),
+    ):
+        metric(name, kind, help_text, [({'pool': s['pool']}, s[key]) for s in snapshots if s[key] is not None])
+
+    name = 'db_pool_checkout_wait_seconds'
+    lines.append(f'# HELP {name} Time spent waiting for a pooled connection')
+    lines.append(f'# TYPE {name} histogram')
+    for s in snapshots:
+        cumulative = 0
+        for bucket, count in s['waitMs']['buckets'].items():
+            cumulative += count
+            bound = bucket if bucket == '+Inf' else repr(float(bucket) / 1000)
+            lines.append(f'{name}_bucket{{pool="{s["pool"]}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{pool="{s["pool"]}"}} {s["waitMs"]["total"] / 1000}')
+        lines.append(f'{name}_count{{pool="{s["pool"]}"}} {s["checkouts"]}')
+    return '\n'.join(lines) + '\n'
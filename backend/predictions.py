@@ -3,9 +3,85 @@ Machine Learning Prediction Module
 Uses Linear Regression to predict future grades
 """
 
+import itertools
 import numpy as np
 from typing import List, Dict, Optional
 from database import GradeDB
+from server_timing import span
+
+
+# Two-sided prediction interval levels (percent)
+INTERVAL_LEVELS = (80, 95)
+
+# Student t critical values for 1-30 degrees of freedom; larger df use a
+# Cornish-Fisher expansion around the normal quantile
+T_CRITICAL_VALUES = {
+    80: (3.078, 1.886, 1.638, 1.533, 1.476, 1.440, 1.415, 1.397, 1.383, 1.372,
+         1.363, 1.356, 1.350, 1.345, 1.341, 1.337, 1.333, 1.330, 1.328, 1.325,
+         1.323, 1.321, 1.319, 1.318, 1.316, 1.315, 1.314, 1.313, 1.311, 1.310),
+    95: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042),
+}
+NORMAL_QUANTILES = {80: 1.2815515655, 95: 1.9599639845}
+
+
+def t_critical(df, level: int) -> np.ndarray:
+    """Two-sided Student t critical value for each df (NaN where df < 1)"""
+    df = np.asarray(df, dtype=float)
+    z = NORMAL_QUANTILES[level]
+    table = np.asarray(T_CRITICAL_VALUES[level])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expansion = (z + (z ** 3 + z) / (4 * df)
+                     + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+                     + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+    small = table[np.clip(np.nan_to_num(df), 1, len(table)).astype(int) - 1]
+    return np.where(df < 1, np.nan, np.where(df <= len(table), small, expansion))
+
+
+def linear_forecast_errors(n, ss_res, periods_ahead: int = 1):
+    """
+    Standard errors of a least-squares line through x = 0..n-1
+    
+    Uses the residual variance ss_res / (n - 2), so both are NaN for n < 3.
+    
+    Returns:
+        (slope standard error, forecast standard error at x = n + periods_ahead - 1,
+         degrees of freedom)
+    """
+    n = np.asarray(n, dtype=float)
+    df = n - 2
+    mean_x = (n - 1) / 2
+    sxx = n * (n * n - 1) / 12
+    next_period = n + periods_ahead - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residual_variance = np.where(df > 0, ss_res / df, np.nan)
+        slope_se = np.sqrt(residual_variance / sxx)
+        forecast_se = np.sqrt(residual_variance * (1 + 1 / n + (next_period - mean_x) ** 2 / sxx))
+    return slope_se, forecast_se, df
+
+
+def prediction_intervals(predicted, forecast_se, df) -> Dict[int, tuple]:
+    """
+    predicted +/- t * forecast_se for each of INTERVAL_LEVELS, clipped to 0-100
+    
+    Returns:
+        Dictionary mapping level to (lower, upper) arrays (NaN where undefined)
+    """
+    intervals = {}
+    for level in INTERVAL_LEVELS:
+        half_width = t_critical(df, level) * forecast_se
+        intervals[level] = (np.clip(predicted - half_width, 0, 100),
+                            np.clip(predicted + half_width, 0, 100))
+    return intervals
+
+
+def format_intervals(intervals: Dict[int, tuple], i: int = 0) -> Optional[Dict[str, List[float]]]:
+    """JSON form {'80': [lower, upper], '95': [...]} of one entry (None if undefined)"""
+    if np.isnan(intervals[INTERVAL_LEVELS[0]][0][i]):
+        return None
+    return {str(level): [round(float(lower[i]), 2), round(float(upper[i]), 2)]
+            for level, (lower, upper) in intervals.items()}
 
 
 def linear_regression_predict(grades: List[float], periods_ahead: int = 1) -> Dict:
@@ -39,15 +115,19 @@ def linear_regression_predict(grades: List[float], periods_ahead: int = 1) -> Di
     next_period = len(grades) + periods_ahead - 1
     predicted_grade = slope * next_period + intercept
     
-    # Ensure grade is within valid range (0-100)
-    predicted_grade = max(0, min(100, predicted_grade))
-    
     # Calculate R-squared (coefficient of determination)
     y_pred = slope * x + intercept
     ss_res = np.sum((y - y_pred) ** 2)
     ss_tot = np.sum((y - np.mean(y)) ** 2)
     r_squared = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
     
+    # Slope standard error and 80/95% prediction intervals from the residuals
+    slope_se, forecast_se, df = linear_forecast_errors([len(grades)], [ss_res], periods_ahead)
+    intervals = prediction_intervals(np.array([predicted_grade]), forecast_se, df)
+    
+    # Ensure grade is within valid range (0-100)
+    predicted_grade = max(0, min(100, predicted_grade))
+    
     # Determine trend
     if slope > 0.5:
         trend = 'improving'
@@ -63,6 +143,8 @@ def linear_regression_predict(grades: List[float], periods_ahead: int = 1) -> Di
         'r_squared': round(float(r_squared), 4),
         'trend': trend,
         'confidence': 'high' if r_squared > 0.7 else 'medium' if r_squared > 0.4 else 'low',
+        'slope_standard_error': None if np.isnan(slope_se[0]) else round(float(slope_se[0]), 4),
+        'prediction_intervals': format_intervals(intervals),
         'past_grades': grades,
         'periods_predicted': periods_ahead
     }
@@ -115,7 +197,8 @@ def polynomial_regression_predict(grades: List[float], degree: int = 2, periods_
     }
 
 
-def predict_student_grade(student_id: str, subject: str, periods_ahead: int = 1) -> Dict:
+def predict_student_grade(student_id: str, subject: str, periods_ahead: int = 1,
+                          model: str = 'linear') -> Dict:
     """
     Predict a student's next grade for a specific subject
     
@@ -123,15 +206,17 @@ def predict_student_grade(student_id: str, subject: str, periods_ahead: int = 1)
         student_id: Student ID
         subject: Subject name
         periods_ahead: Number of periods to predict ahead
+        model: 'linear', or 'auto' to choose the degree by leave-one-out error
     
     Returns:
         Prediction results dictionary
     """
     # Get all grades for this student and subject
-    grade_records = GradeDB.query.filter_by(
-        student_id=student_id,
-        subject=subject
-    ).order_by(GradeDB.created_at).all()
+    with span('db'):
+        grade_records = GradeDB.query.filter_by(
+            student_id=student_id,
+            subject=subject
+        ).order_by(GradeDB.created_at).all()
     
     if not grade_records:
         return {
@@ -158,19 +243,23 @@ def predict_student_grade(student_id: str, subject: str, periods_ahead: int = 1)
         quiz_grades.append(record.quizzes)
         project_grades.append(record.projects)
     
-    # Predict final grade
-    prediction = linear_regression_predict(final_grades, periods_ahead)
-    
-    # Also predict individual components
-    component_predictions = {}
-    if len(midterm_grades) >= 2:
-        component_predictions['midterm'] = linear_regression_predict(midterm_grades, periods_ahead)['predicted_grade']
-    if len(finals_grades) >= 2:
-        component_predictions['finals'] = linear_regression_predict(finals_grades, periods_ahead)['predicted_grade']
-    if len(quiz_grades) >= 2:
-        component_predictions['quizzes'] = linear_regression_predict(quiz_grades, periods_ahead)['predicted_grade']
-    if len(project_grades) >= 2:
-        component_predictions['projects'] = linear_regression_predict(project_grades, periods_ahead)['predicted_grade']
+    with span('numpy'):
+        # Predict final grade
+        if model == 'auto':
+            prediction = select_model_predict(final_grades, periods_ahead)
+        else:
+            prediction = linear_regression_predict(final_grades, periods_ahead)
+        
+        # Also predict individual components
+        component_predictions = {}
+        if len(midterm_grades) >= 2:
+            component_predictions['midterm'] = linear_regression_predict(midterm_grades, periods_ahead)['predicted_grade']
+        if len(finals_grades) >= 2:
+            component_predictions['finals'] = linear_regression_predict(finals_grades, periods_ahead)['predicted_grade']
+        if len(quiz_grades) >= 2:
+            component_predictions['quizzes'] = linear_regression_predict(quiz_grades, periods_ahead)['predicted_grade']
+        if len(project_grades) >= 2:
+            component_predictions['projects'] = linear_regression_predict(project_grades, periods_ahead)['predicted_grade']
     
     prediction['student_id'] = student_id
     prediction['subject'] = subject
@@ -180,42 +269,469 @@ def predict_student_grade(student_id: str, subject: str, periods_ahead: int = 1)
     return prediction
 
 
-def predict_all_students_grades(subject: str = None) -> List[Dict]:
+def predict_all_students_grades(subject: str = None, model: str = 'linear') -> List[Dict]:
     """
     Predict next grades for all students
     
+    Every (student, subject) history is fetched in one query and fitted in
+    one vectorized pass. Histories with fewer than 2 grades are skipped.
+    
     Args:
         subject: Optional subject filter
+        model: 'linear', or 'auto' to choose linear/quadratic/cubic per
+               history by leave-one-out error
     
     Returns:
-        List of prediction results for each student
+        List of prediction results for each student and subject
     """
-    from database import StudentDB
-    
-    students = StudentDB.query.all()
+    from database import db, StudentDB
+    
+    histories = fetch_grade_histories(subject=subject)
+    lengths = histories['lengths']
+    with span('numpy'):
+        fit = fit_linear_segments(histories['values'], histories['segment'],
+                                  histories['position'], lengths)
+        predicted, r_squared, intervals = fit['predicted_grade'], fit['r_squared'], fit['intervals']
+        if model == 'auto':
+            selected = select_models_segments(histories['values'], histories['segment'],
+                                              histories['position'], lengths)
+            predicted, r_squared, intervals = (selected['predicted_grade'], selected['r_squared'],
+                                               selected['intervals'])
+        trends = trend_labels(fit['slope'])
+    
+    with span('db'):
+        names = dict(db.session.query(StudentDB.student_id, StudentDB.name).all())
     predictions = []
+    for i in np.flatnonzero(lengths >= 2).tolist():
+        student_id = histories['student_ids'][i]
+        if student_id not in names:
+            continue
+        entry = {
+            'student_name': names[student_id],
+            'student_id': student_id,
+            'subject': histories['subjects'][i],
+            'predicted_grade': round(float(predicted[i]), 2),
+            'trend': str(trends[i]),
+            'confidence': _confidence_label(r_squared[i]),
+            'slope_standard_error': _rounded_or_none(fit['slope_se'][i]),
+            'prediction_intervals': format_intervals(intervals, i)
+        }
+        if model == 'auto':
+            degree = int(selected['degree'][i])
+            entry['model'] = MODEL_NAMES[degree]
+            entry['loo_rmse'] = _rounded_or_none(selected['loo_rmse'][i])
+        predictions.append(entry)
+    
+    return predictions
+
+
+def fetch_grade_histories(subject: str = None, course: str = None) -> Dict[str, np.ndarray]:
+    """
+    Every (student, subject) final-grade history in one query, as flat
+    chronological segments
     
-    for student in students:
-        # Get subjects for this student
-        if subject:
-            subjects = [subject]
+    Returns:
+        Dictionary with 'values', 'segment' (segment index per grade),
+        'position' (0-based period within its segment), 'lengths', and the
+        'student_ids' / 'subjects' of each segment
+    """
+    from analytics import fetch_final_grades
+    
+    values, (student_ids, subjects) = fetch_final_grades(
+        [GradeDB.student_id, GradeDB.subject], course=course, subject=subject,
+        order_by=[GradeDB.student_id, GradeDB.subject, GradeDB.created_at, GradeDB.id]
+    )
+    with span('numpy'):
+        if len(values) == 0:
+            starts = np.empty(0, dtype=np.int64)
         else:
-            grade_records = GradeDB.query.filter_by(student_id=student.student_id).all()
-            subjects = list(set(g.subject for g in grade_records))
+            starts = np.flatnonzero(np.r_[True, (student_ids[1:] != student_ids[:-1]) |
+                                          (subjects[1:] != subjects[:-1])])
+        lengths = np.diff(np.r_[starts, len(values)]).astype(np.int64)
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        position = np.arange(len(values)) - np.repeat(starts, lengths)
+    
+    return {
+        'values': values,
+        'segment': segment,
+        'position': position,
+        'lengths': lengths,
+        'student_ids': student_ids[starts],
+        'subjects': subjects[starts]
+    }
+
+
+def trend_labels(slopes: np.ndarray) -> np.ndarray:
+    """Vectorized trend labels matching linear_regression_predict"""
+    return np.where(slopes > 0.5, 'improving', np.where(slopes < -0.5, 'declining', 'stable'))
+
+
+def fit_linear_segments(values: np.ndarray, segment: np.ndarray, position: np.ndarray,
+                        lengths: np.ndarray, periods_ahead: int = 1) -> Dict[str, np.ndarray]:
+    """
+    Least-squares line through every segment at once
+    
+    Same model as linear_regression_predict (x = 0, 1, 2, ... per segment),
+    computed from per-segment sums with bincount instead of one polyfit per
+    series. Segments with a single grade get slope 0 and predict that grade.
+    
+    Args:
+        values: Flat grade values
+        segment: Segment index of each value
+        position: Period of each value within its segment
+        lengths: Number of values in each segment
+        periods_ahead: Number of periods to predict ahead
+    
+    Returns:
+        Dictionary of per-segment arrays: slope, intercept, predicted_grade,
+        r_squared, ss_res (residual sum of squares), slope_se (NaN below 3
+        grades), and 'intervals' (see prediction_intervals)
+    """
+    n = lengths.astype(float)
+    count = len(lengths)
+    safe_n = np.maximum(n, 1)
+    mean_x = (n - 1) / 2
+    mean_y = np.bincount(segment, weights=values, minlength=count) / safe_n
+    
+    dx = position - mean_x[segment]
+    dy = values - mean_y[segment]
+    sxx = n * (n * n - 1) / 12  # sum of squared deviations of 0..n-1
+    sxy = np.bincount(segment, weights=dx * dy, minlength=count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+    intercept = mean_y - slope * mean_x
+    
+    residuals = dy - slope[segment] * dx
+    ss_res = np.bincount(segment, weights=residuals * residuals, minlength=count)
+    ss_tot = np.bincount(segment, weights=dy * dy, minlength=count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_squared = np.where(ss_tot > 1e-12, 1 - ss_res / ss_tot, 0.0)
+    
+    next_period = n + periods_ahead - 1
+    raw_prediction = slope * next_period + intercept
+    slope_se, forecast_se, df = linear_forecast_errors(n, ss_res, periods_ahead)
+    
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'predicted_grade': np.clip(raw_prediction, 0, 100),
+        'r_squared': r_squared,
+        'ss_res': ss_res,
+        'slope_se': slope_se,
+        'intervals': prediction_intervals(raw_prediction, forecast_se, df)
+    }
+
+
+# Candidate polynomial degrees for model selection and their names
+MODEL_DEGREES = (1, 2, 3)
+MODEL_NAMES = {1: 'linear', 2: 'quadratic', 3: 'cubic'}
+PREDICTION_MODELS = ('linear', 'auto')
+
+
+def fit_polynomial_segments(values: np.ndarray, segment: np.ndarray, position: np.ndarray,
+                            lengths: np.ndarray, degree: int, periods_ahead: int = 1) -> Dict[str, np.ndarray]:
+    """
+    Polynomial least squares through every segment at once, with
+    leave-one-out error from the hat matrix
+    
+    Per segment, x is rescaled to [-1, 1] and the (degree+1)^2 normal
+    equations are built from power sums (bincount) and inverted as one
+    batch. The leave-one-out residual of each point is e_i / (1 - h_ii),
+    where h_ii is its leverage x_i^T (X^T X)^-1 x_i, so no refitting is needed.
+    
+    Args:
+        values, segment, position, lengths: Flat segments (see fit_linear_segments)
+        degree: Polynomial degree
+        periods_ahead: Number of periods to predict ahead
+    
+    Returns:
+        Dictionary of per-segment arrays: predicted_grade, r_squared,
+        loo_mse (NaN for segments with fewer than degree + 2 grades) and
+        'intervals' (see prediction_intervals)
+    """
+    count = len(lengths)
+    n = lengths.astype(float)
+    center = (n - 1) / 2
+    scale = np.maximum(center, 1)
+    u = (position - center[segment]) / scale[segment]
+    
+    terms = degree + 1
+    powers = u[:, None] ** np.arange(2 * degree + 1)
+    moments = np.stack([np.bincount(segment, weights=powers[:, k], minlength=count)
+                        for k in range(2 * degree + 1)], axis=1)
+    rhs = np.stack([np.bincount(segment, weights=powers[:, k] * values, minlength=count)
+                    for k in range(terms)], axis=1)
+    index = np.arange(terms)
+    gram = moments[:, index[:, None] + index[None, :]]
+    
+    # Segments too short for this degree get an identity system and are masked out
+    fittable = lengths >= terms
+    gram[~fittable] = np.eye(terms)
+    inverse = np.linalg.inv(gram)
+    coefficients = np.einsum('sij,sj->si', inverse, rhs)
+    
+    design = powers[:, :terms]
+    fitted = np.einsum('ni,ni->n', design, coefficients[segment])
+    residuals = values - fitted
+    leverage = np.zeros(len(values))
+    for i in range(terms):
+        for j in range(terms):
+            leverage += design[:, i] * design[:, j] * inverse[segment, i, j]
+    
+    has_loo = lengths >= terms + 1
+    point_has_loo = has_loo[segment]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        loo_residuals = np.where(point_has_loo, residuals / (1 - leverage), 0.0)
+        press = np.bincount(segment, weights=loo_residuals * loo_residuals, minlength=count)
+        loo_mse = np.where(has_loo, press / n, np.nan)
         
-        for subj in subjects:
-            prediction = predict_student_grade(student.student_id, subj)
-            if 'error' not in prediction:
-                predictions.append({
-                    'student_name': student.name,
-                    'student_id': student.student_id,
-                    'subject': subj,
-                    'predicted_grade': prediction['predicted_grade'],
-                    'trend': prediction['trend'],
-                    'confidence': prediction['confidence']
-                })
+        mean_y = np.bincount(segment, weights=values, minlength=count) / np.maximum(n, 1)
+        deviations = values - mean_y[segment]
+        ss_res = np.bincount(segment, weights=residuals * residuals, minlength=count)
+        ss_tot = np.bincount(segment, weights=deviations * deviations, minlength=count)
+        r_squared = np.where(ss_tot > 1e-12, 1 - ss_res / ss_tot, 0.0)
+    
+    u_next = (n + periods_ahead - 1 - center) / scale
+    next_powers = u_next[:, None] ** index
+    predicted = (coefficients * next_powers).sum(axis=1)
+    
+    # Forecast variance s^2 (1 + v^T (X^T X)^-1 v) with s^2 = ss_res / (n - terms)
+    df = n - terms
+    next_leverage = np.einsum('si,sij,sj->s', next_powers, inverse, next_powers)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forecast_se = np.sqrt(np.where(df > 0, ss_res / df, np.nan) * (1 + next_leverage))
     
-    return predictions
+    return {
+        'predicted_grade': np.where(fittable, np.clip(predicted, 0, 100), np.nan),
+        'r_squared': np.where(fittable, r_squared, np.nan),
+        'loo_mse': loo_mse,
+        'intervals': prediction_intervals(predicted, forecast_se, df)
+    }
+
+
+def select_models_segments(values: np.ndarray, segment: np.ndarray, position: np.ndarray,
+                           lengths: np.ndarray, periods_ahead: int = 1,
+                           degrees=MODEL_DEGREES) -> Dict[str, np.ndarray]:
+    """
+    Choose, per segment, the candidate degree with the lowest leave-one-out
+    error (the lower degree wins ties). Segments too short for any
+    leave-one-out estimate fall back to the linear fit.
+    
+    Returns:
+        Dictionary of per-segment arrays: degree, predicted_grade, r_squared,
+        intervals, loo_rmse (NaN when undefined) and loo_rmse_by_degree
+        (segments x degrees)
+    """
+    fits = [fit_polynomial_segments(values, segment, position, lengths, degree, periods_ahead)
+            for degree in degrees]
+    errors = np.stack([fit['loo_mse'] for fit in fits], axis=1)
+    
+    # nanargmin fails on all-NaN rows, so rank undefined errors last
+    choice = np.argmin(np.where(np.isnan(errors), np.inf, errors), axis=1)
+    rows = np.arange(len(lengths))
+    predicted = np.stack([fit['predicted_grade'] for fit in fits], axis=1)[rows, choice]
+    r_squared = np.stack([fit['r_squared'] for fit in fits], axis=1)[rows, choice]
+    intervals = {
+        level: tuple(np.stack([fit['intervals'][level][side] for fit in fits], axis=1)[rows, choice]
+                     for side in (0, 1))
+        for level in INTERVAL_LEVELS
+    }
+    
+    return {
+        'degree': np.asarray(degrees)[choice],
+        'predicted_grade': predicted,
+        'r_squared': r_squared,
+        'intervals': intervals,
+        'loo_rmse': np.sqrt(errors[rows, choice]),
+        'loo_rmse_by_degree': np.sqrt(errors)
+    }
+
+
+def _confidence_label(r_squared: float) -> str:
+    return 'high' if r_squared > 0.7 else 'medium' if r_squared > 0.4 else 'low'
+
+
+def _rounded_or_none(value: float, digits: int = 4) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def select_model_predict(grades: List[float], periods_ahead: int = 1) -> Dict:
+    """
+    Predict with the best of the linear, quadratic and cubic fits by
+    leave-one-out error. Trend and slope still come from the linear fit.
+    
+    Args:
+        grades: List of past grades (chronological order)
+        periods_ahead: Number of periods to predict ahead
+    
+    Returns:
+        linear_regression_predict's dictionary, with predicted_grade,
+        r_squared, confidence and prediction_intervals taken from the
+        chosen model, plus 'model',
+        'degree', 'loo_rmse' and 'model_errors'
+    """
+    prediction = linear_regression_predict(grades, periods_ahead)
+    if prediction.get('predicted_grade') is None:
+        return prediction
+    
+    values = np.asarray(grades, dtype=float)
+    zeros = np.zeros(len(values), dtype=np.int64)
+    selected = select_models_segments(values, zeros, np.arange(len(values)),
+                                      np.array([len(values)]), periods_ahead)
+    degree = int(selected['degree'][0])
+    r_squared = float(selected['r_squared'][0])
+    
+    prediction.update({
+        'predicted_grade': round(float(selected['predicted_grade'][0]), 2),
+        'r_squared': round(r_squared, 4),
+        'confidence': _confidence_label(r_squared),
+        'prediction_intervals': format_intervals(selected['intervals']),
+        'model': MODEL_NAMES[degree],
+        'degree': degree,
+        'loo_rmse': _rounded_or_none(selected['loo_rmse'][0]),
+        'model_errors': {MODEL_NAMES[d]: _rounded_or_none(error)
+                         for d, error in zip(MODEL_DEGREES, selected['loo_rmse_by_degree'][0])}
+    })
+    return prediction
+
+
+# Series per padded block in batch_linear_predict (series are sorted by
+# length first, so each block is padded only to its own longest series)
+BATCH_BLOCK_SIZE = 8192
+
+
+def fit_linear_padded(grades: np.ndarray, mask: np.ndarray, periods_ahead: int = 1) -> Dict[str, np.ndarray]:
+    """
+    Least-squares line through every row of a padded 2-D array at once
+    
+    Same model as linear_regression_predict; padding cells (mask False)
+    are ignored. Rows need at least 2 grades.
+    
+    Args:
+        grades: (series x width) array, each row left-aligned
+        mask: Boolean array marking the real grades
+        periods_ahead: Number of periods to predict ahead
+    
+    Returns:
+        Dictionary of per-row arrays as in fit_linear_segments
+    """
+    n = mask.sum(axis=1).astype(float)
+    x = np.arange(grades.shape[1], dtype=float)
+    mean_x = (n - 1) / 2
+    mean_y = np.where(mask, grades, 0).sum(axis=1) / n
+    
+    dx = np.where(mask, x - mean_x[:, None], 0)
+    dy = np.where(mask, grades - mean_y[:, None], 0)
+    sxx = n * (n * n - 1) / 12
+    slope = (dx * dy).sum(axis=1) / sxx
+    intercept = mean_y - slope * mean_x
+    
+    residuals = dy - slope[:, None] * dx
+    ss_res = (residuals * residuals).sum(axis=1)
+    ss_tot = (dy * dy).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_squared = np.where(ss_tot > 1e-12, 1 - ss_res / ss_tot, 0.0)
+    
+    raw_prediction = slope * (n + periods_ahead - 1) + intercept
+    slope_se, forecast_se, df = linear_forecast_errors(n, ss_res, periods_ahead)
+    
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'predicted_grade': np.clip(raw_prediction, 0, 100),
+        'r_squared': r_squared,
+        'ss_res': ss_res,
+        'slope_se': slope_se,
+        'intervals': prediction_intervals(raw_prediction, forecast_se, df)
+    }
+
+
+def batch_linear_predict(series: List[List[float]], periods_ahead: int = 1) -> List[Dict]:
+    """
+    Linear predictions for many grade series, returned in input order
+    
+    Series are sorted by length and cut into blocks; each block is padded
+    into a masked 2-D array and fitted with fit_linear_padded. Results carry
+    the same fields as linear_regression_predict except past_grades.
+    
+    Args:
+        series: List of grade lists (chronological order, varying length)
+        periods_ahead: Number of periods to predict ahead
+    
+    Returns:
+        List of prediction dictionaries, one per input series
+    
+    Raises:
+        ValueError: If a series is not a list of numbers
+    """
+    if any(not isinstance(grades, (list, tuple)) for grades in series):
+        raise ValueError('Each series must be a list of grades')
+    lengths = np.fromiter(map(len, series), dtype=np.int64, count=len(series))
+    # np.fromiter would turn None and strings such as "nan" into NaN, and
+    # booleans into 0/1, so check the types first (bool is not an int here)
+    if not all(type(grade) in (int, float) for grades in series for grade in grades):
+        raise ValueError('Grades must be numbers')
+    values = np.fromiter(itertools.chain.from_iterable(series), dtype=float, count=int(lengths.sum()))
+    if not np.isfinite(values).all():
+        raise ValueError('Grades must be finite numbers')
+    
+    count = len(series)
+    columns = {name: np.full(count, np.nan) for name in
+               ('slope', 'intercept', 'predicted_grade', 'r_squared', 'slope_se')}
+    bounds = {level: (np.full(count, np.nan), np.full(count, np.nan)) for level in INTERVAL_LEVELS}
+    
+    starts = np.cumsum(lengths) - lengths
+    fittable = np.flatnonzero(lengths >= 2)
+    order = fittable[np.argsort(lengths[fittable], kind='stable')]
+    for block_start in range(0, len(order), BATCH_BLOCK_SIZE):
+        rows = order[block_start:block_start + BATCH_BLOCK_SIZE]
+        block_lengths = lengths[rows]
+        width = int(block_lengths[-1])
+        mask = np.arange(width) < block_lengths[:, None]
+        offsets = np.minimum(starts[rows][:, None] + np.arange(width), max(len(values) - 1, 0))
+        grades = np.where(mask, values[offsets], 0.0)
+        
+        fit = fit_linear_padded(grades, mask, periods_ahead)
+        for name, column in columns.items():
+            column[rows] = fit[name]
+        for level, (lower, upper) in fit['intervals'].items():
+            bounds[level][0][rows] = lower
+            bounds[level][1][rows] = upper
+    
+    # Round in NumPy and build plain lists: per-series Python work is the
+    # bottleneck at this point, so keep the loop to dict construction
+    predicted = np.round(columns['predicted_grade'], 2).tolist()
+    slopes = np.round(columns['slope'], 4).tolist()
+    intercepts = np.round(columns['intercept'], 2).tolist()
+    r_squared = np.round(columns['r_squared'], 4).tolist()
+    confidence = np.where(columns['r_squared'] > 0.7, 'high',
+                          np.where(columns['r_squared'] > 0.4, 'medium', 'low')).tolist()
+    slope_se = np.round(columns['slope_se'], 4).tolist()
+    trends = trend_labels(columns['slope']).tolist()
+    has_interval = ~np.isnan(columns['slope_se'])
+    low_80, high_80 = (np.round(side, 2).tolist() for side in bounds[80])
+    low_95, high_95 = (np.round(side, 2).tolist() for side in bounds[95])
+    
+    results = []
+    for i in range(count):
+        if lengths[i] < 2:
+            results.append({'error': 'Need at least 2 grades for prediction', 'predicted_grade': None})
+            continue
+        intervals = None
+        if has_interval[i]:
+            intervals = {'80': [low_80[i], high_80[i]], '95': [low_95[i], high_95[i]]}
+        results.append({
+            'predicted_grade': predicted[i],
+            'slope': slopes[i],
+            'intercept': intercepts[i],
+            'r_squared': r_squared[i],
+            'trend': trends[i],
+            'confidence': confidence[i],
+            'slope_standard_error': slope_se[i] if intervals else None,
+            'prediction_intervals': intervals,
+            'periods_predicted': periods_ahead
+        })
+    return results
 
 
 def batch_predict(student_grades_map: Dict[str, List[float]]) -> Dict[str, Dict]:
@@ -228,10 +744,12 @@ def batch_predict(student_grades_map: Dict[str, List[float]]) -> Dict[str, Dict]
     Returns:
         Dictionary mapping student IDs to their predictions
     """
+    series = [list(grades) for grades in student_grades_map.values()]
     results = {}
-    
-    for student_id, grades in student_grades_map.items():
-        results[student_id] = linear_regression_predict(grades)
+    for student_id, grades, prediction in zip(student_grades_map, series, batch_linear_predict(series)):
+        if prediction['predicted_grade'] is not None:
+            prediction['past_grades'] = grades
+        results[student_id] = prediction
     
     return results
 
@@ -249,9 +767,11 @@ def calculate_prediction_accuracy(actual_grades: List[float], predicted_grades:
     """
     if len(actual_grades) != len(predicted_grades):
         return {'error': 'Grade lists must be same length'}
+    if len(actual_grades) == 0:
+        return {'error': 'No grades to compare'}
     
-    actual = np.array(actual_grades)
-    predicted = np.array(predicted_grades)
+    actual = np.array(actual_grades, dtype=float)
+    predicted = np.array(predicted_grades, dtype=float)
     
     # Mean Absolute Error
     mae = np.mean(np.abs(actual - predicted))
@@ -262,12 +782,17 @@ def calculate_prediction_accuracy(actual_grades: List[float], predicted_grades:
     # Root Mean Squared Error
     rmse = np.sqrt(mse)
     
-    # Mean Absolute Percentage Error
-    mape = np.mean(np.abs((actual - predicted) / actual)) * 100
+    # Mean Absolute Percentage Error (undefined where the actual grade is 0,
+    # so those grades are left out; None if every actual grade is 0)
+    nonzero = actual != 0
+    mape = None
+    if nonzero.any():
+        mape = np.mean(np.abs((actual[nonzero] - predicted[nonzero]) / actual[nonzero])) * 100
     
     return {
         'mean_absolute_error': round(float(mae), 2),
         'mean_squared_error': round(float(mse), 2),
         'root_mean_squared_error': round(float(rmse), 2),
-        'mean_absolute_percentage_error': round(float(mape), 2)
+        'mean_absolute_percentage_error': round(float(mape), 2) if mape is not None else None,
+        'mape_excluded_zero_actuals': int((~nonzero).sum())
     }
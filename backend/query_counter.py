@@ -0,0 +1,186 @@
+"""
+Query Counter
+Counts the SQL statements each request executes and the time spent in the
+database, from SQLAlchemy cursor events, and flags likely N+1 patterns:
+the same statement shape (SQL with the parameters left out) executed
+QUERY_REPEAT_THRESHOLD times or more in one request is logged as a warning
+with the route.
+
+Outside production the counts are also returned as response headers:
+
+    X-Query-Count      statements executed
+    X-Query-Time-Ms    time spent executing them
+    X-Query-Repeats    executions of the most repeated statement shape
+
+query_budget() / assert_query_budget() let tests and scripts fail when a
+route needs more statements than it should (see test_api.py).
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from flask import g, request, current_app
+from sqlalchemy import event
+
+
+# Expanded IN lists and multi-row VALUES vary in length, not in shape
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+# Collectors that statements are currently counted into (request, budgets)
+_active: ContextVar[Tuple['QueryStats', ...]] = ContextVar('query_stats', default=())
+
+
+def _abbreviate(text: str, limit: int = 300) -> str:
+    """Keep both ends of long SQL (the column list is rarely the interesting part)"""
+    if len(text) <= limit:
+        return text
+    half = (limit - 5) // 2
+    return f'{text[:half]} ... {text[-half:]}'
+
+
+def statement_shape(statement: str) -> str:
+    """SQL text with placeholder lists collapsed, for grouping repeated statements"""
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class QueryStats:
+    """Statements executed while this collector was active"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    @property
+    def milliseconds(self) -> float:
+        return round(self.seconds * 1000, 2)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least threshold times, most repeated first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def max_repeats(self) -> int:
+        return self.shapes.most_common(1)[0][1] if self.shapes else 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get():
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _active.get()
+    started = conn.info.get('query_started')
+    if not collectors or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    for stats in collectors:
+        stats.record(statement, elapsed)
+
+
+@contextmanager
+def count_queries():
+    """Count the statements executed in this block (nests with request counting)"""
+    stats = QueryStats()
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block or response used more SQL statements than its budget"""
+
+
+@contextmanager
+def query_budget(budget: int, label: str = 'block'):
+    """Fail with QueryBudgetExceeded if the block executes more than budget statements"""
+    with count_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        shape, repeats = (stats.shapes.most_common(1) or [('', 0)])[0]
+        raise QueryBudgetExceeded(
+            f"{label}: {stats.count} queries, budget {budget} "
+            f"(most repeated, {repeats}x: {_abbreviate(shape)})"
+        )
+
+
+def assert_query_budget(response, budget: int, label: Optional[str] = None) -> int:
+    """
+    Check a response's X-Query-Count header against a budget (works with a
+    test client or a live non-production server)
+
+    Returns:
+        The query count
+    """
+    value = response.headers.get('X-Query-Count')
+    if value is None:
+        raise QueryBudgetExceeded(f"{label or 'response'}: no X-Query-Count header (QUERY_STATS_HEADERS off?)")
+    if int(value) > budget:
+        raise QueryBudgetExceeded(f"{label or 'response'}: {value} queries, budget {budget}")
+    return int(value)
+
+
+class QueryCounter:
+    """Per-request statement counting, N+1 warnings and response headers"""
+
+    def __init__(self):
+        self.repeat_threshold = 10
+        self.headers = False
+        self._engines = set()
+
+    def init_app(self, app):
+        self.repeat_threshold = app.config.get('QUERY_REPEAT_THRESHOLD', 10)
+        self.headers = app.config.get('QUERY_STATS_HEADERS', False)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def instrument(self, engine):
+        """Listen to an engine's cursor events (idempotent)"""
+        engine = getattr(engine, 'sync_engine', engine)
+        if id(engine) in self._engines:
+            return
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        self._engines.add(id(engine))
+
+    # ---------- request hooks ----------
+
+    def _before_request(self):
+        g.query_stats = QueryStats()
+        g.query_stats_token = _active.set(_active.get() + (g.query_stats,))
+
+    def _after_request(self, response):
+        stats: QueryStats = g.get('query_stats')
+        if stats is None:
+            return response
+        if self.repeat_threshold:
+            route = request.url_rule.rule if request.url_rule else request.path
+            for shape, n in stats.repeated(self.repeat_threshold):
+                current_app.logger.warning("Possible N+1 on %s %s: %d executions of %s",
+                                           request.method, route, n, _abbreviate(shape))
+        if self.headers:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-Query-Time-Ms'] = str(stats.milliseconds)
+            response.headers['X-Query-Repeats'] = str(stats.max_repeats())
+        return response
+
+    def _teardown_request(self, exc=None):
+        token = g.pop('query_stats_token', None)
+        if token is not None:
+            _active.reset(token)
+
+
+# Shared counter; app.py calls init_app and instruments each engine
+query_counter = QueryCounter()
@@ -0,0 +1,232 @@
+"""
+List Query Filters
+Compiles whitelisted query-string filters and sorts into SQL WHERE/ORDER BY
+clauses for the list endpoints (students, grades, attendance)
+"""
+
+from datetime import datetime
+from typing import Dict, List, Tuple
+from flask import current_app
+from sqlalchemy import func
+from database import db, StudentDB, GradeDB, AttendanceDB
+
+
+# Unindexed sorts are refused once a table grows past this many rows
+DEFAULT_MAX_UNINDEXED_SORT_ROWS = 10000
+
+# Parameters understood by every list endpoint
+PAGINATION_PARAMS = ('limit', 'offset', 'sort')
+
+
+class FilterError(ValueError):
+    """Raised when a list query uses an unknown sort or an invalid value"""
+
+
+def _as_float(value: str, name: str) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise FilterError(f"Parameter '{name}' must be a number")
+
+
+def _as_date(value: str, name: str) -> str:
+    """Normalize a YYYY-MM-DD date; stored dates are ISO strings, so they compare in date order"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+    except (TypeError, ValueError):
+        raise FilterError(f"Parameter '{name}' must be a date (YYYY-MM-DD)")
+
+
+def _as_int(value: str, name: str) -> int:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise FilterError(f"Parameter '{name}' must be an integer")
+    if number < 0:
+        raise FilterError(f"Parameter '{name}' must not be negative")
+    return number
+
+
+# Filter specs: query parameter -> (column, operator, value type, relationship to join)
+# Sort specs: API field name -> (column, indexed)
+LIST_SPECS = {
+    'students': {
+        'model': StudentDB,
+        'filters': {
+            'course': (StudentDB.course, 'eq', str, None),
+            'studentType': (StudentDB.student_type, 'eq', str, None),
+        },
+        'sorts': {
+            'id': (StudentDB.student_id, True),
+            'email': (StudentDB.email, True),
+            'course': (StudentDB.course, True),
+            'name': (StudentDB.name, False),
+            'age': (StudentDB.age, False),
+            'enrollmentDate': (StudentDB.enrollment_date, False),
+        },
+        'default_sort': [StudentDB.student_id],
+    },
+    'grades': {
+        'model': GradeDB,
+        'filters': {
+            'studentId': (GradeDB.student_id, 'eq', str, None),
+            'subject': (GradeDB.subject, 'eq', str, None),
+            'course': (StudentDB.course, 'eq', str, 'student'),
+            'min_final': (GradeDB.final_grade, 'ge', float, None),
+            'max_final': (GradeDB.final_grade, 'le', float, None),
+        },
+        'sorts': {
+            'id': (GradeDB.id, True),
+            'studentId': (GradeDB.student_id, True),
+            'subject': (GradeDB.subject, True),
+            'finalGrade': (GradeDB.final_grade, True),
+            'midterm': (GradeDB.midterm, False),
+            'finals': (GradeDB.finals, False),
+            'quizzes': (GradeDB.quizzes, False),
+            'projects': (GradeDB.projects, False),
+        },
+        'default_sort': [GradeDB.id],
+    },
+    'attendance': {
+        'model': AttendanceDB,
+        'filters': {
+            'studentId': (AttendanceDB.student_id, 'eq', str, None),
+            'status': (AttendanceDB.status, 'eq', str, None),
+            'course': (StudentDB.course, 'eq', str, 'student'),
+            'date_from': (AttendanceDB.date, 'ge', 'date', None),
+            'date_to': (AttendanceDB.date, 'le', 'date', None),
+        },
+        'sorts': {
+            'id': (AttendanceDB.id, True),
+            'studentId': (AttendanceDB.student_id, True),
+            'date': (AttendanceDB.date, True),
+            'status': (AttendanceDB.status, True),
+        },
+        'default_sort': [AttendanceDB.id],
+    },
+}
+
+
+def parse_sort(spec: Dict, sort_param: str) -> List[Tuple]:
+    """
+    Parse a sort parameter such as "-finalGrade,studentId"
+
+    Returns:
+        List of (column, descending, indexed) tuples
+    """
+    order = []
+    for field in sort_param.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        descending = field.startswith('-')
+        name = field.lstrip('+-')
+        if name not in spec['sorts']:
+            allowed = ', '.join(sorted(spec['sorts']))
+            raise FilterError(f"Cannot sort by '{name}'. Allowed: {allowed}")
+        column, indexed = spec['sorts'][name]
+        order.append((column, descending, indexed))
+    return order
+
+
+def unindexed_sort_columns(order: List[Tuple]) -> List[str]:
+    """Names of the unindexed columns in a parsed sort"""
+    return [column.key for column, _, indexed in order if not indexed]
+
+
+def check_unindexed_sort(names: List[str], row_count: int, limit: int = DEFAULT_MAX_UNINDEXED_SORT_ROWS):
+    """Refuse sorts on unindexed columns once the table is large"""
+    if names and row_count > limit:
+        raise FilterError(
+            f"Sorting by unindexed column(s) {', '.join(names)} is not allowed "
+            f"on tables with more than {limit} rows"
+        )
+
+
+def build_list_query(entity: str, args, query):
+    """
+    Apply whitelisted filters, sort and pagination to a base query. Unknown
+    parameters (e.g. cache busters such as "_") are ignored.
+
+    Works on a legacy Query (Model.query) as well as on select(Model), so the
+    async list endpoints share the same rules.
+
+    Args:
+        entity: One of 'students', 'grades' or 'attendance'
+        args: Request query arguments (werkzeug MultiDict or plain dict)
+        query: Base query over the entity's model
+
+    Returns:
+        (query, names of unindexed sort columns). The caller must pass those
+        to check_unindexed_sort with the table's row count.
+
+    Raises:
+        FilterError: If a sort field is unknown or a parameter has an invalid value
+    """
+    spec = LIST_SPECS[entity]
+    joined = set()
+
+    for name, value in args.items():
+        if name in PAGINATION_PARAMS:
+            continue
+        if name not in spec['filters']:
+            current_app.logger.debug("Ignoring unknown %s list parameter '%s'", entity, name)
+            continue
+
+        column, op, value_type, relationship = spec['filters'][name]
+        if relationship is not None and relationship not in joined:
+            query = query.join(getattr(spec['model'], relationship))
+            joined.add(relationship)
+
+        if value_type is float:
+            value = _as_float(value, name)
+        elif value_type == 'date':
+            value = _as_date(value, name)
+
+        if op == 'eq':
+            query = query.filter(column == value)
+        elif op == 'ge':
+            query = query.filter(column >= value)
+        elif op == 'le':
+            query = query.filter(column <= value)
+
+    unindexed = []
+    sort_param = args.get('sort')
+    if sort_param:
+        order = parse_sort(spec, sort_param)
+        unindexed = unindexed_sort_columns(order)
+        query = query.order_by(*[column.desc() if descending else column.asc()
+                                 for column, descending, _ in order])
+    else:
+        query = query.order_by(*spec['default_sort'])
+
+    if args.get('offset'):
+        query = query.offset(_as_int(args['offset'], 'offset'))
+    if args.get('limit'):
+        query = query.limit(_as_int(args['limit'], 'limit'))
+
+    return query, unindexed
+
+
+def apply_list_query(entity: str, args):
+    """
+    Build a filtered, sorted and paginated query for a list endpoint
+
+    Args:
+        entity: One of 'students', 'grades' or 'attendance'
+        args: Request query arguments (werkzeug MultiDict or plain dict)
+
+    Returns:
+        SQLAlchemy query ready to be executed
+
+    Raises:
+        FilterError: If a sort field is unknown or a parameter has an invalid value
+    """
+    model = LIST_SPECS[entity]['model']
+    query, unindexed = build_list_query(entity, args, model.query)
+    if unindexed:
+        row_count = db.session.query(func.count()).select_from(model).scalar()
+        check_unindexed_sort(unindexed, row_count,
+                             current_app.config.get('LIST_MAX_UNINDEXED_SORT_ROWS',
+                                                    DEFAULT_MAX_UNINDEXED_SORT_ROWS))
+    return query
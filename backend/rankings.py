@@ -0,0 +1,292 @@
+"""
+Student Rankings
+Order-statistics index over per-student grade averages for leaderboards and
+percentile ranks, per scope (whole school, course, subject).
+
+Averages are bucketed at 0.01-point resolution into a Fenwick tree of
+counts, so rank and k-th-place lookups are O(log B) (B = 10001 buckets)
+and a grade change moves one student between buckets in O(log B), instead
+of re-sorting every student.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from database import db, StudentDB, GradeDB
+from db_routing import use_primary
+from write_guard import WriteGuard, REBUILD_ATTEMPTS
+
+
+RESOLUTION = 100  # buckets per grade point
+MAX_GRADE = 100
+NUM_BUCKETS = MAX_GRADE * RESOLUTION + 1
+
+RANKING_SCOPES = ('school', 'course', 'subject')
+
+
+def _bucket(average: float) -> int:
+    return int(min(max(round(average * RESOLUTION), 0), NUM_BUCKETS - 1))
+
+
+class OrderStatisticIndex:
+    """Per-student averages for one scope with a Fenwick tree over score buckets"""
+
+    def __init__(self):
+        self.tree = [0] * (NUM_BUCKETS + 1)
+        self.members: Dict[int, List[str]] = {}
+        self.totals: Dict[str, List[float]] = {}  # student -> [sum, count]
+        self.bucket_of: Dict[str, int] = {}
+        self.size = 0
+
+    # ---------- Fenwick tree ----------
+
+    def _add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i <= NUM_BUCKETS:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _count_below(self, bucket: int) -> int:
+        """Number of students in buckets strictly below this one"""
+        total, i = 0, bucket
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _find_by_count(self, k: int) -> int:
+        """Smallest bucket whose cumulative count (from the bottom) reaches k (1-based)"""
+        position, step = 0, 1 << NUM_BUCKETS.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= NUM_BUCKETS and self.tree[nxt] < k:
+                position = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return position  # 0-based bucket
+
+    @classmethod
+    def from_totals(cls, totals: Dict[str, List[float]]) -> 'OrderStatisticIndex':
+        """Build in O(n + B) from precomputed [sum, count] per student"""
+        index = cls()
+        index.totals = totals
+        counts = [0] * NUM_BUCKETS
+        for student_id, (total, count) in sorted(totals.items()):
+            bucket = _bucket(total / count)
+            index.bucket_of[student_id] = bucket
+            index.members.setdefault(bucket, []).append(student_id)
+            counts[bucket] += 1
+        # Linear-time Fenwick construction
+        tree = [0] + counts
+        for i in range(1, NUM_BUCKETS + 1):
+            parent = i + (i & -i)
+            if parent <= NUM_BUCKETS:
+                tree[parent] += tree[i]
+        index.tree = tree
+        index.size = len(totals)
+        return index
+
+    # ---------- updates ----------
+
+    def _place(self, student_id: str, bucket: Optional[int]):
+        old = self.bucket_of.pop(student_id, None)
+        if old is not None:
+            self.members[old].remove(student_id)
+            if not self.members[old]:
+                del self.members[old]
+            self._add(old, -1)
+            self.size -= 1
+        if bucket is not None:
+            self.bucket_of[student_id] = bucket
+            bisect.insort(self.members.setdefault(bucket, []), student_id)
+            self._add(bucket, 1)
+            self.size += 1
+
+    def record(self, student_id: str, grade: float, weight: int = 1):
+        """Add (weight=1) or remove (weight=-1) one grade for a student"""
+        totals = self.totals.setdefault(student_id, [0.0, 0])
+        totals[0] += weight * grade
+        totals[1] += weight
+        if totals[1] <= 0:
+            del self.totals[student_id]
+            self._place(student_id, None)
+        else:
+            self._place(student_id, _bucket(totals[0] / totals[1]))
+
+    # ---------- queries ----------
+
+    def average(self, student_id: str) -> Optional[float]:
+        totals = self.totals.get(student_id)
+        return totals[0] / totals[1] if totals else None
+
+    def _entry(self, student_id: str, bucket: int) -> Dict:
+        below = self._count_below(bucket)
+        equal = len(self.members[bucket])
+        return {
+            'rank': self.size - below - equal + 1,  # 1 + students with a higher average
+            'student_id': student_id,
+            'average': round(self.average(student_id), 2),
+            'percentile': round((below + 0.5 * equal) / self.size * 100, 2)
+        }
+
+    def rank(self, student_id: str) -> Optional[Dict]:
+        bucket = self.bucket_of.get(student_id)
+        if bucket is None:
+            return None
+        entry = self._entry(student_id, bucket)
+        entry['total'] = self.size
+        return entry
+
+    def page(self, offset: int, limit: int) -> List[Dict]:
+        """Students ordered by average (highest first), skipping offset places"""
+        if offset >= self.size or limit <= 0:
+            return []
+        # The (offset+1)-th highest is the (size-offset)-th lowest
+        bucket = self._find_by_count(self.size - offset)
+        skip = offset - (self.size - self._count_below(bucket) - len(self.members[bucket]))
+
+        entries = []
+        while bucket >= 0 and len(entries) < limit:
+            ids = self.members.get(bucket)
+            if ids:
+                for student_id in ids[skip:]:
+                    entries.append(self._entry(student_id, bucket))
+                    if len(entries) == limit:
+                        break
+                skip = 0
+            bucket -= 1
+        return entries
+
+
+class RankingRegistry:
+    """
+    Order-statistic indexes for every scope ('school', 'course:<name>',
+    'subject:<name>'), built lazily from one grade fetch and kept current by
+    the grade routes. Rebuilt after max_age seconds so that writes handled by
+    other worker processes are picked up. Grade writes in this process must
+    commit and record() inside writing().
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, OrderStatisticIndex] = {}
+        self._courses: Dict[str, str] = {}
+        self._built_at: Optional[float] = None
+        self._guard = WriteGuard()
+
+    def rebuild(self):
+        """
+        Rebuild every index from the grades table
+
+        Like SketchRegistry.rebuild, a build whose fetch overlapped a grade
+        write is discarded and retried; if writes keep overlapping, the
+        current indexes stay in place (or, with none, the last build is
+        installed but left stale).
+        """
+        for _ in range(REBUILD_ATTEMPTS):
+            generation = self._guard.idle_generation()
+            indexes, student_courses = self._build()
+            with self._lock:
+                if self._guard.unchanged(generation):
+                    self._indexes = indexes
+                    self._courses = student_courses
+                    self._built_at = time.monotonic()
+                    return
+        with self._lock:
+            if self._built_at is None:
+                self._indexes = indexes
+                self._courses = student_courses
+
+    @staticmethod
+    def _build() -> Tuple[Dict[str, OrderStatisticIndex], Dict[str, str]]:
+        from analytics import fetch_final_grades
+
+        with use_primary():  # grade writes update the indexes in place
+            grades, (student_ids, subjects, courses) = fetch_final_grades(
+                [GradeDB.student_id, GradeDB.subject, StudentDB.course], join_students=True
+            )
+        grouped: Dict[str, Dict[str, List[float]]] = {}
+        student_courses: Dict[str, str] = {}
+        for grade, student_id, subject, course in zip(grades.tolist(), student_ids, subjects, courses):
+            student_courses[student_id] = course
+            for scope in ('school', f'course:{course}', f'subject:{subject}'):
+                totals = grouped.setdefault(scope, {}).setdefault(student_id, [0.0, 0])
+                totals[0] += grade
+                totals[1] += 1
+
+        indexes = {scope: OrderStatisticIndex.from_totals(totals) for scope, totals in grouped.items()}
+        return indexes, student_courses
+
+    def invalidate(self):
+        self._guard.touch()
+        with self._lock:
+            self._built_at = None
+
+    def writing(self):
+        """Context manager around a grade commit and its record() calls"""
+        return self._guard.writing()
+
+    def _ensure_fresh(self):
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > self.max_age:
+            self.rebuild()
+
+    def record(self, final_grade: Optional[float], subject: str, student_id: str,
+               course: Optional[str], weight: int = 1):
+        """Apply a grade insert (weight=1) or removal (weight=-1)"""
+        if final_grade is None:
+            return
+        with self._lock:
+            if self._built_at is None:
+                return
+            if course:
+                self._courses[student_id] = course
+            for scope in ('school', f'course:{course}', f'subject:{subject}'):
+                self._indexes.setdefault(scope, OrderStatisticIndex()).record(student_id, final_grade, weight)
+
+    def leaderboard(self, scope_key: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict]]:
+        """(total students in scope, one page of ranked entries)"""
+        self._ensure_fresh()
+        with self._lock:
+            index = self._indexes.get(scope_key)
+            if index is None:
+                return 0, []
+            return index.size, index.page(offset, limit)
+
+    def student_ranks(self, student_id: str, scope_keys: List[str] = None) -> Dict[str, Dict]:
+        """
+        Rank and percentile of a student per scope. Defaults to the school,
+        the student's course and every subject the student has grades in.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            if scope_keys is None:
+                scope_keys = ['school']
+                if student_id in self._courses:
+                    scope_keys.append(f'course:{self._courses[student_id]}')
+                scope_keys.extend(sorted(key for key, index in self._indexes.items()
+                                         if key.startswith('subject:') and student_id in index.bucket_of))
+            ranks = {}
+            for key in scope_keys:
+                index = self._indexes.get(key)
+                entry = index.rank(student_id) if index else None
+                if entry:
+                    ranks[key] = entry
+            return ranks
+
+
+def scope_key(scope: str, name: str = None) -> str:
+    """Validate a (scope, name) pair from the API and return the registry key"""
+    if scope not in RANKING_SCOPES:
+        raise ValueError(f"scope must be one of {', '.join(RANKING_SCOPES)}")
+    if scope == 'school':
+        return 'school'
+    if not name:
+        raise ValueError(f"name is required for scope '{scope}'")
+    return f'{scope}:{name}'
+
+
+# Shared registry used by the ranking and grade routes
+rankings = RankingRegistry()
@@ -3,16 +3,19 @@ Flask REST API Routes
 All API endpoints for the Student Management System
 """
 
-from flask import Blueprint, request, jsonify
-from database import db, StudentDB, GradeDB, AttendanceDB
+from contextlib import contextmanager
+from flask import Blueprint, Response, request, jsonify, current_app
+from database import db, StudentDB, GradeDB, AttendanceDB, JobDB
 from models import Student, HonorsStudent, ClassList, display_student_info
 from analytics import (
     get_student_analytics, get_class_analytics, 
-    get_grade_distribution, get_subject_analytics
+    get_grade_distribution, get_subject_analytics,
+    get_attendance_trends, get_all_student_analytics,
+    get_all_subject_analytics, get_grade_percentiles
 )
 from predictions import (
     predict_student_grade, predict_all_students_grades,
-    linear_regression_predict
+    linear_regression_predict, batch_linear_predict, PREDICTION_MODELS
 )
 from visualizations import (
     generate_grade_distribution_pie_chart,
@@ -22,23 +25,118 @@ from visualizations import (
     generate_class_performance_chart
 )
 from json_utils import export_to_json, import_from_json, clear_all_data
+from query_filters import apply_list_query, FilterError
+from search_index import student_index
+from sketches import grade_sketches
+from rankings import rankings, scope_key
+from backtest import run_backtest
+from early_warning import score_at_risk_students, DEFAULT_RISK_WEIGHTS, DEFAULT_RISK_PARAMETERS
+import attendance_store
+import pool_metrics
+from server_timing import server_timing
+from db_routing import use_replica
+from jobs import job_queue, JOB_STATUSES
+from analytics_snapshots import snapshot_or_live, invalidate_snapshots, refresh_snapshots
+from events import event_hub, stream_events, parse_last_event_id, TooManySubscribers, EVENT_ENTITIES
 
 # Create Blueprint
 api = Blueprint('api', __name__)
 
 
+def _record_grade(final_grade, subject, student_id, course, weight=1):
+    """Apply a committed grade insert (weight=1) or removal (weight=-1) to in-memory indexes"""
+    grade_sketches.record(final_grade, subject, course, weight)
+    rankings.record(final_grade, subject, student_id, course, weight)
+
+
+@contextmanager
+def _grade_write():
+    """Wrap a grade commit and its _record_grade calls, so index rebuilds can tell they overlapped"""
+    with grade_sketches.writing(), rankings.writing():
+        yield
+
+
+def _invalidate_grade_indexes():
+    """Force grade-derived in-memory indexes to rebuild on next use"""
+    grade_sketches.invalidate()
+    rankings.invalidate()
+
+
+def _async_requested() -> bool:
+    """Whether the client asked to run the request as a background job"""
+    return request.args.get('async', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _job_accepted(job_type: str, params: dict = None):
+    """Queue a background job and return the 202 response pointing at it"""
+    job = job_queue.submit(job_type, params)
+    response = jsonify({
+        'success': True,
+        'job': job_queue.to_dict(job, include_result=False)
+    })
+    response.headers['Location'] = f'{request.script_root}/api/jobs/{job.id}'
+    return response, 202
+
+
+def _snapshot(key: str, live: bool = False):
+    """Stored snapshot for key when fresh (see analytics_snapshots), else live"""
+    live = live or request.args.get('live', 'false').lower() in ('1', 'true', 'yes')
+    return snapshot_or_live(key, current_app.config['SNAPSHOT_MAX_AGE'], live=live)
+
+
+def _after_bulk_change():
+    """Invalidate in-memory indexes and snapshots, queue a snapshot refresh and notify clients"""
+    student_index.invalidate()
+    _invalidate_grade_indexes()
+    invalidate_snapshots(drop=True)
+    job_queue.submit('snapshots')
+    event_hub.publish('data', 'imported')
+
+
+def _exact_requested() -> bool:
+    """Whether the client asked for exact (full-scan) statistics"""
+    return request.args.get('exact', 'false').lower() in ('1', 'true', 'yes')
+
+
 # ============= STUDENT ROUTES =============
 
 @api.route('/students', methods=['GET'])
 def get_students():
-    """Get all students"""
+    """Get all students (supports filtering and sorting, see query_filters)"""
     try:
-        students = StudentDB.query.all()
+        students = apply_list_query('students', request.args).all()
         return jsonify({
             'success': True,
             'students': [student.to_dict() for student in students],
             'count': len(students)
         }), 200
+    except FilterError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/students/search', methods=['GET'])
+def search_students():
+    """Typeahead search over student name, email and ID"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'Query parameter q required'}), 400
+        
+        try:
+            limit = min(int(request.args.get('limit', 10)), 100)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+        fuzzy = request.args.get('fuzzy', 'true').lower() != 'false'
+        
+        results = student_index.search(query, limit=limit, fuzzy=fuzzy)
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'count': len(results)
+        }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -96,6 +194,9 @@ def add_student():
         
         db.session.add(student)
         db.session.commit()
+        student_index.add(student)
+        invalidate_snapshots()
+        event_hub.publish('students', 'created', [student.student_id])
         
         return jsonify({
             'success': True,
@@ -119,6 +220,7 @@ def update_student(student_id):
         data = request.get_json()
         
         # Update fields
+        old_course = student.course
         if 'name' in data:
             student.name = data['name']
         if 'email' in data:
@@ -134,7 +236,13 @@ def update_student(student_id):
         if 'scholarship' in data:
             student.scholarship = data['scholarship']
         
+        course_changed = student.course != old_course
         db.session.commit()
+        student_index.update(student)
+        if course_changed:
+            _invalidate_grade_indexes()
+        invalidate_snapshots()
+        event_hub.publish('students', 'updated', [student_id])
         
         return jsonify({
             'success': True,
@@ -157,6 +265,10 @@ def delete_student(student_id):
         
         db.session.delete(student)
         db.session.commit()
+        student_index.remove(student_id)
+        _invalidate_grade_indexes()
+        invalidate_snapshots()
+        event_hub.publish('students', 'deleted', [student_id])
         
         return jsonify({
             'success': True,
@@ -171,20 +283,17 @@ def delete_student(student_id):
 
 @api.route('/grades', methods=['GET'])
 def get_grades():
-    """Get all grades"""
+    """Get all grades (supports filtering and sorting, see query_filters)"""
     try:
-        student_id = request.args.get('studentId')
-        
-        if student_id:
-            grades = GradeDB.query.filter_by(student_id=student_id).all()
-        else:
-            grades = GradeDB.query.all()
+        grades = apply_list_query('grades', request.args).all()
         
         return jsonify({
             'success': True,
             'grades': [grade.to_dict() for grade in grades],
             'count': len(grades)
         }), 200
+    except FilterError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -219,7 +328,11 @@ def add_grade():
         grade.calculate_final_grade()
         
         db.session.add(grade)
-        db.session.commit()
+        with _grade_write():
+            db.session.commit()
+            _record_grade(grade.final_grade, grade.subject, grade.student_id, student.course)
+        invalidate_snapshots()
+        event_hub.publish('grades', 'created', [grade.id], studentIds=[grade.student_id])
         
         return jsonify({
             'success': True,
@@ -241,6 +354,7 @@ def update_grade(grade_id):
             return jsonify({'success': False, 'error': 'Grade not found'}), 404
         
         data = request.get_json()
+        previous = (grade.final_grade, grade.subject)
         
         # Update fields
         if 'subject' in data:
@@ -257,7 +371,13 @@ def update_grade(grade_id):
         # Recalculate final grade
         grade.calculate_final_grade()
         
-        db.session.commit()
+        course = grade.student.course
+        with _grade_write():
+            db.session.commit()
+            _record_grade(previous[0], previous[1], grade.student_id, course, weight=-1)
+            _record_grade(grade.final_grade, grade.subject, grade.student_id, course)
+        invalidate_snapshots()
+        event_hub.publish('grades', 'updated', [grade_id], studentIds=[grade.student_id])
         
         return jsonify({
             'success': True,
@@ -278,8 +398,13 @@ def delete_grade(grade_id):
         if not grade:
             return jsonify({'success': False, 'error': 'Grade not found'}), 404
         
+        removed = (grade.final_grade, grade.subject, grade.student_id, grade.student.course)
         db.session.delete(grade)
-        db.session.commit()
+        with _grade_write():
+            db.session.commit()
+            _record_grade(*removed, weight=-1)
+        invalidate_snapshots()
+        event_hub.publish('grades', 'deleted', [grade_id], studentIds=[removed[2]])
         
         return jsonify({
             'success': True,
@@ -294,20 +419,17 @@ def delete_grade(grade_id):
 
 @api.route('/attendance', methods=['GET'])
 def get_attendance():
-    """Get attendance records"""
+    """Get attendance records (supports filtering and sorting, see query_filters)"""
     try:
-        student_id = request.args.get('studentId')
-        
-        if student_id:
-            records = AttendanceDB.query.filter_by(student_id=student_id).all()
-        else:
-            records = AttendanceDB.query.all()
+        records = apply_list_query('attendance', request.args).all()
         
         return jsonify({
             'success': True,
             'attendance': [record.to_dict() for record in records],
             'count': len(records)
         }), 200
+    except FilterError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -332,15 +454,24 @@ def add_attendance():
         if data['status'] not in ['present', 'absent']:
             return jsonify({'success': False, 'error': 'Invalid status'}), 400
         
+        # Validate date
+        try:
+            day = attendance_store.parse_date(data['date']).isoformat()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         # Create attendance record
         attendance = AttendanceDB(
             student_id=data['studentId'],
-            date=data['date'],
+            date=day,
             status=data['status']
         )
         
         db.session.add(attendance)
+        attendance_store.record_day(data['studentId'], day, data['status'])
         db.session.commit()
+        invalidate_snapshots()
+        event_hub.publish('attendance', 'created', [attendance.id], studentIds=[attendance.student_id])
         
         return jsonify({
             'success': True,
@@ -362,7 +493,21 @@ def delete_attendance(attendance_id):
             return jsonify({'success': False, 'error': 'Attendance record not found'}), 404
         
         db.session.delete(attendance)
+        
+        # Another record for the same day (if any) becomes the bitmap's value
+        remaining = AttendanceDB.query.filter(
+            AttendanceDB.student_id == attendance.student_id,
+            AttendanceDB.date == attendance.date,
+            AttendanceDB.id != attendance.id
+        ).order_by(AttendanceDB.id.desc()).first()
+        try:
+            attendance_store.record_day(attendance.student_id, attendance.date,
+                                        remaining.status if remaining else None)
+        except ValueError:
+            pass  # Unparseable date saved before dates were validated; it has no bitmap bit
         db.session.commit()
+        invalidate_snapshots()
+        event_hub.publish('attendance', 'deleted', [attendance_id], studentIds=[attendance.student_id])
         
         return jsonify({
             'success': True,
@@ -373,6 +518,78 @@ def delete_attendance(attendance_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api.route('/attendance/roll-call', methods=['POST'])
+def roll_call():
+    """Record a whole section's attendance for one day in one operation"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'date' not in data:
+            return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+        
+        if 'records' in data:
+            # Explicit {studentId: status} mapping
+            statuses = dict(data['records'])
+        elif 'course' in data:
+            # Whole course/section: everyone present except those listed as absent
+            absent = set(data.get('absent', []))
+            student_ids = [sid for (sid,) in db.session.query(StudentDB.student_id)
+                           .filter_by(course=data['course'])]
+            statuses = {sid: 'absent' if sid in absent else 'present' for sid in student_ids}
+        else:
+            return jsonify({'success': False, 'error': 'Provide either records or course'}), 400
+        
+        if not statuses:
+            return jsonify({'success': False, 'error': 'No students to record'}), 400
+        
+        known = {sid for (sid,) in db.session.query(StudentDB.student_id)
+                 .filter(StudentDB.student_id.in_(list(statuses)))}
+        unknown = sorted(set(statuses) - known)
+        if unknown:
+            return jsonify({'success': False, 'error': f"Students not found: {', '.join(unknown)}"}), 404
+        
+        result = attendance_store.roll_call(data['date'], statuses)
+        invalidate_snapshots()
+        event_hub.publish('attendance', 'roll-call', None, studentIds=sorted(statuses), date=data['date'])
+        
+        return jsonify({
+            'success': True,
+            'message': 'Roll call recorded successfully',
+            'rollCall': result
+        }), 201
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/attendance/summary/<student_id>', methods=['GET'])
+def attendance_summary(student_id):
+    """Get attendance totals and streaks for a student"""
+    try:
+        summary = attendance_store.attendance_summary(student_id)
+        return jsonify({
+            'success': True,
+            'summary': summary
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/attendance/calendar/<student_id>', methods=['GET'])
+def attendance_calendar(student_id):
+    """Get day-by-day attendance for a term"""
+    try:
+        calendar = attendance_store.attendance_calendar(student_id, request.args.get('term'))
+        return jsonify({
+            'success': True,
+            'calendar': calendar
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============= ANALYTICS ROUTES =============
 
 @api.route('/analytics/student/<student_id>', methods=['GET'])
@@ -388,37 +605,123 @@ def get_student_stats(student_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api.route('/analytics/students', methods=['GET'])
+def get_all_student_stats():
+    """Get analytics for all students (or a filtered set) in one call"""
+    try:
+        student_ids = request.args.get('studentIds')
+        analytics = get_all_student_analytics(
+            course=request.args.get('course'),
+            student_ids=student_ids.split(',') if student_ids else None
+        )
+        return jsonify({
+            'success': True,
+            'analytics': analytics,
+            'count': len(analytics)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @api.route('/analytics/class', methods=['GET'])
 def get_class_stats():
-    """Get analytics for entire class"""
+    """Get analytics for entire class (?exact=true to bypass the grade sketch and snapshot)"""
     try:
-        analytics = get_class_analytics()
+        if _exact_requested():
+            analytics, snapshot = get_class_analytics(exact=True), None
+        else:
+            analytics, snapshot = _snapshot('class-analytics')
         return jsonify({
             'success': True,
-            'analytics': analytics
+            'analytics': analytics,
+            'snapshot': snapshot
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/analytics/attendance', methods=['GET'])
+def get_attendance_stats():
+    """Get attendance rates bucketed by day, week or month"""
+    try:
+        trends = get_attendance_trends(
+            granularity=request.args.get('granularity', 'day'),
+            student_id=request.args.get('studentId'),
+            course=request.args.get('course'),
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to')
+        )
+        return jsonify({
+            'success': True,
+            'analytics': trends
         }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @api.route('/analytics/distribution', methods=['GET'])
 def get_distribution():
-    """Get grade distribution"""
+    """Get grade distribution (?exact=true to bypass the grade sketch and snapshot)"""
+    try:
+        if _exact_requested():
+            distribution, snapshot = get_grade_distribution(exact=True), None
+        else:
+            distribution, snapshot = _snapshot('grade-distribution')
+        return jsonify({
+            'success': True,
+            'distribution': distribution,
+            'snapshot': snapshot
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/analytics/subjects', methods=['GET'])
+def get_all_subject_stats():
+    """Get analytics for every subject in one call"""
     try:
-        distribution = get_grade_distribution()
+        analytics = get_all_subject_analytics()
         return jsonify({
             'success': True,
-            'distribution': distribution
+            'analytics': analytics,
+            'count': len(analytics)
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api.route('/analytics/percentiles', methods=['GET'])
+def get_percentiles():
+    """Get grade percentiles and mode for the class, a subject or a course"""
+    try:
+        try:
+            percentiles = [float(p) for p in request.args.get('p', '25,50,75,90').split(',')]
+        except ValueError:
+            return jsonify({'success': False, 'error': 'p must be a comma-separated list of numbers'}), 400
+        
+        result = get_grade_percentiles(
+            scope=request.args.get('scope', 'class'),
+            name=request.args.get('name'),
+            percentiles=percentiles,
+            exact=_exact_requested()
+        )
+        return jsonify({
+            'success': True,
+            'analytics': result
+        }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @api.route('/analytics/subject/<subject>', methods=['GET'])
 def get_subject_stats(subject):
     """Get analytics for specific subject"""
     try:
-        analytics = get_subject_analytics(subject)
+        analytics = get_subject_analytics(subject, exact=_exact_requested())
         return jsonify({
             'success': True,
             'analytics': analytics
@@ -429,37 +732,53 @@ def get_subject_stats(subject):
 
 # ============= PREDICTION ROUTES =============
 
+def _prediction_model() -> str:
+    """Prediction model from ?model= (linear by default)"""
+    model = request.args.get('model', 'linear')
+    if model not in PREDICTION_MODELS:
+        raise ValueError(f"model must be one of {', '.join(PREDICTION_MODELS)}")
+    return model
+
+
 @api.route('/predictions/student/<student_id>', methods=['GET'])
 def predict_student(student_id):
-    """Predict student's next grade"""
+    """Predict student's next grade (?model=auto picks linear/quadratic/cubic by LOO error)"""
     try:
         subject = request.args.get('subject')
         
         if not subject:
             return jsonify({'success': False, 'error': 'Subject parameter required'}), 400
         
-        prediction = predict_student_grade(student_id, subject)
+        prediction = predict_student_grade(student_id, subject, model=_prediction_model())
         
         return jsonify({
             'success': True,
             'prediction': prediction
         }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @api.route('/predictions/all', methods=['GET'])
 def predict_all():
-    """Predict grades for all students"""
+    """Predict grades for all students (?model=auto picks the model per history)"""
     try:
         subject = request.args.get('subject')
-        predictions = predict_all_students_grades(subject)
+        model = _prediction_model()
+        if _async_requested():
+            return _job_accepted('predictions', {'subject': subject, 'model': model})
+        
+        predictions = predict_all_students_grades(subject, model=model)
         
         return jsonify({
             'success': True,
             'predictions': predictions,
             'count': len(predictions)
         }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -483,6 +802,152 @@ def predict_custom():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api.route('/predictions/custom/batch', methods=['POST'])
+def predict_custom_batch():
+    """Linear predictions for many grade series ({"series": [[...], ...]}), in input order"""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('series'), list):
+            return jsonify({'success': False, 'error': 'Series array required'}), 400
+        
+        max_series = current_app.config['PREDICTION_BATCH_MAX_SERIES']
+        if len(data['series']) > max_series:
+            return jsonify({'success': False, 'error': f'At most {max_series} series per request'}), 400
+        
+        periods_ahead = data.get('periodsAhead', 1)
+        if not isinstance(periods_ahead, int) or isinstance(periods_ahead, bool) or periods_ahead < 1:
+            return jsonify({'success': False, 'error': 'periodsAhead must be a positive integer'}), 400
+        
+        predictions = batch_linear_predict(data['series'], periods_ahead)
+        
+        return jsonify({
+            'success': True,
+            'predictions': predictions,
+            'count': len(predictions)
+        }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/predictions/backtest', methods=['GET'])
+def predict_backtest():
+    """Expanding-window backtest of linear predictions (?subject=&course=&min_history=)"""
+    try:
+        try:
+            min_history = int(request.args.get('min_history', 2))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'min_history must be an integer'}), 400
+        
+        report = run_backtest(
+            subject=request.args.get('subject'),
+            course=request.args.get('course'),
+            min_history=min_history
+        )
+        
+        return jsonify({
+            'success': True,
+            'backtest': report
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/predictions/at-risk', methods=['GET'])
+def predict_at_risk():
+    """
+    Early-warning list of students ranked by risk score
+    (?threshold=&limit=&course=&subject=, weights as weight_<component>,
+    scales as passing_grade/slope_scale/min_attendance/streak_limit)
+    """
+    try:
+        try:
+            threshold = float(request.args.get('threshold', 50))
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+            weights = {name: float(request.args[f'weight_{name}'])
+                       for name in DEFAULT_RISK_WEIGHTS if f'weight_{name}' in request.args}
+            params = {name: float(request.args[name])
+                      for name in DEFAULT_RISK_PARAMETERS if name in request.args}
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Risk parameters must be numbers'}), 400
+        
+        result = score_at_risk_students(
+            threshold=threshold,
+            limit=limit,
+            course=request.args.get('course'),
+            subject=request.args.get('subject'),
+            weights=weights,
+            params=params
+        )
+        
+        return jsonify({
+            'success': True,
+            'threshold': threshold,
+            'students': result['students'],
+            'count': len(result['students']),
+            'scored': result['scored'],
+            'weights': result['weights'],
+            'parameters': result['parameters']
+        }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ============= RANKING ROUTES =============
+
+@api.route('/rankings', methods=['GET'])
+def get_rankings():
+    """Leaderboard of student averages for the school, a course or a subject"""
+    try:
+        key = scope_key(request.args.get('scope', 'school'), request.args.get('name'))
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = min(int(request.args.get('limit', 20)), 500)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'offset and limit must be integers'}), 400
+        
+        total, entries = rankings.leaderboard(key, offset=max(offset, 0), limit=max(limit, 0))
+        
+        return jsonify({
+            'success': True,
+            'scope': key,
+            'rankings': entries,
+            'total': total,
+            'offset': offset,
+            'count': len(entries)
+        }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/rankings/student/<student_id>', methods=['GET'])
+def get_student_rankings(student_id):
+    """Rank and percentile of a student in the school, their course and their subjects"""
+    try:
+        scope = request.args.get('scope')
+        keys = [scope_key(scope, request.args.get('name'))] if scope else None
+        
+        ranks = rankings.student_ranks(student_id, keys)
+        if not ranks:
+            return jsonify({'success': False, 'error': 'No ranked grades found for this student'}), 404
+        
+        return jsonify({
+            'success': True,
+            'student_id': student_id,
+            'rankings': ranks
+        }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============= VISUALIZATION ROUTES =============
 
 @api.route('/charts/grade-distribution', methods=['GET'])
@@ -490,11 +955,18 @@ def chart_grade_distribution():
     """Get grade distribution pie chart"""
     try:
         student_id = request.args.get('studentId')
-        chart = generate_grade_distribution_pie_chart(student_id)
+        if not student_id and _async_requested():
+            return _job_accepted('class-chart', {'chart': 'grade-distribution'})
+        
+        if student_id:
+            chart, snapshot = generate_grade_distribution_pie_chart(student_id), None
+        else:
+            chart, snapshot = _snapshot('chart:grade-distribution')
         
         return jsonify({
             'success': True,
-            'chart': chart
+            'chart': chart,
+            'snapshot': snapshot
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -548,11 +1020,15 @@ def chart_subject_comparison(student_id):
 def chart_class_performance():
     """Get class performance chart"""
     try:
-        chart = generate_class_performance_chart()
+        if _async_requested():
+            return _job_accepted('class-chart', {'chart': 'class-performance'})
+        
+        chart, snapshot = _snapshot('chart:class-performance')
         
         return jsonify({
             'success': True,
-            'chart': chart
+            'chart': chart,
+            'snapshot': snapshot
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -564,6 +1040,9 @@ def chart_class_performance():
 def export_data():
     """Export all data to JSON"""
     try:
+        if _async_requested():
+            return _job_accepted('export')
+        
         data = export_to_json()
         
         return jsonify({
@@ -583,7 +1062,11 @@ def import_data():
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
+        if _async_requested():
+            return _job_accepted('import', {'data': data})
+        
         stats = import_from_json(data=data)
+        _after_bulk_change()
         
         return jsonify({
             'success': True,
@@ -598,6 +1081,10 @@ def clear_data():
     """Clear all data (use with caution!)"""
     try:
         result = clear_all_data()
+        student_index.invalidate()
+        _invalidate_grade_indexes()
+        invalidate_snapshots(drop=True)
+        event_hub.publish('data', 'cleared')
         
         if result['success']:
             return jsonify(result), 200
@@ -607,6 +1094,181 @@ def clear_data():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# ============= BACKGROUND JOBS =============
+
+@job_queue.handler('import')
+def _run_import_job(params, job):
+    try:
+        stats = import_from_json(data=params.get('data'), progress=job.progress)
+    finally:
+        # Sections committed before a cancellation stay imported
+        _after_bulk_change()
+    return {'stats': stats}
+
+
+@job_queue.handler('export')
+def _run_export_job(params, job):
+    with use_replica():
+        return {'data': export_to_json()}
+
+
+@job_queue.handler('snapshots')
+def _run_snapshots_job(params, job):
+    return {'refreshed_ms': refresh_snapshots(params.get('keys'), older_than=params.get('olderThan'))}
+
+
+@job_queue.handler('predictions')
+def _run_predictions_job(params, job):
+    with use_replica():
+        predictions = predict_all_students_grades(params.get('subject'), model=params.get('model', 'linear'))
+    return {'predictions': predictions, 'count': len(predictions)}
+
+
+CLASS_CHARTS = {
+    'class-performance': generate_class_performance_chart,
+    'grade-distribution': generate_grade_distribution_pie_chart,
+}
+
+
+@job_queue.handler('class-chart')
+def _run_class_chart_job(params, job):
+    chart = params.get('chart')
+    if chart not in CLASS_CHARTS:
+        raise ValueError(f"chart must be one of {', '.join(CLASS_CHARTS)}")
+    with use_replica():
+        return {'chart': CLASS_CHARTS[chart]()}
+
+
+@api.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a background job ({"type": ..., "params": {...}})"""
+    try:
+        data = request.get_json() or {}
+        
+        if 'type' not in data:
+            return jsonify({'success': False, 'error': 'Job type required'}), 400
+        
+        return _job_accepted(data['type'], data.get('params') or {})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/jobs', methods=['GET'])
+def get_jobs():
+    """Recent jobs, newest first (?status=&type=&limit=50)"""
+    try:
+        query = JobDB.query
+        status = request.args.get('status')
+        if status:
+            if status not in JOB_STATUSES:
+                return jsonify({'success': False, 'error': f"status must be one of {', '.join(JOB_STATUSES)}"}), 400
+            query = query.filter(JobDB.status == status)
+        if request.args.get('type'):
+            query = query.filter(JobDB.job_type == request.args['type'])
+        try:
+            limit = min(int(request.args.get('limit', 50)), 500)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+        
+        jobs = query.order_by(JobDB.created_at.desc()).limit(limit).all()
+        
+        return jsonify({
+            'success': True,
+            'jobs': [job_queue.to_dict(job, include_result=False) for job in jobs],
+            'count': len(jobs)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status, progress and (once finished) result"""
+    try:
+        job = db.session.get(JobDB, job_id)
+        
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'job': job_queue.to_dict(job)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        job = job_queue.cancel(job_id)
+        
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'job': job_queue.to_dict(job, include_result=False)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ============= CHANGE EVENTS =============
+
+@api.route('/events', methods=['GET'])
+def get_events():
+    """
+    Server-Sent Events stream of change notifications (?entities=students,grades)
+
+    Each 'change' event carries {version, entity, action, ids, ...}; clients
+    re-fetch only what changed. 'data' events (imports, clears) are always
+    sent and, like 'resync', mean everything should be re-fetched.
+    """
+    try:
+        entities = None
+        if request.args.get('entities'):
+            entities = {name.strip() for name in request.args['entities'].split(',') if name.strip()}
+            unknown = entities - set(EVENT_ENTITIES)
+            if unknown:
+                return jsonify({'success': False,
+                                'error': f"entities must be among {', '.join(EVENT_ENTITIES)}"}), 400
+        
+        # Browsers resend the last id on reconnect; ?lastEventId= helps polyfills
+        after = parse_last_event_id(
+            request.headers.get('Last-Event-ID') or request.args.get('lastEventId'), event_hub)
+        
+        event_hub.subscribe()
+        response = Response(
+            stream_events(event_hub, after, entities,
+                          heartbeat=current_app.config['EVENTS_HEARTBEAT'],
+                          retry_ms=current_app.config['EVENTS_RETRY_MS']),
+            mimetype='text/event-stream'
+        )
+        response.call_on_close(event_hub.unsubscribe)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+        return response
+    except TooManySubscribers as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/events/status', methods=['GET'])
+def get_events_status():
+    """Current data version and open event streams in this process"""
+    return jsonify({
+        'success': True,
+        'version': event_hub.version,
+        'boot': event_hub.boot_id,
+        'subscribers': event_hub.subscribers
+    }), 200
+
+
 # ============= OOP DEMONSTRATION ROUTES =============
 
 @api.route('/oop/demo', methods=['GET'])
@@ -658,6 +1320,39 @@ def oop_demo():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# ============= METRICS =============
+
+@api.route('/metrics/pool', methods=['GET'])
+def get_pool_metrics():
+    """Connection pool telemetry for this process (?format=prometheus for text exposition)"""
+    try:
+        if request.args.get('format') == 'prometheus':
+            return Response(pool_metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+        
+        return jsonify({
+            'success': True,
+            'pools': pool_metrics.snapshot_all()
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/metrics/timing', methods=['GET'])
+def get_timing_metrics():
+    """Per-route stage duration histograms for this process (?format=prometheus for text exposition)"""
+    try:
+        if request.args.get('format') == 'prometheus':
+            return Response(server_timing.prometheus_text(), mimetype='text/plain; version=0.0.4')
+        
+        return jsonify({
+            'success': True,
+            'enabled': server_timing.enabled,
+            'routes': server_timing.snapshot()
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============= HEALTH CHECK =============
 
 @api.route('/health', methods=['GET'])
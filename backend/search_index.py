@@ -0,0 +1,260 @@
+"""
+Student Search Index
+In-process prefix and trigram index over student name, email and ID for
+typeahead search
+"""
+
+import bisect
+import heapq
+import itertools
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from database import db, StudentDB
+from db_routing import use_primary
+
+
+# Rank weights: lower is better. Fuzzy matches are ranked after all prefix matches.
+RANK_EXACT_ID = 0
+RANK_ID_PREFIX = 1
+RANK_NAME_PREFIX = 2
+RANK_EMAIL_PREFIX = 3
+RANK_FUZZY = 4
+
+# Minimum share of the query's trigrams a fuzzy match must contain
+MIN_FUZZY_SIMILARITY = 0.5
+
+# Upper bound on candidates examined per query term
+MAX_CANDIDATES = 1000
+
+
+def _normalize(text: Optional[str]) -> str:
+    return (text or '').strip().lower()
+
+
+def _trigrams(text: str) -> set:
+    """Trigrams of a token, padded so short words still produce some"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _tokens(student_id: str, name: str, email: str) -> List[Tuple[str, int]]:
+    """Searchable (token, rank) pairs for one student"""
+    tokens = [(_normalize(student_id), RANK_ID_PREFIX)]
+    tokens.extend((word, RANK_NAME_PREFIX) for word in _normalize(name).split())
+    email = _normalize(email)
+    if email:
+        tokens.append((email, RANK_EMAIL_PREFIX))
+    return tokens
+
+
+class StudentSearchIndex:
+    """
+    Prefix + trigram index kept in memory
+
+    Prefix lookups bisect a sorted list of (token, student_id) pairs; fuzzy
+    lookups count shared trigrams through an inverted index. The index is
+    built lazily from the database on first use, kept current by the student
+    CRUD routes, and rebuilt when older than max_age seconds so that changes
+    made by other worker processes are picked up.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[str, str]] = []
+        self._rank: Dict[Tuple[str, str], int] = {}
+        self._trigrams: Dict[str, set] = {}
+        self._docs: Dict[str, Dict] = {}
+        self._built_at: Optional[float] = None
+
+    # ---------- maintenance ----------
+
+    def _add_locked(self, student_id: str, name: str, email: str):
+        self._docs[student_id] = {'id': student_id, 'name': name, 'email': email}
+        for token, rank in _tokens(student_id, name, email):
+            key = (token, student_id)
+            if key not in self._rank:
+                bisect.insort(self._entries, key)
+                self._rank[key] = rank
+            else:
+                self._rank[key] = min(self._rank[key], rank)
+            for gram in _trigrams(token):
+                self._trigrams.setdefault(gram, set()).add(student_id)
+
+    def _remove_locked(self, student_id: str):
+        doc = self._docs.pop(student_id, None)
+        if doc is None:
+            return
+        for token, _ in _tokens(doc['id'], doc['name'], doc['email']):
+            key = (token, student_id)
+            if self._rank.pop(key, None) is not None:
+                i = bisect.bisect_left(self._entries, key)
+                if i < len(self._entries) and self._entries[i] == key:
+                    del self._entries[i]
+            for gram in _trigrams(token):
+                ids = self._trigrams.get(gram)
+                if ids is not None:
+                    ids.discard(student_id)
+                    if not ids:
+                        del self._trigrams[gram]
+
+    def rebuild(self):
+        """Rebuild the whole index from the students table"""
+        # From the primary: the index is kept current by writes applied there
+        with use_primary():
+            rows = db.session.query(StudentDB.student_id, StudentDB.name, StudentDB.email).all()
+        with self._lock:
+            self._entries = []
+            self._rank = {}
+            self._trigrams = {}
+            self._docs = {}
+            for student_id, name, email in rows:
+                self._docs[student_id] = {'id': student_id, 'name': name, 'email': email}
+                for token, rank in _tokens(student_id, name, email):
+                    key = (token, student_id)
+                    self._rank[key] = min(self._rank.get(key, rank), rank)
+                    for gram in _trigrams(token):
+                        self._trigrams.setdefault(gram, set()).add(student_id)
+            self._entries = sorted(self._rank)
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """Drop the index so the next search rebuilds it (e.g. after a bulk import)"""
+        with self._lock:
+            self._built_at = None
+
+    def add(self, student: StudentDB):
+        """Index a newly created student"""
+        with self._lock:
+            if self._built_at is not None:
+                self._add_locked(student.student_id, student.name, student.email)
+
+    def update(self, student: StudentDB):
+        """Re-index a student after name or email changes"""
+        with self._lock:
+            if self._built_at is not None:
+                self._remove_locked(student.student_id)
+                self._add_locked(student.student_id, student.name, student.email)
+
+    def remove(self, student_id: str):
+        """Remove a deleted student from the index"""
+        with self._lock:
+            if self._built_at is not None:
+                self._remove_locked(student_id)
+
+    def _ensure_fresh(self):
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > self.max_age:
+            self.rebuild()
+
+    # ---------- querying ----------
+
+    def _prefix_range(self, term: str) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self._entries, (term, ''))
+        hi = bisect.bisect_left(self._entries, (term + '\uffff', ''))
+        return lo, hi
+
+    def _prefix_matches(self, term: str, lo: int, hi: int) -> Dict[str, Tuple]:
+        """
+        Score prefix hits for a term. Only the first MAX_CANDIDATES entries
+        of the range are scanned, in lexicographic order: an exact token
+        sorts first, but beyond that the cutoff is not by closeness, so a
+        very broad prefix can miss shorter tokens further along the range.
+        """
+        best: Dict[str, Tuple] = {}
+        for token, student_id in self._entries[lo:min(hi, lo + MAX_CANDIDATES)]:
+            rank = self._rank[(token, student_id)]
+            if rank == RANK_ID_PREFIX and token == term:
+                rank = RANK_EXACT_ID
+            score = (rank, len(token) - len(term))
+            if student_id not in best or score < best[student_id]:
+                best[student_id] = score
+        return best
+
+    def _fuzzy_matches(self, term: str) -> Dict[str, Tuple]:
+        """
+        Score students sharing at least MIN_FUZZY_SIMILARITY of the term's
+        trigrams. A qualifying student must appear in one of the rarest
+        (len - needed + 1) posting lists, so only those are scanned for
+        candidates; the rest are used for membership checks.
+        """
+        grams = _trigrams(term)
+        needed = max(1, math.ceil(MIN_FUZZY_SIMILARITY * len(grams)))
+        postings = sorted((self._trigrams.get(gram, set()) for gram in grams), key=len)
+
+        candidates = set()
+        for ids in postings[:len(postings) - needed + 1]:
+            candidates.update(itertools.islice(ids, MAX_CANDIDATES - len(candidates)))
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+
+        best: Dict[str, Tuple] = {}
+        for student_id in candidates:
+            shared = sum(1 for ids in postings if student_id in ids)
+            if shared >= needed:
+                best[student_id] = (RANK_FUZZY, -shared / len(grams))
+        return best
+
+    def _term_matches(self, term: str, fuzzy: bool) -> Dict[str, Tuple]:
+        lo, hi = self._prefix_range(term)
+        if lo < hi:
+            return self._prefix_matches(term, lo, hi)
+        if fuzzy and len(term) >= 3:
+            return self._fuzzy_matches(term)
+        return {}
+
+    def _doc_matches(self, student_id: str, term: str) -> bool:
+        doc = self._docs[student_id]
+        return any(token.startswith(term) for token, _ in _tokens(doc['id'], doc['name'], doc['email']))
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = True) -> List[Dict]:
+        """
+        Search students by ID, name or email
+
+        Every whitespace-separated term must match. Candidates come from the
+        most selective term (prefix hits, or trigram matches when a term has
+        no prefix hits); the remaining terms must prefix-match one of the
+        candidate's tokens. Results are ranked: exact ID, ID prefix, name
+        prefix, email prefix, then fuzzy matches by trigram similarity.
+
+        Args:
+            query: Text typed by the user
+            limit: Maximum number of results
+            fuzzy: Allow trigram matching for terms without prefix hits
+
+        Returns:
+            List of {'id', 'name', 'email', 'match'} dictionaries
+        """
+        terms = _normalize(query).split()
+        if not terms:
+            return []
+
+        self._ensure_fresh()
+        with self._lock:
+            # Drive the search from the term with the fewest prefix hits
+            widths = {}
+            for term in terms:
+                lo, hi = self._prefix_range(term)
+                widths[term] = (hi - lo) or float('inf')
+            driver = min(terms, key=widths.get)
+            best = self._term_matches(driver, fuzzy)
+
+            others = [term for term in terms if term != driver]
+            if others:
+                best = {sid: score for sid, score in best.items()
+                        if all(self._doc_matches(sid, term) for term in others)}
+
+            ranked = heapq.nsmallest(limit, best.items(), key=lambda item: (item[1], item[0]))
+            match_names = {RANK_EXACT_ID: 'id', RANK_ID_PREFIX: 'id',
+                           RANK_NAME_PREFIX: 'name', RANK_EMAIL_PREFIX: 'email',
+                           RANK_FUZZY: 'fuzzy'}
+            return [dict(self._docs[sid], match=match_names[score[0]]) for sid, score in ranked]
+
+    def __len__(self):
+        return len(self._docs)
+
+
+# Shared index used by the API routes
+student_index = StudentSearchIndex()
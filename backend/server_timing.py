@@ -0,0 +1,223 @@
+"""
+Server Timing
+Per-stage latency breakdown for requests: analytics, predictions and charts
+wrap their stages in span() - database fetch, NumPy, matplotlib rendering,
+base64 encoding - and the JSON provider times serialization of the response.
+
+Each request's spans are summed by name and sent as a Server-Timing header
+(shown in the browser devtools' Timing tab), e.g.
+
+    Server-Timing: db;dur=41.2, numpy;dur=3.9, render;dur=212.7, encode;dur=1.4, json;dur=0.6, total;dur=263.0
+
+and added to per-route, per-stage histograms served by
+GET /api/metrics/timing. With SERVER_TIMING off nothing is registered and
+span() returns a shared no-op context manager.
+"""
+
+import bisect
+import threading
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, List, Optional
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+
+# Upper bounds (ms) of the stage duration histogram buckets; the last is +Inf
+STAGE_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Timeline of the current request (None outside requests and when disabled)
+_timeline: ContextVar[Optional['Timeline']] = ContextVar('server_timing', default=None)
+
+_NO_SPAN = nullcontext()
+
+
+class Timeline:
+    """
+    Span durations of one request, summed by stage name in first-seen order.
+    Time inside a nested span counts for the inner stage only, so the stages
+    never add up to more than the request.
+    """
+
+    __slots__ = ('started', 'stages', 'open')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.open: List['_Span'] = []
+
+
+class _Span:
+    __slots__ = ('timeline', 'name', 'started')
+
+    def __init__(self, timeline: Timeline, name: str):
+        self.timeline = timeline
+        self.name = name
+
+    def __enter__(self):
+        now = perf_counter()
+        open_spans = self.timeline.open
+        if open_spans:
+            # Pause the enclosing span
+            parent = open_spans[-1]
+            stages = self.timeline.stages
+            stages[parent.name] = stages.get(parent.name, 0.0) + now - parent.started
+        self.started = now
+        open_spans.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        now = perf_counter()
+        open_spans = self.timeline.open
+        stages = self.timeline.stages
+        open_spans.pop()
+        stages[self.name] = stages.get(self.name, 0.0) + now - self.started
+        if open_spans:
+            open_spans[-1].started = now
+        return False
+
+
+def span(name: str):
+    """
+    Time a stage of the current request (a no-op outside requests or with
+    SERVER_TIMING off). Spans with the same name add up.
+
+        with span('db'):
+            rows = query.all()
+    """
+    timeline = _timeline.get()
+    if timeline is None:
+        return _NO_SPAN
+    return _Span(timeline, name)
+
+
+class StageHistogram:
+    """Duration histogram of one stage of one route"""
+
+    def __init__(self):
+        self.counts = [0] * (len(STAGE_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect.bisect_left(STAGE_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def _quantile(self, q: float) -> float:
+        """Upper bucket bound containing quantile q (ms)"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(STAGE_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return round(self.max, 3)
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'total': round(self.total, 3),
+            'mean': round(self.total / self.count, 3),
+            'p50': self._quantile(0.5),
+            'p95': self._quantile(0.95),
+            'p99': self._quantile(0.99),
+            'max': round(self.max, 3),
+            'buckets': {('+Inf' if i == len(STAGE_BUCKETS_MS) else str(STAGE_BUCKETS_MS[i])): count
+                        for i, count in enumerate(self.counts)},
+        }
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with jsonify() timed as the 'json' stage"""
+
+    def response(self, *args, **kwargs):
+        with span('json'):
+            return super().response(*args, **kwargs)
+
+
+class ServerTiming:
+    """Request timelines, Server-Timing headers and per-route stage histograms"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, StageHistogram]] = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SERVER_TIMING', False)
+        if not self.enabled:
+            return
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    # ---------- request hooks ----------
+
+    def _before_request(self):
+        _timeline.set(Timeline())
+
+    def _after_request(self, response):
+        timeline = _timeline.get()
+        if timeline is None:
+            return response
+        _timeline.set(None)
+        stages = timeline.stages
+        stages['total'] = perf_counter() - timeline.started
+        durations = {name: seconds * 1000 for name, seconds in stages.items()}
+        response.headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={ms:.1f}' for name, ms in durations.items()])
+        rule = request.url_rule
+        if rule is not None:
+            self.record(f'{request.method} {rule.rule}', durations)
+        return response
+
+    # ---------- aggregation ----------
+
+    def record(self, route: str, durations: Dict[str, float]):
+        """Add one request's stage durations (ms) to the route's histograms"""
+        with self._lock:
+            histograms = self._routes.get(route)
+            if histograms is None:
+                histograms = self._routes[route] = {}
+            for name, ms in durations.items():
+                histogram = histograms.get(name)
+                if histogram is None:
+                    histogram = histograms[name] = StageHistogram()
+                histogram.record(ms)
+
+    def snapshot(self) -> List[Dict]:
+        """Per-route stage histograms, slowest total first"""
+        with self._lock:
+            routes = [{'route': route, 'stages': {name: histogram.snapshot() for name, histogram in stages.items()}}
+                      for route, stages in self._routes.items()]
+        return sorted(routes, key=lambda r: -r['stages']['total']['total'])
+
+    def prometheus_text(self) -> str:
+        """Stage histograms in the Prometheus text exposition format (in seconds)"""
+        name = 'http_request_stage_duration_seconds'
+        lines = [f'# HELP {name} Time spent in each stage of a request',
+                 f'# TYPE {name} histogram']
+        for route in self.snapshot():
+            for stage, histogram in route['stages'].items():
+                labels = f'route="{route["route"]}",stage="{stage}"'
+                cumulative = 0
+                for bucket, count in histogram['buckets'].items():
+                    cumulative += count
+                    bound = bucket if bucket == '+Inf' else repr(float(bucket) / 1000)
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {histogram["total"] / 1000}')
+                lines.append(f'{name}_count{{{labels}}} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+# Shared instance; app.py calls init_app
+server_timing = ServerTiming()
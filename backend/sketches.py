@@ -0,0 +1,304 @@
+"""
+Grade Sketches
+Fixed-size, mergeable summaries of final grades per scope (whole class,
+subject, course) that answer count, mean, std, min/max, percentiles and mode
+without loading every grade.
+
+Grades live in a bounded range (0-100), so the sketch is a fine fixed-width
+histogram rather than a KLL/t-digest: it is mergeable by addition, supports
+deletions (needed when a grade is edited or removed), and has a
+deterministic error bound:
+
+    * count, mean, mode (of rounded grades), min and max are exact
+    * variance and std are kept as a sum of squared deviations with Chan's
+      parallel update, so adds and removals do not cancel catastrophically;
+      they are exact up to floating-point rounding
+    * percentiles and the median are approximate: within 1 / BINS_PER_POINT
+      (0.05 grade points) of the exact value for grades in [0, 100], and
+      never outside [min, max]
+    * grade band counts (A-F) are exact because band edges fall on bin edges
+
+Removing a grade equal to the current min or max leaves that extreme to be
+located from the histogram (within 0.05 points) until the next rebuild.
+Grades outside [0, 100] are clamped into the end bins.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from database import db, StudentDB, GradeDB
+from db_routing import use_primary
+from write_guard import WriteGuard, REBUILD_ATTEMPTS
+
+
+BINS_PER_POINT = 20
+MAX_GRADE = 100
+NUM_BINS = MAX_GRADE * BINS_PER_POINT + 1  # last bin holds exactly 100 (and above)
+QUANTILE_ERROR_BOUND = 1.0 / BINS_PER_POINT
+
+GRADE_BANDS = (
+    ('A (90-100)', 90, None),
+    ('B (80-89)', 80, 90),
+    ('C (70-79)', 70, 80),
+    ('D (60-69)', 60, 70),
+    ('F (<60)', None, 60),
+)
+
+
+def _bin_index(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.floor(values * BINS_PER_POINT), 0, NUM_BINS - 1).astype(np.int64)
+
+
+def _mode_index(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(values), 0, MAX_GRADE).astype(np.int64)
+
+
+class GradeSketch:
+    """Fine histogram plus exact moments and extremes for one scope"""
+
+    __slots__ = ('bins', 'rounded', 'count', 'total', 'm2', 'low', 'high', 'extremes_exact')
+
+    def __init__(self):
+        self.bins = np.zeros(NUM_BINS, dtype=np.int64)
+        self.rounded = np.zeros(MAX_GRADE + 1, dtype=np.int64)
+        self._reset_moments()
+
+    def _reset_moments(self):
+        self.count = 0
+        self.total = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.low = float('inf')
+        self.high = float('-inf')
+        self.extremes_exact = True
+
+    def update(self, values, weight: int = 1):
+        """Add (weight=1) or remove (weight=-1) grades"""
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        if len(values) == 0:
+            return
+        np.add.at(self.bins, _bin_index(values), weight)
+        np.add.at(self.rounded, _mode_index(values), weight)
+
+        n = len(values)
+        total = float(values.sum())
+        m2 = float(np.square(values - total / n).sum())
+        low, high = float(values.min()), float(values.max())
+        if weight > 0:
+            self._combine(n, total, m2)
+            self.low = min(self.low, low)
+            self.high = max(self.high, high)
+            return
+
+        remaining = self.count - n
+        if remaining <= 0:
+            self._reset_moments()
+            return
+        # Chan's update run backwards: split the removed grades off the rest
+        delta = total / n - (self.total - total) / remaining
+        self.m2 = max(self.m2 - m2 - delta * delta * remaining * n / self.count, 0.0)
+        self.count = remaining
+        self.total -= total
+        if low <= self.low or high >= self.high:
+            self.extremes_exact = False
+
+    def _combine(self, n: int, total: float, m2: float):
+        """Chan's parallel update: add a group of n grades with the given sum and m2"""
+        if self.count:
+            delta = total / n - self.total / self.count
+            m2 += self.m2 + delta * delta * self.count * n / (self.count + n)
+        self.count += n
+        self.total += total
+        self.m2 = m2
+
+    def merge(self, other: 'GradeSketch') -> 'GradeSketch':
+        """Combine two sketches (e.g. per-course into per-school)"""
+        merged = GradeSketch()
+        merged.bins = self.bins + other.bins
+        merged.rounded = self.rounded + other.rounded
+        for sketch in (self, other):
+            if sketch.count:
+                merged._combine(sketch.count, sketch.total, sketch.m2)
+        merged.low = min(self.low, other.low)
+        merged.high = max(self.high, other.high)
+        merged.extremes_exact = self.extremes_exact and other.extremes_exact
+        return merged
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def variance(self) -> float:
+        """Sample variance (ddof=1), matching calculate_variance up to rounding"""
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def std_deviation(self) -> float:
+        return float(np.sqrt(self.variance()))
+
+    def mode(self) -> float:
+        """Most frequent rounded grade (smallest on ties), matching calculate_mode"""
+        if not self.count:
+            return 0.0
+        return float(np.argmax(self.rounded))
+
+    def _order_statistic(self, ranks: np.ndarray, cumulative: np.ndarray) -> np.ndarray:
+        """Estimate the value at 0-based ranks, spreading each bin's values evenly"""
+        bins = np.searchsorted(cumulative, ranks, side='right')
+        before = np.where(bins > 0, cumulative[bins - 1], 0)
+        in_bin = self.bins[bins]
+        offset = (ranks - before + 0.5) / np.maximum(in_bin, 1)
+        return (bins + offset) / BINS_PER_POINT
+
+    def quantiles(self, qs: Iterable[float]) -> List[float]:
+        """
+        Approximate percentiles using numpy's default 'linear' definition on
+        estimated order statistics (error < QUANTILE_ERROR_BOUND), clipped
+        to [min, max]
+
+        Args:
+            qs: Quantiles in [0, 1]
+        """
+        qs = np.asarray(list(qs), dtype=float)
+        if not self.count:
+            return [0.0] * len(qs)
+        cumulative = np.cumsum(self.bins)
+        position = (self.count - 1) * qs
+        lower = np.floor(position)
+        upper = np.ceil(position)
+        low_values = self._order_statistic(lower, cumulative)
+        high_values = self._order_statistic(upper, cumulative)
+        values = low_values + (position - lower) * (high_values - low_values)
+        bounds = self.min_max()
+        return np.clip(values, bounds['min'], bounds['max']).tolist()
+
+    def median(self) -> float:
+        """Approximate median (error < QUANTILE_ERROR_BOUND)"""
+        return self.quantiles([0.5])[0]
+
+    def min_max(self) -> Dict[str, float]:
+        """
+        Exact lowest and highest grade. After the current extreme has been
+        removed, the nearest occupied bin edge is used instead (still bounded
+        by the old extreme), until the next rebuild.
+        """
+        if not self.count:
+            return {'min': 0.0, 'max': 0.0}
+        if self.extremes_exact:
+            return {'min': self.low, 'max': self.high}
+        occupied = np.flatnonzero(self.bins)
+        return {
+            'min': max(float(occupied[0]) / BINS_PER_POINT, self.low),
+            'max': min(float(occupied[-1] + 1) / BINS_PER_POINT, MAX_GRADE, self.high)
+        }
+
+    def distribution(self) -> Dict[str, int]:
+        """A-F band counts (exact: band edges are bin edges)"""
+        result = {}
+        for label, low, high in GRADE_BANDS:
+            start = 0 if low is None else low * BINS_PER_POINT
+            end = NUM_BINS if high is None else high * BINS_PER_POINT
+            result[label] = int(self.bins[start:end].sum())
+        return result
+
+
+class SketchRegistry:
+    """
+    Grade sketches for every scope, built lazily from one columnar fetch and
+    updated incrementally by the grade write routes.
+
+    Scope keys are 'class', 'subject:<name>' and 'course:<name>'. Like the
+    search index, sketches are rebuilt after max_age seconds so that writes
+    handled by other worker processes are picked up. Grade writes in this
+    process must commit and record() inside writing().
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._sketches: Dict[str, GradeSketch] = {}
+        self._built_at: Optional[float] = None
+        self._guard = WriteGuard()
+
+    @staticmethod
+    def scopes_for(subject: str, course: Optional[str]) -> Tuple[str, ...]:
+        scopes = ('class', f'subject:{subject}')
+        return scopes + (f'course:{course}',) if course else scopes
+
+    def rebuild(self):
+        """
+        Rebuild every sketch from the grades table
+
+        The fetch runs without holding the lock. A grade write overlapping it
+        may or may not be in the fetched rows, so such a build is discarded
+        and retried (see write_guard). If writes keep overlapping, the
+        current sketches stay in place (record() keeps them up to date); if
+        there are none, the last build is installed but left stale so the
+        next read tries again.
+        """
+        for _ in range(REBUILD_ATTEMPTS):
+            generation = self._guard.idle_generation()
+            sketches = self._build()
+            with self._lock:
+                if self._guard.unchanged(generation):
+                    self._sketches = sketches
+                    self._built_at = time.monotonic()
+                    return
+        with self._lock:
+            if self._built_at is None:
+                self._sketches = sketches
+
+    @staticmethod
+    def _build() -> Dict[str, GradeSketch]:
+        from analytics import fetch_final_grades
+
+        with use_primary():  # grade writes update the sketches in place
+            grades, (subjects, courses) = fetch_final_grades([GradeDB.subject, StudentDB.course], join_students=True)
+        sketches: Dict[str, GradeSketch] = {'class': GradeSketch()}
+        sketches['class'].update(grades)
+        for prefix, keys in (('subject', subjects), ('course', courses)):
+            if len(keys) == 0:
+                continue
+            unique_keys, index = np.unique(keys.astype(str), return_inverse=True)
+            order = np.argsort(index, kind='stable')
+            bounds = np.r_[0, np.cumsum(np.bincount(index))]
+            for i, key in enumerate(unique_keys.tolist()):
+                sketch = GradeSketch()
+                sketch.update(grades[order[bounds[i]:bounds[i + 1]]])
+                sketches[f'{prefix}:{key}'] = sketch
+        return sketches
+
+    def invalidate(self):
+        """Drop all sketches so the next read rebuilds them"""
+        self._guard.touch()
+        with self._lock:
+            self._built_at = None
+
+    def writing(self):
+        """Context manager around a grade commit and its record() calls"""
+        return self._guard.writing()
+
+    def _ensure_fresh(self):
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > self.max_age:
+            self.rebuild()
+
+    def get(self, scope: str) -> GradeSketch:
+        """Sketch for a scope (empty if the scope has no grades)"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._sketches.get(scope) or GradeSketch()
+
+    def record(self, final_grade: Optional[float], subject: str, course: Optional[str], weight: int = 1):
+        """Apply a grade insert (weight=1) or removal (weight=-1) to its scopes"""
+        if final_grade is None:
+            return
+        with self._lock:
+            if self._built_at is None:
+                return
+            for scope in self.scopes_for(subject, course):
+                self._sketches.setdefault(scope, GradeSketch()).update([final_grade], weight)
+
+
+# Shared registry used by analytics and the grade routes
+grade_sketches = SketchRegistry()
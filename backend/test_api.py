@@ -1,13 +1,70 @@
 """
 Test Script to Verify Backend Functionality
 Run this after setting up the database to test all features
+
+    python test_api.py                 # against a running server on localhost:5000
+    python test_api.py --in-process    # no server or MySQL: in-memory SQLite (FLASK_ENV=bench)
+
+For throughput and tail latency under concurrent traffic use load_test.py.
 """
 
-import requests
+import argparse
+import os
 import json
 
+try:
+    import requests
+except ImportError:  # only needed against a live server
+    requests = None
+
 BASE_URL = 'http://localhost:5000/api'
 
+# Most SQL statements each route may run (X-Query-Count, non-production
+# servers only). These routes run a fixed number of queries however much data
+# there is, so going over budget usually means a query was added to a loop.
+QUERY_BUDGETS = {
+    '/students?limit=50': 2,
+    '/students/TEST001': 4,
+    '/grades?studentId=TEST001': 2,
+    '/analytics/class': 8,
+    '/analytics/student/TEST001': 4,
+    '/predictions/student/TEST001?subject=Mathematics': 4,
+    '/predictions/all': 3,
+    '/rankings': 2,
+    '/data/export': 4,
+}
+
+
+class InProcessResponse:
+    """The parts of requests.Response the tests use"""
+    
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._response = response
+    
+    def json(self):
+        return self._response.get_json()
+
+
+class InProcessClient:
+    """requests-style client that calls the Flask app directly through its test client"""
+    
+    def __init__(self, app):
+        self.client = app.test_client()
+    
+    def get(self, url, **kwargs):
+        return InProcessResponse(self.client.get(url, **kwargs))
+    
+    def post(self, url, **kwargs):
+        return InProcessResponse(self.client.post(url, **kwargs))
+    
+    def put(self, url, **kwargs):
+        return InProcessResponse(self.client.put(url, **kwargs))
+    
+    def delete(self, url, **kwargs):
+        return InProcessResponse(self.client.delete(url, **kwargs))
+
 def test_health():
     """Test health check"""
     print("\n🔍 Testing Health Check...")
@@ -42,6 +99,15 @@ def test_get_students():
     print(f"Number of students: {data.get('count', 0)}")
     return response.status_code == 200
 
+def test_search_students():
+    """Test typeahead student search"""
+    print("\n🔍 Testing Student Search...")
+    response = requests.get(f'{BASE_URL}/students/search?q=Test Stu')
+    print(f"Status: {response.status_code}")
+    results = response.json().get('results', [])
+    print(f"Results: {[r['id'] for r in results]}")
+    return response.status_code == 200 and any(r['id'] == 'TEST001' for r in results)
+
 def test_add_grade():
     """Test adding a grade"""
     print("\n🎯 Testing Add Grade...")
@@ -71,6 +137,31 @@ def test_add_attendance():
     print(f"Response: {response.json()}")
     return response.status_code == 201
 
+def test_roll_call():
+    """Test recording a whole section's attendance"""
+    print("\n🗓️  Testing Roll Call...")
+    data = {
+        'date': '2024-01-16',
+        'course': 'Computer Science',
+        'absent': []
+    }
+    response = requests.post(f'{BASE_URL}/attendance/roll-call', json=data)
+    print(f"Status: {response.status_code}")
+    print(f"Response: {response.json()}")
+    summary = requests.get(f'{BASE_URL}/attendance/summary/TEST001').json().get('summary', {})
+    print(f"Present streak: {summary.get('current_present_streak')}")
+    return response.status_code == 201
+
+def test_filtered_grades():
+    """Test filtering and sorting grades"""
+    print("\n🔎 Testing Grade Filters...")
+    response = requests.get(f'{BASE_URL}/grades?subject=Mathematics&min_final=50&sort=-finalGrade')
+    print(f"Status: {response.status_code}")
+    print(f"Matching grades: {response.json().get('count', 0)}")
+    bad = requests.get(f'{BASE_URL}/grades?sort=unknownField')
+    print(f"Invalid sort status: {bad.status_code}")
+    return response.status_code == 200 and bad.status_code == 400
+
 def test_analytics():
     """Test analytics"""
     print("\n📊 Testing Analytics...")
@@ -98,6 +189,30 @@ def test_prediction():
             print(f"Note: {prediction.get('error')}")
     return response.status_code == 200
 
+def test_batch_prediction():
+    """Test batch predictions and their input validation"""
+    print("\n📈 Testing Batch Predictions...")
+    response = requests.post(f'{BASE_URL}/predictions/custom/batch', json={'series': [[50, 60, 70], [80]]})
+    print(f"Status: {response.status_code}")
+    invalid = [
+        {'series': [[1, None], [50, 60]]},
+        {'series': [[50, 'nan']]},
+        {'series': [[50, 60]], 'periodsAhead': True},
+    ]
+    statuses = [requests.post(f'{BASE_URL}/predictions/custom/batch', json=body).status_code for body in invalid]
+    print(f"Invalid input statuses: {statuses}")
+    return response.status_code == 200 and statuses == [400, 400, 400]
+
+def test_at_risk():
+    """Test early-warning risk scoring"""
+    print("\n⚠️  Testing At-Risk Students...")
+    response = requests.get(f'{BASE_URL}/predictions/at-risk?threshold=0&limit=5')
+    print(f"Status: {response.status_code}")
+    if response.status_code == 200:
+        for student in response.json().get('students', []):
+            print(f"{student['student_id']}: risk {student['risk_score']}")
+    return response.status_code == 200
+
 def test_chart():
     """Test chart generation"""
     print("\n📈 Testing Chart Generation...")
@@ -121,6 +236,21 @@ def test_export():
         print(f"Attendance: {len(data.get('attendance', []))}")
     return response.status_code == 200
 
+def test_query_budgets():
+    """Test that routes stay within their SQL query budgets"""
+    from query_counter import assert_query_budget, QueryBudgetExceeded
+    print("\n🧮 Testing Query Budgets...")
+    ok = True
+    for path, budget in QUERY_BUDGETS.items():
+        response = requests.get(f'{BASE_URL}{path}')
+        try:
+            count = assert_query_budget(response, budget, path)
+            print(f"{path}: {count} queries (budget {budget})")
+        except QueryBudgetExceeded as e:
+            print(f"❌ {e}")
+            ok = False
+    return ok
+
 def test_oop_demo():
     """Test OOP demonstration"""
     print("\n🎓 Testing OOP Demo...")
@@ -150,12 +280,18 @@ def run_all_tests():
         ('Health Check', test_health),
         ('Add Student', test_add_student),
         ('Get Students', test_get_students),
+        ('Search Students', test_search_students),
         ('Add Grade', test_add_grade),
         ('Add Attendance', test_add_attendance),
+        ('Roll Call', test_roll_call),
+        ('Grade Filters', test_filtered_grades),
         ('Analytics', test_analytics),
         ('Prediction', test_prediction),
+        ('Batch Prediction', test_batch_prediction),
+        ('At-Risk Students', test_at_risk),
         ('Chart Generation', test_chart),
         ('Data Export', test_export),
+        ('Query Budgets', test_query_budgets),
         ('OOP Demo', test_oop_demo)
     ]
     
@@ -187,9 +323,21 @@ def run_all_tests():
     print("="*60)
 
 if __name__ == '__main__':
-    print("\n⚠️  Make sure the Flask server is running on http://localhost:5000")
-    print("⚠️  Make sure MySQL is configured and running\n")
+    parser = argparse.ArgumentParser(description='Exercise the backend API')
+    parser.add_argument('--in-process', action='store_true',
+                        help='Run against an in-process app on SQLite instead of a live server')
+    args = parser.parse_args()
     
-    input("Press Enter to start testing...")
+    if args.in_process:
+        # The bench profile is read when config is imported, so set it first
+        os.environ.setdefault('FLASK_ENV', 'bench')
+        os.environ.setdefault('BENCH_DATABASE_URI', 'sqlite://')
+        from app import create_app
+        requests = InProcessClient(create_app())
+    else:
+        print("\n⚠️  Make sure the Flask server is running on http://localhost:5000")
+        print("⚠️  Make sure MySQL is configured and running\n")
+        
+        input("Press Enter to start testing...")
     
     run_all_tests()
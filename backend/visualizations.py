@@ -11,16 +11,18 @@ import io
 import base64
 from typing import List, Dict, Optional
 from database import StudentDB, GradeDB, AttendanceDB
+from server_timing import span
 
 
 def fig_to_base64(fig) -> str:
     """Convert matplotlib figure to base64 string"""
     buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode('utf-8')
+    with span('render'):
+        fig.savefig(buf, format='png', bbox_inches='tight', dpi=100)
+        plt.close(fig)
+    with span('encode'):
+        img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
     buf.close()
-    plt.close(fig)
     return f"data:image/png;base64,{img_base64}"
 
 
@@ -35,12 +37,13 @@ def generate_grade_distribution_pie_chart(student_id: str = None) -> str:
         Base64-encoded PNG image
     """
     # Fetch grades
-    if student_id:
-        grades = GradeDB.query.filter_by(student_id=student_id).all()
-        title = f'Grade Distribution for Student {student_id}'
-    else:
-        grades = GradeDB.query.all()
-        title = 'Overall Grade Distribution'
+    with span('db'):
+        if student_id:
+            grades = GradeDB.query.filter_by(student_id=student_id).all()
+            title = f'Grade Distribution for Student {student_id}'
+        else:
+            grades = GradeDB.query.all()
+            title = 'Overall Grade Distribution'
     
     if not grades:
         # Return empty chart
@@ -107,7 +110,8 @@ def generate_grade_progress_line_chart(student_id: str, subject: str = None) ->
     if subject:
         query = query.filter_by(subject=subject)
     
-    grades = query.order_by(GradeDB.created_at).all()
+    with span('db'):
+        grades = query.order_by(GradeDB.created_at).all()
     
     if not grades:
         fig, ax = plt.subplots(figsize=(10, 6))
@@ -148,7 +152,8 @@ def generate_grade_progress_line_chart(student_id: str, subject: str = None) ->
     ax.grid(True, alpha=0.3, linestyle=':', linewidth=0.5)
     ax.legend(loc='best', fontsize=9)
     
-    plt.tight_layout()
+    with span('render'):
+        plt.tight_layout()
     
     return fig_to_base64(fig)
 
@@ -165,7 +170,8 @@ def generate_attendance_bar_chart(student_id: str = None) -> str:
     """
     if student_id:
         # Single student attendance
-        records = AttendanceDB.query.filter_by(student_id=student_id).all()
+        with span('db'):
+            records = AttendanceDB.query.filter_by(student_id=student_id).all()
         
         if not records:
             fig, ax = plt.subplots(figsize=(10, 6))
@@ -197,7 +203,8 @@ def generate_attendance_bar_chart(student_id: str = None) -> str:
         
     else:
         # All students attendance comparison
-        students = StudentDB.query.all()
+        with span('db'):
+            students = StudentDB.query.all()
         
         if not students:
             fig, ax = plt.subplots(figsize=(10, 6))
@@ -208,13 +215,14 @@ def generate_attendance_bar_chart(student_id: str = None) -> str:
         student_names = []
         attendance_percentages = []
         
-        for student in students[:15]:  # Limit to 15 students for readability
-            records = AttendanceDB.query.filter_by(student_id=student.student_id).all()
-            if records:
-                present = sum(1 for r in records if r.status == 'present')
-                percentage = (present / len(records)) * 100
-                student_names.append(student.name[:15])  # Truncate long names
-                attendance_percentages.append(percentage)
+        with span('db'):
+            for student in students[:15]:  # Limit to 15 students for readability
+                records = AttendanceDB.query.filter_by(student_id=student.student_id).all()
+                if records:
+                    present = sum(1 for r in records if r.status == 'present')
+                    percentage = (present / len(records)) * 100
+                    student_names.append(student.name[:15])  # Truncate long names
+                    attendance_percentages.append(percentage)
         
         if not attendance_percentages:
             fig, ax = plt.subplots(figsize=(10, 6))
@@ -247,7 +255,8 @@ def generate_attendance_bar_chart(student_id: str = None) -> str:
         ax.axhline(y=80, color='red', linestyle='--', alpha=0.5, linewidth=1, label='Target (80%)')
         ax.legend(loc='best')
     
-    plt.tight_layout()
+    with span('render'):
+        plt.tight_layout()
     
     return fig_to_base64(fig)
 
@@ -262,7 +271,8 @@ def generate_subject_comparison_chart(student_id: str) -> str:
     Returns:
         Base64-encoded PNG image
     """
-    grades = GradeDB.query.filter_by(student_id=student_id).all()
+    with span('db'):
+        grades = GradeDB.query.filter_by(student_id=student_id).all()
     
     if not grades:
         fig, ax = plt.subplots(figsize=(10, 6))
@@ -308,7 +318,8 @@ def generate_subject_comparison_chart(student_id: str) -> str:
     ax.legend(loc='best')
     ax.grid(True, axis='y', alpha=0.3, linestyle=':', linewidth=0.5)
     
-    plt.tight_layout()
+    with span('render'):
+        plt.tight_layout()
     
     return fig_to_base64(fig)
 
@@ -320,7 +331,8 @@ def generate_class_performance_chart() -> str:
     Returns:
         Base64-encoded PNG image
     """
-    students = StudentDB.query.all()
+    with span('db'):
+        students = StudentDB.query.all()
     
     if not students:
         fig, ax = plt.subplots(figsize=(10, 6))
@@ -331,18 +343,19 @@ def generate_class_performance_chart() -> str:
     student_averages = []
     student_names = []
     
-    for student in students[:20]:  # Limit to 20 students
-        grades = GradeDB.query.filter_by(student_id=student.student_id).all()
-        if grades:
-            final_grades = []
-            for grade in grades:
-                if grade.final_grade is None:
-                    grade.calculate_final_grade()
-                final_grades.append(grade.final_grade)
-            
-            avg = np.mean(final_grades)
-            student_averages.append(avg)
-            student_names.append(student.name[:15])
+    with span('db'):
+        for student in students[:20]:  # Limit to 20 students
+            grades = GradeDB.query.filter_by(student_id=student.student_id).all()
+            if grades:
+                final_grades = []
+                for grade in grades:
+                    if grade.final_grade is None:
+                        grade.calculate_final_grade()
+                    final_grades.append(grade.final_grade)
+                
+                avg = np.mean(final_grades)
+                student_averages.append(avg)
+                student_names.append(student.name[:15])
     
     if not student_averages:
         fig, ax = plt.subplots(figsize=(10, 6))
@@ -371,6 +384,7 @@ def generate_class_performance_chart() -> str:
     ax.set_xlim(0, 105)
     ax.grid(True, axis='x', alpha=0.3, linestyle=':', linewidth=0.5)
     
-    plt.tight_layout()
+    with span('render'):
+        plt.tight_layout()
     
     return fig_to_base64(fig)
@@ -0,0 +1,73 @@
+"""
+Write Guard
+Lets an in-memory index that is rebuilt from a database fetch (grade
+sketches, rankings) tell whether a write raced the fetch.
+
+The write routes apply each committed change to the index themselves, so
+a rebuild is only safe to install if no write was between its commit and
+its in-memory update while the fetch ran: otherwise the fetched rows may
+already contain the change and the update applies it a second time, or
+miss it while the update went to the replaced index. Writers wrap the
+commit and the update in writing(); a rebuild takes a generation when no
+write is in flight, fetches, and installs only if the generation is
+unchanged:
+
+    with registry.writing():
+        db.session.commit()
+        registry.record(...)
+
+Writes handled by other worker processes are not seen; those indexes are
+rebuilt after their max_age instead.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+# How long a rebuild waits for in-flight writes to finish before fetching
+IDLE_TIMEOUT = 1.0
+
+# Builds tried before a rebuild gives up while writes keep overlapping it
+REBUILD_ATTEMPTS = 3
+
+
+class WriteGuard:
+    """Count of in-flight writes plus a generation bumped by every write and invalidation"""
+
+    def __init__(self):
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._generation = 0
+
+    @contextmanager
+    def writing(self):
+        """Wrap a commit and the in-memory updates that follow it"""
+        with self._idle:
+            self._pending += 1
+            self._generation += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._pending -= 1
+                self._generation += 1
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def touch(self):
+        """Mark a change without a write, e.g. an invalidation, so running rebuilds are discarded"""
+        with self._idle:
+            self._generation += 1
+
+    def idle_generation(self, timeout: float = IDLE_TIMEOUT) -> Optional[int]:
+        """Generation once no write is in flight (None if writes kept going for timeout seconds)"""
+        with self._idle:
+            if not self._idle.wait_for(lambda: not self._pending, timeout):
+                return None
+            return self._generation
+
+    def unchanged(self, generation: Optional[int]) -> bool:
+        """Whether no write started or finished since idle_generation returned generation"""
+        with self._idle:
+            return generation is not None and self._generation == generation
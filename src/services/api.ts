@@ -1,18 +1,30 @@
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// After a write, read from the primary database for this long (the backend's
+// REPLICA_STICKY_SECONDS) so a lagging read replica cannot hide the change.
+// The backend's cookie for this is not sent cross-origin, so use the header.
+const READ_PRIMARY_MS = 10_000;
+
 interface RequestOptions extends RequestInit {
   headers?: Record<string, string>;
 }
 
 class APIService {
+  private readPrimaryUntil = 0;
+
   async request(endpoint: string, options: RequestOptions = {}): Promise<any> {
     const url = `${API_BASE_URL}${endpoint}`;
+    const method = (options.method || 'GET').toUpperCase();
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+      ...options.headers,
+    };
+    if (method === 'GET' && Date.now() < this.readPrimaryUntil) {
+      headers['X-Read-Primary'] = '1';
+    }
     const config: RequestInit = {
-      headers: {
-        'Content-Type': 'application/json',
-        ...options.headers,
-      },
       ...options,
+      headers,
     };
 
     try {
@@ -23,6 +35,10 @@ class APIService {
         throw new Error(data.error || 'API request failed');
       }
       
+      if (method !== 'GET') {
+        this.readPrimaryUntil = Date.now() + READ_PRIMARY_MS;
+      }
+      
       return data;
     } catch (error) {
       console.error('API Error:', error);